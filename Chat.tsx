@@ -25,8 +25,9 @@ import {
   ChatHistoryLoadingState,
   CosmosDBStatus,
   ErrorMessage,
-  historyRead,
-  historyList,
+  historyReadWindow,
+  historyMessageCitations,
+  historyListPage,
   getCitationData,
   History,
   historyDelete,
@@ -47,10 +48,12 @@ import {
   Box,
   Button,
   Divider,
+  FormControlLabel,
   InputAdornment,
   List,
   ListItem,
   ListItemButton,
+  Switch,
   TextField,
   Typography,
   MenuItem,
@@ -108,7 +111,9 @@ const Chat = () => {
   const [showAuthMessage, setShowAuthMessage] = useState<boolean | undefined>();
   const [convID, setConvId] = useState<string | null>("");
   const [historyListFilter, setHistoryListFilter] = useState<History[]>([]);
+  const [historyNextCursor, setHistoryNextCursor] = useState<string | null>(null);
   const [messages, setMessages] = useState<ChatMessage[]>([]);
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<string | null>(null);
   const [textMsg, setTextMsg] = useState<string>("");
   const [processMessages, setProcessMessages] = useState<messageStatus>(messageStatus.NotRunning,);
   const [clearingChat, setClearingChat] = useState<boolean>(false);
@@ -131,6 +136,8 @@ const Chat = () => {
   const [workspaceAribaNameOpts, setWorkspaceAribaNameOpts] = useState<ContractWorkspace[]>([]);
 
   const [selectedMode, setSelectedMode] = useState<string>("standard");
+  // Opt-in: under load the server may then answer in a cheaper mode than selectedMode
+  const [allowModeDowngrade, setAllowModeDowngrade] = useState(false);
   const [citationLoadingMessageId, setCitationLoadingMessageId] = useState<string | null>(null);
 
   const workspaceFromStore = useSelector(
@@ -183,6 +190,7 @@ const Chat = () => {
   const handleModeChange = (mode: string) => {
     setSelectedMode(mode);
     setMessages([]);
+    setOlderMessagesCursor(null);
     setTextMsg("");
     setConvId("");
     setSelectedItem(null);
@@ -258,6 +266,7 @@ const Chat = () => {
   const makeApiRequestWithCosmosDB = async (
     question: string,
     conversationId?: string,
+    idempotencyKey: string = uuid(),
   ) => {
     setIsLoading(true);
     setShowLoadingMessage(true);
@@ -289,10 +298,9 @@ const Chat = () => {
         return;
       } else {
         conversation.messages.push(userMessage);
+        // Earlier turns are loaded server-side from the stored conversation
         request = {
-          messages: [
-            ...conversation.messages.filter((answer) => answer.role !== ERROR),
-          ],
+          messages: [userMessage],
           contract_workspaces: selectedWorkspace.length > 0
             ? selectedWorkspace.map((workspace) => workspace.id)
             : [],
@@ -308,6 +316,8 @@ const Chat = () => {
       setMessages(request.messages);
     }
     let result = {} as ChatResponse;
+    // Conversation metadata from the answer frames; later citation and diagnostic frames don't carry it
+    let historyMetadata: ChatResponse["history_metadata"] | undefined;
     let errorResponseMessage = "Please try again. If the problem persists, please contact the site administrator.";
     try {
       const response = conversationId
@@ -317,7 +327,9 @@ const Chat = () => {
           selectedWorkspace[0].id,
           conversationId,
           selectedWorkspace,
-          selectedMode
+          selectedMode,
+          idempotencyKey,
+          allowModeDowngrade
         )
         : await historyGenerate(
           request,
@@ -325,7 +337,9 @@ const Chat = () => {
           selectedWorkspace[0].id,
           undefined,
           selectedWorkspace,
-          selectedMode
+          selectedMode,
+          idempotencyKey,
+          allowModeDowngrade
         );
       await fetchChatHistoryList();
 
@@ -392,7 +406,69 @@ const Chat = () => {
             try {
               if (obj !== "" && obj !== "{}") {
                 runningText += obj;
-                result = JSON.parse(runningText);
+                const frame = JSON.parse(runningText);
+
+                if (frame.queue_position !== undefined) {
+                  // Waiting for a free slot; admission is reported before any content
+                  if (frame.queue_position > 0) {
+                    setShowProcessingTime(true);
+                    setProcessingTimeMsg(`Your request is queued (position ${frame.queue_position}).`);
+                  }
+                  runningText = "";
+                  return;
+                }
+
+                if (frame.server_timing !== undefined) {
+                  // Final per-phase timing breakdown; diagnostics only
+                  console.debug("Server timing", frame.server_timing);
+                  runningText = "";
+                  return;
+                }
+
+                result = frame as ChatResponse;
+                if (result.history_metadata) {
+                  historyMetadata = result.history_metadata;
+                }
+
+                const citationFrame = result as any;
+                if (result.citation_update === true && (Array.isArray(citationFrame.citations) || citationFrame.citation_complete)) {
+                  // Multi-contract answers stream one frame per contract as its citations resolve,
+                  // then a completion marker; citations stay loading until then
+                  const streamedCitations: any[] = citationFrame.citations ?? [];
+                  const complete = citationFrame.citation_complete === true;
+                  if (assistantMessageId) {
+                    setMessages((prevMessages) => {
+                      return prevMessages.map((msg) => {
+                        if (msg.id !== assistantMessageId || msg.role !== "assistant") {
+                          return msg;
+                        }
+                        const citations = [...(msg.citation_metadata?.citations ?? [])];
+                        streamedCitations.forEach((streamedCitation) => {
+                          const isDuplicate = citations.some(
+                            (c: any) => c.file_id === streamedCitation.file_id && c.page_number === streamedCitation.page_number,
+                          );
+                          if (!isDuplicate) {
+                            citations.push(streamedCitation);
+                          }
+                        });
+                        return {
+                          ...msg,
+                          citation_metadata: {
+                            ...msg.citation_metadata,
+                            citations,
+                            citation_loading: !complete,
+                          },
+                        };
+                      });
+                    });
+                    if (complete) {
+                      setCitationLoadingMessageId(null);
+                    }
+                  }
+
+                  runningText = "";
+                  return;
+                }
 
                 if (result.citation_update === true) {
                   if (assistantMessageId) {
@@ -427,9 +503,12 @@ const Chat = () => {
                     if (msg.role === "assistant") {
                       assistantMessageId = msg.id;
 
-                      if (msg.citation_metadata?.citation_loading === true && selectedMode !== "fast") {
+                      // The server may run a cheaper mode than requested under load
+                      const modeUsed = (msg as any).ai_mode_used ?? selectedMode;
+                      (msg as any).ai_mode_requested = selectedMode;
+                      if (msg.citation_metadata?.citation_loading === true && modeUsed !== "fast") {
                         setCitationLoadingMessageId(msg.id);
-                      } else if (selectedMode === "fast") {
+                      } else if (modeUsed === "fast") {
                         setCitationLoadingMessageId(null);
                       }
                     }
@@ -472,11 +551,14 @@ const Chat = () => {
             ? resultConversation.messages.push(assistantMessage)
             : resultConversation.messages.push(toolMessage, assistantMessage);
         } else {
+          if (!historyMetadata) {
+            throw Error("The response did not include conversation details.");
+          }
           resultConversation = {
-            id: result.history_metadata.conversation_id,
-            title: result.history_metadata.title,
+            id: historyMetadata.conversation_id,
+            title: historyMetadata.title,
             messages: [userMessage],
-            date: result.history_metadata.date,
+            date: historyMetadata.date,
           };
           isEmpty(toolMessage)
             ? resultConversation.messages.push(assistantMessage)
@@ -545,7 +627,7 @@ const Chat = () => {
           }
           resultConversation.messages.push(errorChatMsg);
         } else {
-          if (!result.history_metadata) {
+          if (!historyMetadata) {
             console.error("Error retrieving data.", result);
             const errorChatMsg: ChatMessage = {
               id: uuid(),
@@ -564,10 +646,10 @@ const Chat = () => {
             return;
           }
           resultConversation = {
-            id: result.history_metadata.conversation_id,
-            title: result.history_metadata.title,
+            id: historyMetadata.conversation_id,
+            title: historyMetadata.title,
             messages: [userMessage],
-            date: result.history_metadata.date,
+            date: historyMetadata.date,
           };
           resultConversation.messages.push(errorChatMsg);
         }
@@ -634,6 +716,7 @@ const Chat = () => {
   const newChat = () => {
     setProcessMessages(messageStatus.Processing);
     setMessages([]);
+    setOlderMessagesCursor(null);
     setIsCitationPanelOpen(false);
     setActiveCitation(undefined);
     appStateContext?.dispatch({
@@ -826,10 +909,12 @@ const Chat = () => {
     }
 
     const metadata = message.citation_metadata;
+    const modeUsed = (message as any).ai_mode_used ?? selectedMode;
 
-    if (selectedMode === "fast" && metadata.citation_loading === true) {
+    if (modeUsed === "fast" && metadata.citation_loading === true) {
       // proceed without waiting
-    } else if (selectedMode !== "fast" && metadata.citation_loading === true) {
+    } else if (modeUsed !== "fast" && metadata.citation_loading === true && !metadata.citations?.length) {
+      // Multi-contract citations already streamed are shown while the rest load
       return [];
     }
 
@@ -899,8 +984,8 @@ const Chat = () => {
       contract_workspace: contractWorkspace,
       file_name: metadata.file_name || 'Unknown file',
       file_type: 'pdf',
-      citation_text: selectedMode === "fast" ? undefined : metadata.citation_text,
-      citation_position: selectedMode === "fast" ? undefined : metadata.citation_position,
+      citation_text: modeUsed === "fast" ? undefined : metadata.citation_text,
+      citation_position: modeUsed === "fast" ? undefined : metadata.citation_position,
     };
 
     return [citation];
@@ -916,14 +1001,23 @@ const Chat = () => {
     );
   };
 
+  // One Idempotency-Key per composed message, so repeated sends of it are answered once
+  const composedMessageKey = useRef<string | null>(null);
+  const sendInFlight = useRef<boolean>(false);
   const handleSend = (question: string) => {
+    if (sendInFlight.current) return;
     if (question.length && selectedWorkspace.length > 0) {
       const conversationID = appStateContext?.state.currentChat?.id
         ? appStateContext?.state.currentChat?.id
         : convID
           ? convID
           : undefined;
-      makeApiRequestWithCosmosDB(question, conversationID);
+      composedMessageKey.current = composedMessageKey.current ?? uuid();
+      sendInFlight.current = true;
+      makeApiRequestWithCosmosDB(question, conversationID, composedMessageKey.current)
+        .finally(() => {
+          sendInFlight.current = false;
+        });
       setTextMsg("");
     }
   };
@@ -937,16 +1031,15 @@ const Chat = () => {
   }, []);
 
   const fetchChatHistoryList = async (
-    offset = 0,
+    cursor: string | null = null,
   ): Promise<History[] | null> => {
-    const result = await historyList(offset)
+    const result = await historyListPage(cursor)
       .then((response) => {
-        if (response) {
-          setHistoryListFilter(response);
-        } else {
-          setHistoryListFilter([]);
-        }
-        return response;
+        setHistoryNextCursor(response.next_cursor);
+        setHistoryListFilter((prev) =>
+          cursor ? [...prev, ...response.threads] : response.threads,
+        );
+        return response.threads;
       })
       .catch((err) => {
         dispatch(
@@ -971,8 +1064,9 @@ const Chat = () => {
   useEffect(() => {
     if (convID) {
       dispatch(showLoader());
-      const convMessages = historyRead(convID)
-        .then((res) => {
+      setOlderMessagesCursor(null);
+      const convMessages = historyReadWindow(convID)
+        .then(({ messages: res, next_cursor }) => {
           appStateContext?.dispatch({
             type: "UPDATE_CHAT_HISTORY",
             payload: res,
@@ -981,7 +1075,8 @@ const Chat = () => {
             type: "UPDATE_CURRENT_CHAT",
             payload: { id: convID, messages: res },
           });
-          setMessages(res);
+          setMessages(attachCitationRefs(res));
+          setOlderMessagesCursor(next_cursor);
           return res;
         })
         .catch((err) => {
@@ -1000,6 +1095,65 @@ const Chat = () => {
       });
     };
   }, [convID]);
+  // History windows send tool messages as a citation_ref only; the answer that
+  // follows a tool message loads its citations when its window is loaded
+  const attachCitationRefs = (windowMessages: ChatMessage[]): ChatMessage[] => {
+    let citationRef: string | number | null = null;
+    return windowMessages.map((msg) => {
+      if (msg.role === TOOL) {
+        citationRef = !msg.content && (msg as any).citation_ref ? (msg as any).citation_ref : null;
+        return msg;
+      }
+      if (msg.role === ASSISTANT && citationRef !== null && !msg.citation_metadata) {
+        const withRef = { ...msg, citation_ref: citationRef } as ChatMessage;
+        citationRef = null;
+        return withRef;
+      }
+      citationRef = null;
+      return msg;
+    });
+  };
+  const requestedCitationRefs = useRef<Set<string | number>>(new Set());
+  useEffect(() => {
+    const pending = messages.filter(
+      (msg) =>
+        msg.role === ASSISTANT &&
+        (msg as any).citation_ref &&
+        !msg.citation_metadata &&
+        !requestedCitationRefs.current.has((msg as any).citation_ref),
+    );
+    pending.forEach((msg) => {
+      const citationRef = (msg as any).citation_ref;
+      requestedCitationRefs.current.add(citationRef);
+      historyMessageCitations(citationRef)
+        .then((payload) => {
+          if (!payload) return;
+          setMessages((current) =>
+            current.map((m) =>
+              m.id === msg.id
+                ? { ...m, citation_metadata: { ...payload, citation_loading: false } }
+                : m,
+            ),
+          );
+        })
+        .catch(() => {
+          requestedCitationRefs.current.delete(citationRef);
+        });
+    });
+  }, [messages]);
+  const loadOlderMessages = () => {
+    if (!convID || !olderMessagesCursor) return;
+    const cursor = olderMessagesCursor;
+    setOlderMessagesCursor(null);
+    historyReadWindow(convID, cursor)
+      .then(({ messages: older, next_cursor }) => {
+        setMessages((current) => attachCitationRefs([...older, ...current]));
+        setOlderMessagesCursor(next_cursor);
+      })
+      .catch(() => {
+        setOlderMessagesCursor(cursor);
+      });
+  };
   const fetchHistoryData = (event: React.MouseEvent) => {
     const target = event.currentTarget as HTMLElement;
     const data = target.getAttribute("data-value");
@@ -1009,9 +1163,11 @@ const Chat = () => {
 
   const handleInput = (e: React.ChangeEvent<HTMLInputElement>) => {
     const target = e.target as HTMLInputElement;
+    composedMessageKey.current = null;
     setTextMsg(target.value);
   };
   const fireInitialQuestion = (question: string) => {
+    composedMessageKey.current = null;
     setTextMsg(question);
   };
   const deleteHistory = async (historyId: string) => {
@@ -1206,6 +1362,16 @@ const Chat = () => {
                 selectedMode={selectedMode}
                 onModeChange={handleModeChange}
               />
+              <FormControlLabel
+                control={
+                  <Switch
+                    size="small"
+                    checked={allowModeDowngrade}
+                    onChange={(event) => setAllowModeDowngrade(event.target.checked)}
+                  />
+                }
+                label="Use a faster mode when busy"
+              />
 
               <Button
                 sx={{ color: theme.palette.primary.main }}
@@ -1306,6 +1472,13 @@ const Chat = () => {
               </Grid>
             ) : (
               <Box className={styles.chatMessageStream} role="log">
+                {olderMessagesCursor && (
+                  <Box sx={{ display: "flex", justifyContent: "center", mb: 2 }}>
+                    <Button variant="text" onClick={loadOlderMessages}>
+                      Load earlier messages
+                    </Button>
+                  </Box>
+                )}
                 {messages.map((answer, index) => (
                   <Box key={answer.id}>
                     {answer.role === "user" ? (
@@ -1365,7 +1538,7 @@ const Chat = () => {
                         >
                           {(() => {
                             const citations = extractCitations(answer);
-                            const isCitationLoading = selectedMode === "fast"
+                            const isCitationLoading = ((answer as any).ai_mode_used ?? selectedMode) === "fast"
                               ? false
                               : (answer.citation_metadata?.citation_loading === true);
 
@@ -1397,6 +1570,10 @@ const Chat = () => {
                           }}
                         >
                           This content has been generated by AI
+                          {(answer as any).ai_mode_used &&
+                            (answer as any).ai_mode_requested &&
+                            (answer as any).ai_mode_used !== (answer as any).ai_mode_requested &&
+                            ` · Answered in ${(answer as any).ai_mode_used} mode instead of ${(answer as any).ai_mode_requested} because of high load`}
                         </Box>
                       </Box>
                     ) : answer.role === "error" ? (
@@ -1780,6 +1957,17 @@ const Chat = () => {
                     overflowY:
                       historyPanelMockLists.length > 5 ? "auto" : "hidden",
                   }}
+                  onScroll={(event) => {
+                    const target = event.currentTarget;
+                    if (
+                      historyNextCursor &&
+                      target.scrollTop + target.clientHeight >= target.scrollHeight - 48
+                    ) {
+                      const cursor = historyNextCursor;
+                      setHistoryNextCursor(null);
+                      fetchChatHistoryList(cursor);
+                    }
+                  }}
                 >
                   {historyListFilter?.map((data, index) => (
                     <ListItem key={data.id} disablePadding>
@@ -0,0 +1,101 @@
+"""
+Load-aware ai_mode routing for chat generation.
+
+Tracks the chat streams in flight (overall and per user) and an exponentially
+weighted time-to-first-token per mode. When the system is saturated and the
+client allows it, an expensive mode is stepped down the ladder
+(``AI_MODE_DOWNGRADE_LADDER``, most to least expensive) so answers keep
+arriving within the latency SLO instead of every request slowing down.
+"""
+import os
+import time
+import logging
+import logging_config
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+MODE_ROUTING_ENABLED = os.getenv("AI_MODE_ROUTING_ENABLED", "true").lower() == "true"
+MODE_LADDER = [
+    mode.strip()
+    for mode in os.getenv("AI_MODE_DOWNGRADE_LADDER", "enhanced,standard,fast").split(",")
+    if mode.strip()
+]
+TTFT_SLO_SECONDS = float(os.getenv("AI_MODE_TTFT_SLO", "8"))
+SOFT_IN_FLIGHT = int(os.getenv("AI_MODE_SOFT_IN_FLIGHT", "40"))
+HARD_IN_FLIGHT = int(os.getenv("AI_MODE_HARD_IN_FLIGHT", "80"))
+USER_SOFT_IN_FLIGHT = int(os.getenv("AI_MODE_USER_SOFT_IN_FLIGHT", "2"))
+TTFT_STALE_SECONDS = float(os.getenv("AI_MODE_TTFT_STALE", "60"))
+EWMA_ALPHA = 0.2
+
+
+class LoadMonitor:
+    """In-flight chat streams and time-to-first-token per mode, for this process"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.user_in_flight = {}
+        self.ttft = {}
+        self.ttft_updated = {}
+
+    def _current_ttft(self, mode: str):
+        """The mode's EWMA, ignored once stale so a downgraded mode gets retried"""
+        if time.monotonic() - self.ttft_updated.get(mode, 0) > TTFT_STALE_SECONDS:
+            return None
+        return self.ttft.get(mode)
+
+    def _saturation(self, user_id: int, mode: str) -> int:
+        """0 when healthy, 1 when busy, 2 when overloaded"""
+        level = 0
+        ttft = self._current_ttft(mode)
+        if self.in_flight >= HARD_IN_FLIGHT or (ttft and ttft > 2 * TTFT_SLO_SECONDS):
+            level = 2
+        elif self.in_flight >= SOFT_IN_FLIGHT or (ttft and ttft > TTFT_SLO_SECONDS):
+            level = 1
+        if self.user_in_flight.get(user_id, 0) >= USER_SOFT_IN_FLIGHT:
+            level += 1
+        return level
+
+    def route(self, user_id: int, requested_mode: str, allow_downgrade: bool) -> str:
+        """The mode to run ``requested_mode`` in under the current load"""
+        if not MODE_ROUTING_ENABLED or not allow_downgrade or requested_mode not in MODE_LADDER:
+            return requested_mode
+        level = self._saturation(user_id, requested_mode)
+        if level == 0:
+            return requested_mode
+        position = min(MODE_LADDER.index(requested_mode) + level, len(MODE_LADDER) - 1)
+        mode = MODE_LADDER[position]
+        if mode != requested_mode:
+            logger.info(
+                f"Downgrading ai_mode {requested_mode} -> {mode} for user {user_id} "
+                f"(in_flight={self.in_flight}, ttft={self._current_ttft(requested_mode)})"
+            )
+        return mode
+
+    def _observe_ttft(self, mode: str, seconds: float):
+        previous = self._current_ttft(mode)
+        self.ttft[mode] = seconds if previous is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * previous
+        self.ttft_updated[mode] = time.monotonic()
+
+    async def observe(self, stream, user_id: int, mode: str):
+        """Count ``stream`` as in flight and feed its time to first chunk into the mode's EWMA"""
+        self.in_flight += 1
+        self.user_in_flight[user_id] = self.user_in_flight.get(user_id, 0) + 1
+        started = time.monotonic()
+        first = True
+        try:
+            async for chunk in stream:
+                if first:
+                    self._observe_ttft(mode, time.monotonic() - started)
+                    first = False
+                yield chunk
+        finally:
+            self.in_flight -= 1
+            remaining = self.user_in_flight.get(user_id, 1) - 1
+            if remaining > 0:
+                self.user_in_flight[user_id] = remaining
+            else:
+                self.user_in_flight.pop(user_id, None)
+
+
+load_monitor = LoadMonitor()
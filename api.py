@@ -6,6 +6,7 @@ Controllers:
 
 """
 import os
+import importlib
 import json
 import logging
 import datetime
@@ -35,6 +36,53 @@ from components.controllers.template_management import (
 )
 from components.controllers.ariba_management import get_ariba_management_controller
 from components.controllers.contract_comparison import EmbedService
+from components.controllers.chat_context import (
+    build_message_history,
+    schedule_summary_update,
+)
+from components.controllers.ai_mode_router import load_monitor
+from components.controllers.chat_admission import (
+    ADMISSION_ENABLED,
+    AdmissionRejected,
+    admission_controller,
+)
+from components.controllers.execution_estimates import (
+    get_execution_estimate,
+    track_execution,
+)
+from components.controllers.chat_idempotency import IDEMPOTENCY_HEADER, claim, claim_shared
+from components.controllers.chat_history import (
+    get_message_citations,
+    list_threads_page,
+    read_messages_window,
+)
+from components.controllers.citation_prefetch import (
+    get_cached_page_blob,
+    get_citation_data,
+    schedule_citation_prefetch,
+)
+from components.controllers.chat_attribute_answers import (
+    ATTRIBUTE_FAST_PATH_ENABLED,
+    find_stored_answer,
+)
+from components.controllers.chat_answer_cache import (
+    ANSWER_CACHE_ENABLED,
+    get_cached_answer,
+    get_workspace_content_version,
+    replay_answer,
+    store_answer,
+)
+from components.controllers.user_profile import get_user_profile
+from components.controllers.login_warmup import (
+    DEFAULT_CONTRACT_PAGE_SIZE,
+    resolve_login_index,
+    schedule_login_warmup,
+    take_warm_result,
+)
+from components.controllers.multi_contract_fanout import (
+    FANOUT_ENABLED,
+    MultiContractFanOut,
+)
 from fastapi.responses import (
     StreamingResponse,
     FileResponse,
@@ -55,17 +103,12 @@ from fastapi import (
 )
 
 from pathlib import Path as FilePath
-from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
-from starlette.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from components.models.auth import Role, User
-from components.models.base import Base
 from components.models.contract import Contract
 from components.models.index import Index
-from components.models.file import File as FileModel
 from components.models.thread import Thread, Message
 
 from services.storage import AzureStorageClient
@@ -74,14 +117,30 @@ from components.controllers.thread import ThreadAPIController
 from utils.auth_helper import (
     AuthorizationMiddleware,
     GetAToken,
-    UserIdentitySchema,
-    acquire_token_by_authorization_code,
     auth_check,
     create_access_token,
     find_client_details_from_email_domain,
-    get_user_details_from_azure_token,
     refresh_access_token,
 )
+from utils.identity_client import close_identity_provider, get_identity_provider
+from utils.asgi_pipeline import RequestPipelineMiddleware
+from utils.auth_cache import cached_auth_check
+from utils.metrics import (
+    METRICS_CONTENT_TYPE,
+    metered_chat_stream,
+    metrics_authorized,
+    observe_storage_call,
+    render_metrics,
+    start_metrics_refresh,
+    stop_metrics_refresh,
+)
+from utils.request_timing import (
+    TimedJSONResponse as JSONResponse,
+    append_timing_frame,
+    instrument_methods,
+    serialize_frame,
+    timed_llm_stream,
+)
 from utils.constants import *
 from utils.exceptions import (
     AuthException,
@@ -102,46 +161,6 @@ logging_config.setup_logging()
 logger = logging.getLogger(__name__)
 
 
-class CorrelationIdMiddleware:
-    """
-    ASGI middleware to maintain correlation ID context.
-    Correlation ID is expected from frontend; creates one only if missing (corner case).
-    """
-    def __init__(self, app):
-        self.app = app
-    
-    async def __call__(self, scope, receive, send):
-        if scope["type"] != "http":
-            await self.app(scope, receive, send)
-            return
-
-        # Extract headers from scope
-        headers = dict(scope.get("headers", []))
-        
-        # Get correlation ID from header, or generate as corner case
-        correlation_id = headers.get(b"x-request-id")
-        correlation_id = correlation_id.decode("utf-8") if correlation_id else str(uuid.uuid4())
-        
-        # Set correlation ID in context variable
-        token = correlation_id_var.set(correlation_id)
-        
-        # Store in scope for request.state access
-        if "state" not in scope:
-            scope["state"] = {}
-        scope["state"]["correlation_id"] = correlation_id
-        
-        async def send_with_correlation_id(message):
-            if message["type"] == "http.response.start":
-                headers = list(message.get("headers", []))
-                headers.append((b"x-request-id", correlation_id.encode("utf-8")))
-                message["headers"] = headers
-            await send(message)
-        
-        try:
-            await self.app(scope, receive, send_with_correlation_id)
-        finally:
-            correlation_id_var.reset(token)
-
 frontend_settings = {
     "auth_enabled": os.getenv("AUTH_ENABLED", "true").lower() == "true",
     "feedback_enabled": "conversations",
@@ -166,43 +185,61 @@ app = FastAPI(
     description="A GenAI application that retrieves information from Contract docs",
 )
 
+# CORS, correlation ID and auth context in one ASGI pass
 app.add_middleware(
-    CORSMiddleware,
+    RequestPipelineMiddleware,
+    verifier=AuthorizationMiddleware,
     allow_origins=["*"],  # Allows all origins
     allow_credentials=True,
-    # allow_methods=["*"],  # Allows all methods
-    # allow_headers=["*"],  # Allows all headers
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "X-Request-ID"],
+    allow_headers=["Content-Type", "Authorization", "X-Request-ID", "Idempotency-Key"],
+)
+
+# Storage calls are reported in the Server-Timing breakdown and metrics
+instrument_methods(
+    AzureStorageClient,
+    "storage",
+    ["upload_file", "delete_file", "delete_folder", "serve_file", "get_proxy_url_for_page"],
+    on_call=observe_storage_call,
 )
-app.add_middleware(CorrelationIdMiddleware)
-app.add_middleware(AuthorizationMiddleware)
+
+# Requests authorized from the verified-token cache skip the per-router check
+verified_auth_check = cached_auth_check(auth_check)
 
 generic_router = APIRouter()
 auth_router = APIRouter(prefix="/api/auth")
-blob_router = APIRouter(prefix="/api/blob", dependencies=[Depends(auth_check)])
-user_router = APIRouter(prefix="/api/users", dependencies=[Depends(auth_check)])
+blob_router = APIRouter(prefix="/api/blob", dependencies=[Depends(verified_auth_check)])
+user_router = APIRouter(prefix="/api/users", dependencies=[Depends(verified_auth_check)])
 chat_router = APIRouter(
-    prefix="/api/chat", dependencies=[Depends(auth_check)]
+    prefix="/api/chat", dependencies=[Depends(verified_auth_check)]
 )  # , Depends(contract_workspace_check)
 contract_management_router = APIRouter(
-    prefix="/api/contract-mgmt", dependencies=[Depends(auth_check)]
+    prefix="/api/contract-mgmt", dependencies=[Depends(verified_auth_check)]
 )
 attribute_management_router = APIRouter(
-    prefix="/api/attribute-mgmt", dependencies=[Depends(auth_check)]
+    prefix="/api/attribute-mgmt", dependencies=[Depends(verified_auth_check)]
 )
 contract_comparison_router = APIRouter(
-    prefix="/api/contract-comparison", dependencies=[Depends(auth_check)]
+    prefix="/api/contract-comparison", dependencies=[Depends(verified_auth_check)]
 )
-generic_secured_router = APIRouter(prefix="/api", dependencies=[Depends(auth_check)])
+generic_secured_router = APIRouter(prefix="/api", dependencies=[Depends(verified_auth_check)])
 template_management_router = APIRouter(
-    prefix="/api/template-mgmt", dependencies=[Depends(auth_check)]
+    prefix="/api/template-mgmt", dependencies=[Depends(verified_auth_check)]
 )
 ariba_management_router = APIRouter(
-    prefix="/api/ariba-mgmt", dependencies=[Depends(auth_check)]
+    prefix="/api/ariba-mgmt", dependencies=[Depends(verified_auth_check)]
 )
 
 
+@generic_router.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus metrics, aggregated across workers in multiprocess mode"""
+    if not metrics_authorized(request.headers.get("authorization")):
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    content = await asyncio.to_thread(render_metrics)
+    return Response(content=content, media_type=METRICS_CONTENT_TYPE)
+
+
 @generic_router.get("/health")
 async def health_check(request: Request):
     """Health check endpoint that also tests correlation ID"""
@@ -341,8 +378,21 @@ async def get_frontend_settings():
 
 
 ## CHAT
+def _load_chat_controller_factory():
+    """ThreadAPIController, or the "module:attribute" named by CHAT_CONTROLLER_FACTORY (e.g. a fake backend for load tests)"""
+    factory_path = os.getenv("CHAT_CONTROLLER_FACTORY")
+    if not factory_path:
+        return ThreadAPIController
+    module_name, _, attribute = factory_path.partition(":")
+    logger.warning(f"Using chat controller factory {factory_path}")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+chat_controller_factory = _load_chat_controller_factory()
+
+
 def get_chat_controller(request: Request):
-    return ThreadAPIController(request.state.index_name, request.state.user_id)
+    return chat_controller_factory(request.state.index_name, request.state.user_id)
 
 
 @chat_router.get("/")
@@ -486,51 +536,17 @@ async def add_conversation(request: Request):
 @chat_router.get("/citation")
 async def get_citation(request: Request, file_id: int, page_label: int):
     logger.info(f"Fetching citation for file_id: {file_id}, page_label: {page_label}")
-    citation_url = ""
     page_label = page_label - 1
     user_id = request.state.user_id
     try:
-        file = FileModel.fetch_file_by_id_and_user(file_id, user_id)
-        if file:
-            storage = AzureStorageClient("sections")
-            citation_url = storage.get_proxy_url_for_page(
-                file, page_label, request.state.access_token
-            )
+        citation_data = get_citation_data(
+            file_id, page_label, user_id, request.state.access_token
+        )
     except Exception as e:
         logger.exception("Unable to fetch citation from the give file and page")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
-    addidtional_data = []
-    try:
-        query = text(
-            """
-            SELECT cq.question as parameter, ca.answer as value
-            FROM contract_intelligence.contract_answer ca
-            LEFT JOIN contract_intelligence.contract_question cq
-            ON ca.question_id = cq.question_id
-            WHERE EXISTS (
-                SELECT 1
-                FROM jsonb_array_elements(ca.metadata_->'source_nodes') AS nodes
-                WHERE (nodes->>'file_id')::int = :file_id
-                AND (nodes->>'page_label')::int = :page_label
-            ) AND ca.answer <> 'N/A';
-            """
-        )
-        result = Base.get_session().execute(
-            query, {"file_id": file_id, "page_label": page_label}
-        )
-        if result:
-            for row in result:
-                addidtional_data.append({"parameter": row[0], "value": row[1]})
-    except Exception as e:
-        logger.exception(
-            "Unable to fetch additional parameters from the given file and page"
-        )
-        return JSONResponse(status_code=500, content={"error": str(e)})
-
-    return JSONResponse(
-        content={"citation_url": citation_url, "addidtional_data": addidtional_data}
-    )
+    return JSONResponse(content=citation_data)
 
 
 ## USED
@@ -557,6 +573,19 @@ async def list_history(request: Request, offset: int = 0):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+@chat_router.get("/history/threads")
+async def list_history_page(request: Request, cursor: Optional[str] = None, limit: int = 50):
+    try:
+        logger.info("Listing chat history page")
+        return await asyncio.to_thread(list_threads_page, request.state.user_id, cursor=cursor, limit=limit)
+    except ValueError as ve:
+        logger.error(f"Validation error: {str(ve)}")
+        return JSONResponse(status_code=400, content={"error": str(ve)})
+    except Exception as e:
+        logger.exception("Exception occurred while listing chat history page")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
 ## USED
 @chat_router.post("/history/read")
 async def get_conversation(request: Request):
@@ -571,15 +600,55 @@ async def get_conversation(request: Request):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+@chat_router.post("/history/read/window")
+async def get_conversation_window(request: Request):
+    try:
+        logger.info("Fetching conversation window")
+        data = await request.json()
+        thread_id = data.get("conversation_id")
+        if not thread_id:
+            raise ValueError("conversation_id is required")
+        return await asyncio.to_thread(
+            read_messages_window,
+            request.state.user_id,
+            thread_id,
+            before=data.get("before"),
+            limit=int(data.get("limit", 30)),
+        )
+    except ValueError as ve:
+        logger.error(f"Validation error: {str(ve)}")
+        return JSONResponse(status_code=400, content={"error": str(ve)})
+    except Exception as e:
+        logger.exception("Exception occurred while fetching conversation window")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@chat_router.get("/history/messages/{message_id}/citations")
+async def get_conversation_message_citations(request: Request, message_id: int):
+    try:
+        logger.info(f"Fetching citations for message {message_id}")
+        citations = await asyncio.to_thread(get_message_citations, request.state.user_id, message_id)
+        if citations is None:
+            return JSONResponse(status_code=404, content={"error": "Message not found"})
+        return citations
+    except Exception as e:
+        logger.exception(f"Exception occurred while fetching citations for message {message_id}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
 @chat_router.get("/history/execution_time")
 async def get_execution_time(request: Request):
     try:
         logger.info("Fetching execution time")
-        # Wait for 3 seconds before starting the generate task
-        await asyncio.sleep(3)
+        user_id = request.state.user_id
+
+        # Long-poll: returns as soon as the user's generation has started
+        response_json = await get_execution_estimate(user_id)
+        if response_json is not None:
+            logger.info("Execution time estimated from recent durations")
+            return JSONResponse(content=response_json, status_code=200)
 
         execution_time_controller = ExecutionTimeEstimate(request.state.user_id)
-        user_id = request.state.user_id
 
         try:
             response_json = execution_time_controller.get_current_execution(
@@ -604,9 +673,43 @@ async def get_execution_time(request: Request):
 ## USED
 @chat_router.post("/history/generate")
 async def stream_chat_request(request: Request):
+    generation = None
+    ticket = None
     try:
         logger.info("Generating chat request")
         user_id = request.state.user_id
+        access_token = request.state.access_token
+
+        # Retries of the same send attach to, or replay, the original generation
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key:
+            generation, is_new = claim(user_id, idempotency_key)
+            if not is_new:
+                return StreamingResponse(generation.follow(), media_type="application/json-lines")
+            if not await asyncio.to_thread(claim_shared, user_id, idempotency_key):
+                # The original request is being answered by another worker
+                generation.release(release_claim=False)
+                generation = None
+                return JSONResponse(
+                    status_code=409,
+                    content={"error": "This message is already being answered."},
+                    headers={"Retry-After": "5"},
+                )
+
+        # Per-user and per-index caps; over them the stream waits in a fair queue
+        if ADMISSION_ENABLED:
+            try:
+                ticket = admission_controller.enter(user_id, request.state.index_id)
+            except AdmissionRejected as rejected:
+                logger.warning(f"Chat request rejected for user {user_id}: {str(rejected)}")
+                if generation is not None:
+                    generation.release()
+                return JSONResponse(
+                    status_code=rejected.status_code,
+                    content={"error": str(rejected)},
+                    headers={"Retry-After": str(rejected.retry_after)},
+                )
+
         chat_controller = get_chat_controller(request)
         request_body = await request.json()
         data = await request.json()
@@ -618,7 +721,11 @@ async def stream_chat_request(request: Request):
         history_metadata = request_body.get(
             "history_metadata", {"conversation_id": thread_id}
         )
-        ai_mode = data.get("ai_mode", "standard")
+        requested_ai_mode = data.get("ai_mode", "standard")
+        # Under load, expensive modes are downgraded when the client allows it
+        ai_mode = load_monitor.route(
+            user_id, requested_ai_mode, bool(data.get("allow_mode_downgrade", False))
+        )
 
         # For handling the Supplier Name question from chat UI for considering the synonyms
         specific_string = "What is the name of the supplier in this contract?"
@@ -648,6 +755,13 @@ async def stream_chat_request(request: Request):
         message_id = user_message.id
         contract_workspace_list_val = ""
 
+        # Earlier turns come from the database: recent ones verbatim, older ones summarized
+        message_history = messages
+        if data.get("conversation_id"):
+            message_history = await asyncio.to_thread(
+                build_message_history, user_id, thread_id, messages[-1], message_id
+            )
+
         # Check for multi-contract scenario
         if len(contract_workspace_list) > 1:
             logger.info(f"Handling multi-contract scenario conversation_id: {thread_id}, user_message_id: {message_id}")
@@ -659,22 +773,69 @@ async def stream_chat_request(request: Request):
             # ✅ Variables to collect Phase 1 and Phase 2 data
             phase1_data = None
             phase2_data = None
+            phase1_content = ""
+            streamed_citations = []
+
+            if FANOUT_ENABLED:
+                # Answer each contract concurrently and merge the results
+                multi_contract_stream = MultiContractFanOut(chat_controller, user_id).stream(
+                    conversation_id=thread_id,
+                    message_history=message_history,
+                    input_message=user_input,
+                    contract_workspace_list=contract_workspace_list,
+                    ai_mode=ai_mode,
+                )
+            else:
+                multi_contract_stream = chat_controller.stream_multi_contract_chat_response(
+                    conversation_id=thread_id,
+                    message_history=message_history,
+                    input_message=user_input,
+                    user_id=user_id,
+                    contract_workspace=contract_workspace_list_val,
+                    ai_mode=ai_mode,
+                )
+            multi_contract_stream = timed_llm_stream(
+                metered_chat_stream(multi_contract_stream, ai_mode)
+            )
 
             # Multi-contract flow
             async def generate_multi_contract():
-                nonlocal phase1_data, phase2_data  # ← Access outer variables
+                nonlocal phase1_data, phase2_data, phase1_content  # ← Access outer variables
 
-                async for chunk in chat_controller.stream_multi_contract_chat_response(
-                        conversation_id=thread_id,
-                        message_history=messages,
-                        input_message=user_input,
-                        user_id=user_id,
-                        contract_workspace=contract_workspace_list_val,
-                        ai_mode=ai_mode,
-                ):
+                async for chunk in multi_contract_stream:
                     # ============================================
                     # CHECK IF THIS IS A PHASE 2 CITATION UPDATE
                     # ============================================
+                    if chunk.get("citation_update") == True and (
+                        "citation" in chunk or isinstance(chunk.get("citations"), list)
+                    ):
+                        # Phase 2 (incremental): one frame per contract as its citations resolve
+                        citations = chunk["citations"] if "citations" in chunk else [chunk["citation"]]
+                        if citations:
+                            streamed_citations.extend(citations)
+                            yield serialize_frame({
+                                "citation_update": True,
+                                "contract_workspace": chunk.get("contract_workspace")
+                                or citations[0].get("contract_workspace"),
+                                "citations": citations,
+                            })
+                            schedule_citation_prefetch(
+                                {"citations": citations}, user_id, access_token
+                            )
+                        continue
+
+                    if chunk.get("citation_update") == True and chunk.get("citation_complete"):
+                        logger.info(f"📥 Phase 2 complete: {len(streamed_citations)} citations streamed")
+                        chunk_data = {
+                            "citation_update": True,
+                            "citation_complete": True,
+                            "citation_count": len(streamed_citations),
+                        }
+                        if "contract_timings" in chunk:
+                            chunk_data["contract_timings"] = chunk["contract_timings"]
+                        yield serialize_frame(chunk_data)
+                        continue
+
                     if chunk.get("citation_update") == True:
                         logger.info("📥 Received Phase 2: Citation update from thread controller")
                         phase2_data = chunk  # ← Store Phase 2 data
@@ -685,9 +846,12 @@ async def stream_chat_request(request: Request):
                             "citation_metadata": chunk.get("citation_metadata", {})
                         }
 
-                        js_chunk = json.dumps(chunk_data, default=str) + "\n"
+                        js_chunk = serialize_frame(chunk_data)
                         logger.info(f"📤 Yielding Phase 2 to frontend: {len(js_chunk)} bytes")
                         yield js_chunk
+                        schedule_citation_prefetch(
+                            chunk_data["citation_metadata"], user_id, access_token
+                        )
                         continue  # ⭐ Skip the rest - don't process as assistant message
 
                     # ============================================
@@ -695,6 +859,7 @@ async def stream_chat_request(request: Request):
                     # ============================================
                     logger.debug(f"📥 Received Phase 1 chunk with keys: {list(chunk.keys())}")
                     phase1_data = chunk  # ← Store Phase 1 data
+                    phase1_content += chunk["content"]
 
                     # Extract citation metadata from chunk
                     citation_metadata = chunk.get("citation_metadata", None)
@@ -705,6 +870,7 @@ async def stream_chat_request(request: Request):
                         "content": chunk["content"],
                         "contract_id": None,
                         "contract_workspace": "Multi-Contract",
+                        "ai_mode_used": ai_mode,
                     }
 
                     # Add citation_metadata if available
@@ -730,8 +896,10 @@ async def stream_chat_request(request: Request):
                         ],
                         "history_metadata": history_metadata,
                     }
+                    if "contract_timings" in chunk:
+                        chunk_data["contract_timings"] = chunk["contract_timings"]
 
-                    js_chunk = json.dumps(chunk_data, default=str) + "\n"
+                    js_chunk = serialize_frame(chunk_data)
                     yield js_chunk
 
             # ✅ Wrapper to save messages after streaming
@@ -746,7 +914,10 @@ async def stream_chat_request(request: Request):
                 try:
                     # Determine which citation metadata to use (prefer Phase 2)
                     citation_metadata = None
-                    if phase2_data and "citation_metadata" in phase2_data:
+                    if streamed_citations:
+                        citation_metadata = {"citations": streamed_citations}
+                        logger.info("Using incrementally streamed citations for saving")
+                    elif phase2_data and "citation_metadata" in phase2_data:
                         citation_metadata = phase2_data["citation_metadata"]
                         logger.info("Using Phase 2 citation metadata for saving")
                     elif phase1_data and "citation_metadata" in phase1_data:
@@ -766,7 +937,7 @@ async def stream_chat_request(request: Request):
                                 user_id=user_id,
                                 thread_id=thread_id,
                                 role="tool",
-                                content=str(tool_content),
+                                content=json.dumps(tool_content, default=str),
                                 contract_id=None,  # Multi-contract has no single contract_id
                             )
                             tool_message.save()
@@ -782,13 +953,14 @@ async def stream_chat_request(request: Request):
                             user_id=user_id,
                             thread_id=thread_id,
                             role="assistant",
-                            content=phase1_data["content"],
+                            content=phase1_content,
                             contract_id=None,  # Multi-contract
                         )
                         assistant_message.save()
                         logger.info("✅ Multi-contract assistant message saved to DB")
 
                     logger.info("✅ All multi-contract messages saved to database successfully")
+                    schedule_summary_update(chat_controller, user_id, thread_id)
 
                 except Exception as save_error:
                     logger.error(f"❌ Error saving multi-contract messages to database: {str(save_error)}")
@@ -796,8 +968,19 @@ async def stream_chat_request(request: Request):
                     logger.error(traceback.format_exc())
                     # Don't raise - streaming already completed successfully
 
+            stream = track_execution(
+                load_monitor.observe(generate_multi_and_save(), user_id, ai_mode),
+                user_id,
+                ai_mode,
+                len(contract_workspace_list),
+            )
+            stream = append_timing_frame(stream)
+            if ticket is not None:
+                stream = admission_controller.admit(ticket, stream)
             return StreamingResponse(
-                generate_multi_and_save(), media_type="application/json-lines"
+                generation.start(stream) if generation else stream,
+                media_type="application/json-lines",
+                headers={"X-AI-Mode-Used": ai_mode},
             )
 
         # Single contract flow
@@ -811,6 +994,10 @@ async def stream_chat_request(request: Request):
             logger.error(
                 "Contract doesn't exist or user is not allowed to get insights"
             )
+            if generation is not None:
+                generation.release()
+            if ticket is not None:
+                ticket.release()
             return JSONResponse(
                 status_code=400,
                 content=prepare_error_payload(
@@ -820,21 +1007,46 @@ async def stream_chat_request(request: Request):
             )
         contract_workspace = contract.contract_workspace
 
+        # Answers to standalone questions are cached per workspace content version
+        cache_question = messages[-1]["content"]
+        cache_version = None
+        cached_answer = None
+        if ANSWER_CACHE_ENABLED and sum(1 for m in message_history if m.get("role") == "user") == 1:
+            cache_version = await asyncio.to_thread(get_workspace_content_version, contract_workspace)
+            cached_answer = get_cached_answer(
+                contract_workspace, cache_question, ai_mode, cache_version
+            )
+
+        # Questions already answered by the attribute pipeline skip RAG/LLM
+        if cached_answer is None and ATTRIBUTE_FAST_PATH_ENABLED:
+            stored_answer = await asyncio.to_thread(find_stored_answer, contract, cache_question)
+            if stored_answer is not None:
+                cached_answer = stored_answer
+                cache_version = None
+
+        if cached_answer is not None:
+            logger.info(f"Serving cached answer for conversation_id: {thread_id}")
+            answer_stream = replay_answer(cached_answer)
+        else:
+            answer_stream = chat_controller.stream_chat_response(
+                conversation_id=thread_id,
+                message_history=message_history,
+                input_message=user_input,
+                user_id=user_id,
+                contract_workspace=contract_workspace,
+                ai_mode=ai_mode,
+            )
+            answer_stream = timed_llm_stream(metered_chat_stream(answer_stream, ai_mode))
+
         # ✅ Variables to collect Phase 1 and Phase 2 data
         phase1_data = None
         phase2_data = None
+        phase1_content = ""
 
         async def generate():
-            nonlocal phase1_data, phase2_data  # ← Access outer variables
+            nonlocal phase1_data, phase2_data, phase1_content  # ← Access outer variables
 
-            async for chunk in chat_controller.stream_chat_response(
-                    conversation_id=thread_id,
-                    message_history=messages,
-                    input_message=user_input,
-                    user_id=user_id,
-                    contract_workspace=contract_workspace,
-                    ai_mode=ai_mode,
-            ):
+            async for chunk in answer_stream:
                 # ============================================
                 # CHECK IF THIS IS A PHASE 2 CITATION UPDATE
                 # ============================================
@@ -849,9 +1061,12 @@ async def stream_chat_request(request: Request):
                         "citation_metadata": chunk.get("citation_metadata", {})
                     }
 
-                    js_chunk = json.dumps(chunk_data, default=str) + "\n"
+                    js_chunk = serialize_frame(chunk_data)
                     logger.info(f"📤 Yielding Phase 2 to frontend: {len(js_chunk)} bytes")
                     yield js_chunk
+                    schedule_citation_prefetch(
+                        chunk_data["citation_metadata"], user_id, access_token
+                    )
                     continue  # ⭐ Skip the rest of the loop - don't process as assistant message
 
                 # ============================================
@@ -859,6 +1074,7 @@ async def stream_chat_request(request: Request):
                 # ============================================
                 logger.debug(f"📥 Received Phase 1 chunk with keys: {list(chunk.keys())}")
                 phase1_data = chunk  # ← Store Phase 1 data
+                phase1_content += chunk["content"]
 
                 # Extract citation metadata from chunk
                 citation_metadata = chunk.get("citation_metadata", None)
@@ -869,6 +1085,7 @@ async def stream_chat_request(request: Request):
                     "content": chunk["content"],
                     "contract_id": contract_workspace_id,
                     "contract_workspace": re.sub(r'^UCW_\d+_', '', contract_workspace),
+                    "ai_mode_used": ai_mode,
                 }
 
                 # Add citation_metadata if available (Standard/Enhanced modes)
@@ -891,7 +1108,7 @@ async def stream_chat_request(request: Request):
                     "history_metadata": history_metadata,
                 }
 
-                js_chunk = json.dumps(chunk_data, default=str) + "\n"
+                js_chunk = serialize_frame(chunk_data)
                 yield js_chunk
 
         # ✅ Wrapper to save messages after streaming
@@ -928,11 +1145,14 @@ async def stream_chat_request(request: Request):
                         tool_content["citation_position"] = citation_metadata["citation_position"]
                         tool_content["method_used"] = citation_metadata.get("method_used", "unknown")
 
+                    if citation_metadata.get("citations"):
+                        tool_content["citations"] = citation_metadata["citations"]
+
                     tool_message = Message(
                         user_id=user_id,
                         thread_id=thread_id,
                         role="tool",
-                        content=str(tool_content),
+                        content=json.dumps(tool_content, default=str),
                         contract_id=contract_workspace_id,
                     )
                     tool_message.save()
@@ -946,13 +1166,24 @@ async def stream_chat_request(request: Request):
                         user_id=user_id,
                         thread_id=thread_id,
                         role="assistant",
-                        content=phase1_data["content"],
+                        content=phase1_content,
                         contract_id=contract_workspace_id,
                     )
                     assistant_message.save()
                     logger.info("✅ Assistant message saved to DB")
 
+                if cache_version is not None and cached_answer is None and phase1_content:
+                    store_answer(
+                        contract_workspace,
+                        cache_question,
+                        ai_mode,
+                        cache_version,
+                        phase1_content,
+                        citation_metadata,
+                    )
+
                 logger.info("✅ All messages saved to database successfully")
+                schedule_summary_update(chat_controller, user_id, thread_id)
 
             except Exception as save_error:
                 logger.error(f"❌ Error saving messages to database: {str(save_error)}")
@@ -960,10 +1191,26 @@ async def stream_chat_request(request: Request):
                 logger.error(traceback.format_exc())
                 # Don't raise - streaming already completed successfully
 
-        return StreamingResponse(generate_and_save(), media_type="application/json-lines")
+        if cached_answer is None:
+            stream = load_monitor.observe(generate_and_save(), user_id, ai_mode)
+        else:
+            stream = generate_and_save()
+        stream = track_execution(stream, user_id, ai_mode, 1, record=cached_answer is None)
+        stream = append_timing_frame(stream)
+        if ticket is not None:
+            stream = admission_controller.admit(ticket, stream)
+        return StreamingResponse(
+            generation.start(stream) if generation else stream,
+            media_type="application/json-lines",
+            headers={"X-AI-Mode-Used": ai_mode},
+        )
 
     except Exception as e:
         logger.exception("Exception occurred while streaming chat request")
+        if generation is not None:
+            generation.release()
+        if ticket is not None:
+            ticket.release()
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 ## USED
@@ -1030,54 +1277,68 @@ async def azure_oauth_redirect(request: Request):
     return RedirectResponse(f"{frontend_url_base}/{params}")
 
 
+def _lookup_or_create_login_user(json_data: dict):
+    """The User for an identity profile, created or reactivated as needed"""
+    _email = json_data.get("mail", None) or json_data.get("userPrincipalName", None)
+    if _email is None:
+        raise AuthException(payload="No email id found for user")
+
+    user = User.lookup(email=_email)
+
+    if not user:
+        logger.info(f"Creating new user: {_email}")
+        user = User.create_user(
+            first_name=json_data.get("givenName", _email) or _email,
+            last_name=json_data.get("surname", _email) or _email,
+            email=_email,
+            password=DEFAULT_PASSWORD,
+            role=DEFAULT_USER_ROLE,
+            index=find_client_details_from_email_domain(_email),
+            approved=True,
+            verified=True,
+            is_active=True,
+            allow_mfa=False,
+            allow_sso=True,
+        )
+    elif (
+        user.is_active is not True
+    ):  # Make sure the user set as active when he logs in after acount deletion
+        logger.info(f"Reactivating user: {_email}")
+        User.update_user(
+            user_id=user.user_id, is_active=True, approved=False, verified=True
+        )
+    return user
+
+
+def _issue_login_token(json_data: dict):
+    """User id, access token and index of a login, resolved in one worker thread"""
+    user = _lookup_or_create_login_user(json_data)
+    access_token = create_access_token(user)
+    return user.user_id, access_token, resolve_login_index(user, access_token)
+
+
 @auth_router.post("/getAToken")
 async def get_token_using_azure_token(body: GetAToken):
     try:
         logger.info("Acquiring token using Azure authorization code")
-        
-        code = body.code
-        redirect_uri = body.redirect_uri
-        result = acquire_token_by_authorization_code(
-            code,
-            redirect_uri=redirect_uri,
+
+        identity_provider = get_identity_provider()
+        result = await identity_provider.exchange_code(
+            body.code, redirect_uri=body.redirect_uri
         )
         if "error" in result:
             raise AuthException(payload=result)
 
-        json_data = get_user_details_from_azure_token(
+        json_data = await identity_provider.get_user_details(
             result["token_type"], result["access_token"]
         )
 
-        _email = json_data.get("mail", None) or json_data.get("userPrincipalName", None)
-        if _email is None:
-            raise AuthException(payload="No email id found for user")
-
-        user = User.lookup(email=_email)
-
-        if not user:
-            logger.info(f"Creating new user: {_email}")
-            user = User.create_user(
-                first_name=json_data.get("givenName", _email) or _email,
-                last_name=json_data.get("surname", _email) or _email,
-                email=_email,
-                password=DEFAULT_PASSWORD,
-                role=DEFAULT_USER_ROLE,
-                index=find_client_details_from_email_domain(_email),
-                approved=True,
-                verified=True,
-                is_active=True,
-                allow_mfa=False,
-                allow_sso=True,
-            )
-        elif (
-            user.is_active is not True
-        ):  # Make sure the user set as active when he logs in after acount deletion
-            logger.info(f"Reactivating user: {_email}")
-            User.update_user(
-                user_id=user.user_id, is_active=True, approved=False, verified=True
-            )
+        user_id, access_token, (index_id, index_name) = await asyncio.to_thread(
+            _issue_login_token, json_data
+        )
+        schedule_login_warmup(user_id, access_token, index_id, index_name)
         return JSONResponse(
-            status_code=200, content={"access_token": create_access_token(user)}
+            status_code=200, content={"access_token": access_token}
         )
     except CustomException as exc:
         logger.error(f"Custom exception occurred: {exc.message}")
@@ -1094,17 +1355,15 @@ async def get_token_using_azure_token(body: GetAToken):
         )
 
 
-@auth_router.get("/identity", dependencies=[Depends(auth_check)])
+@auth_router.get("/identity", dependencies=[Depends(verified_auth_check)])
 async def get_user_identity(request: Request):
     try:
         logger.info("Fetching user identity")
         user_id = request.state.user_id
-        user_obj = User.identify(user_id)
-        if not user_obj:
+        profile = await asyncio.to_thread(get_user_profile, user_id)
+        if not profile:
             raise AuthException(payload="User not found")
-        user = UserIdentitySchema().dump(user_obj)
-        user["roles"] = user_obj.roles.split(",")
-        return JSONResponse(status_code=200, content={"data": user})
+        return JSONResponse(status_code=200, content={"data": profile["identity"]})
     except CustomException as exc:
         logger.error(f"Custom exception occurred: {exc.message}")
         return JSONResponse(
@@ -1282,7 +1541,7 @@ async def get_contract_workspace_list(
         None, description="Filter by sharing type: 'uploaded', 'shared', or 'all'"
     ),
     offset: Optional[int] = Query(0, description= "offset"),
-    limit:  Optional[int] = Query(19, description="limit")
+    limit:  Optional[int] = Query(DEFAULT_CONTRACT_PAGE_SIZE, description="limit")
 ):
     try:
         logger.info("Fetching contract workspace list")
@@ -1306,19 +1565,29 @@ async def get_contract_workspace_list(
                 ),
             )
 
-        c = get_contract_management_controller(request)
+        is_first_page = (
+            not (name or order_by or contract_types or sharing_type)
+            and offset == 0
+            and limit == DEFAULT_CONTRACT_PAGE_SIZE
+        )
+        response = None
+        if is_first_page:
+            response = take_warm_result("contracts", request.state.user_id, request.state.index_id)
 
-        # Parse contract types from comma-separated string
-        contract_type_list = contract_types.split(",") if contract_types else None
+        if response is None:
+            c = get_contract_management_controller(request)
 
-        response = c.get_contract_workspaces(
-            contract_workspace_name=name,
-            order_by=order_by,
-            contract_types=contract_type_list,
-            sharing_type=sharing_type,
-            offset= offset,
-            limit=limit
-        )
+            # Parse contract types from comma-separated string
+            contract_type_list = contract_types.split(",") if contract_types else None
+
+            response = c.get_contract_workspaces(
+                contract_workspace_name=name,
+                order_by=order_by,
+                contract_types=contract_type_list,
+                sharing_type=sharing_type,
+                offset= offset,
+                limit=limit
+            )
 
         return JSONResponse(
             status_code=200, content=prepare_success_payload(data=response)
@@ -1661,8 +1930,12 @@ def serve_blob_content(blob_path: str):
         # Prevent path traversal
         if ".." in file_path or file_path.startswith("/"):
             raise CustomException(payload="Invalid file path")
-        storage = AzureStorageClient(container_name=container_name)
-        blob_stream, headers = storage.serve_file(file_path)
+        cached_blob = get_cached_page_blob(blob_path)
+        if cached_blob is not None:
+            blob_stream, headers = cached_blob
+        else:
+            storage = AzureStorageClient(container_name=container_name)
+            blob_stream, headers = storage.serve_file(file_path)
         if blob_stream:
             return Response(
                 content=blob_stream, media_type=headers["Content-Type"], headers=headers
@@ -1776,8 +2049,12 @@ async def get_custom_panels(
 ):
     try:
         logger.info("Fetching custom panels")
-        c = get_custom_panel_management_controller(request)
-        panels = c.get_custom_panels(panel_name=panel_name, order_by=order_by)
+        panels = None
+        if not (panel_name or order_by):
+            panels = take_warm_result("panels", request.state.user_id, request.state.index_id)
+        if panels is None:
+            c = get_custom_panel_management_controller(request)
+            panels = c.get_custom_panels(panel_name=panel_name, order_by=order_by)
         return JSONResponse(
             status_code=200, content=prepare_success_payload(data=panels)
         )
@@ -2474,20 +2751,19 @@ async def get_user_email_and_department(request: Request):
     Get user email and department name by user_id.
     """
     user_id = request.state.user_id
-    session = User.get_session()
     try:
         logger.info(f"Fetching email and department for user ID {user_id}")
-        user = session.query(User).filter_by(user_id=user_id).first()
-        if not user:
+        profile = await asyncio.to_thread(get_user_profile, user_id)
+        if not profile:
             raise HTTPException(status_code=404, detail="User not found")
 
-        email = user.email
-        # Only one department per user
-        department = user.departments[0].name if user.departments else None
-
         return JSONResponse(
             status_code=200,
-            content={"user_id": user_id, "email": email, "department_name": department},
+            content={
+                "user_id": user_id,
+                "email": profile["email"],
+                "department_name": profile["department_name"],
+            },
         )
     except Exception as exc:
         trace = traceback.format_exc()
@@ -2496,8 +2772,57 @@ async def get_user_email_and_department(request: Request):
         return JSONResponse(
             status_code=500, content={"success": False, "error": message}
         )
-    finally:
-        session.close()
+
+
+@user_router.get("/profile")
+async def get_user_profile_info(request: Request):
+    """
+    Identity, email, departments and index of the current user in one call.
+    """
+    user_id = request.state.user_id
+    try:
+        logger.info(f"Fetching profile for user ID {user_id}")
+        profile = await asyncio.to_thread(get_user_profile, user_id)
+        if not profile:
+            return JSONResponse(status_code=404, content={"error": "User not found"})
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "data": profile["identity"],
+                "user_id": user_id,
+                "email": profile["email"],
+                "department_name": profile["department_name"],
+                "departments": [
+                    {"department_id": department_id, "name": name}
+                    for department_id, name in profile["departments"]
+                ],
+                "index_id": request.state.index_id,
+                "index_name": request.state.index_name,
+            },
+        )
+    except Exception as exc:
+        trace = traceback.format_exc()
+        message = f"{str(exc)}\n\nTraceback:\n{trace}"
+        logger.exception("Exception occurred while fetching user profile")
+        return JSONResponse(
+            status_code=500, content={"success": False, "error": message}
+        )
+
+
+@app.on_event("startup")
+async def startup_metrics():
+    start_metrics_refresh()
+
+
+@app.on_event("shutdown")
+async def shutdown_identity_provider():
+    await close_identity_provider()
+
+
+@app.on_event("shutdown")
+async def shutdown_metrics():
+    stop_metrics_refresh()
 
 
 app.include_router(blob_router)
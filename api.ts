@@ -173,6 +173,8 @@ export async function authorization(
 		};
 
 		localStorage.setItem("user", JSON.stringify(userData));
+		// Load the new user's profile while the app starts up
+		getUserProfile(true).catch(() => undefined);
 		return userData;
 	} catch (error) {
 		console.error("Error authorizing:", error);
@@ -180,15 +182,11 @@ export async function authorization(
 	}
 }
 
+// Identity and department info are served from one shared /users/profile request
 export const getUserInfo = async (): Promise<any> => {
 	try {
-		const response = await fetchWithAuth(`${host}/auth/identity`, {
-			method: "GET",
-		});
-
-		if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-		const payload = await response.json();
-		return payload;
+		const profile = await getUserProfile();
+		return { data: profile.data };
 	} catch (error) {
 		console.error("Error fetching user info:", error);
 		throw error;
@@ -257,6 +255,28 @@ export const historyList = async (offset = 0): Promise<History[] | null> => {
 	}
 };
 
+export interface HistoryPage {
+	threads: History[];
+	next_cursor: string | null;
+}
+
+export const historyListPage = async (cursor?: string | null, limit = 50): Promise<HistoryPage> => {
+	try {
+		const params = new URLSearchParams({ limit: String(limit) });
+		if (cursor) params.set("cursor", cursor);
+		const response = await fetchWithAuth(`${host}/chat/history/threads?${params.toString()}`, {
+			method: "GET",
+		});
+
+		if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+		const payload = await response.json();
+		return { threads: payload?.threads ?? [], next_cursor: payload?.next_cursor ?? null };
+	} catch (error) {
+		console.error("Error fetching history page:", error);
+		throw error;
+	}
+};
+
 export const historyRead = async (convId: string): Promise<any> => {
 	try {
 		const response = await fetchWithAuth(`${host}/chat/history/read`, {
@@ -289,6 +309,65 @@ export const historyRead = async (convId: string): Promise<any> => {
 	}
 };
 
+export interface MessageWindow {
+	messages: ChatMessage[];
+	next_cursor: string | null;
+}
+
+export const historyReadWindow = async (
+	convId: string,
+	before?: string | null,
+	limit = 30
+): Promise<MessageWindow> => {
+	try {
+		const response = await fetchWithAuth(`${host}/chat/history/read/window`, {
+			method: "POST",
+			body: JSON.stringify({
+				conversation_id: convId,
+				limit,
+				...(before && { before }),
+			}),
+		});
+
+		if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+		const payload = await response.json();
+
+		const messages: ChatMessage[] = [];
+		if (payload?.messages) {
+			payload.messages.forEach((msg: any) => {
+				const message = {
+					id: msg.id,
+					role: msg.role,
+					date: msg.createdAt,
+					content: msg.content,
+					feedback: msg.feedback ?? undefined,
+					citation_ref: msg.citation_ref,
+				} as ChatMessage;
+				messages.push(message);
+			});
+		}
+		return { messages, next_cursor: payload?.next_cursor ?? null };
+	} catch (error) {
+		console.error("Error fetching history window:", error);
+		throw error;
+	}
+};
+
+export const historyMessageCitations = async (messageId: string | number): Promise<any> => {
+	try {
+		const response = await fetchWithAuth(`${host}/chat/history/messages/${messageId}/citations`, {
+			method: "GET",
+		});
+
+		if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+		const payload = await response.json();
+		return payload?.citations ?? null;
+	} catch (error) {
+		console.error("Error fetching message citations:", error);
+		throw error;
+	}
+};
+
 // Fix: Promise returned return data instead and updated Chat.tsx usage
 export const historyGenerate = async (
 	options: ConversationRequest,
@@ -296,7 +375,9 @@ export const historyGenerate = async (
 	wrkspaceID: string,
 	convId?: string,
 	multiContractWorkspaceId?: ContractWorkspace[],
-	ai_mode?: string
+	ai_mode?: string,
+	idempotencyKey?: string,
+	allowModeDowngrade?: boolean
 ): Promise<Response> => {
 	const body = JSON.stringify({
 		...(convId && { conversation_id: convId }),
@@ -304,6 +385,7 @@ export const historyGenerate = async (
 		contract_workspace_id: wrkspaceID,
 		contract_workspace_list: multiContractWorkspaceId,
 		ai_mode: ai_mode || "standard",
+		...(allowModeDowngrade && { allow_mode_downgrade: true }),
 	});
 
 	try {
@@ -311,6 +393,7 @@ export const historyGenerate = async (
 			method: "POST",
 			body: body,
 			signal: abortSignal,
+			...(idempotencyKey && { headers: { "Idempotency-Key": idempotencyKey } }),
 		});
 
 		return response;
@@ -1623,13 +1706,35 @@ export async function deleteRepository(id: string): Promise<any> {
 
 export async function getUserDepartmentInfo(): Promise<any> {
 	try {
-		const response = await fetchWithAuth(`${host}/users/department_info`, {
-			method: "GET",
-		});
-		const responseJson = await response.json();
-		return responseJson;
+		const profile = await getUserProfile();
+		return {
+			user_id: profile.user_id,
+			email: profile.email,
+			department_name: profile.department_name,
+		};
 	} catch (error) {
 		console.error("Error executing getUserDepartmentInfo:", error);
 		throw error;
 	}
 }
+
+let userProfileRequest: Promise<any> | null = null;
+
+// One request per session; callers at start-up share it
+export async function getUserProfile(refresh = false): Promise<any> {
+	if (!userProfileRequest || refresh) {
+		userProfileRequest = fetchWithAuth(`${host}/users/profile`, {
+			method: "GET",
+		})
+			.then((response) => {
+				if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+				return response.json();
+			})
+			.catch((error) => {
+				userProfileRequest = null;
+				console.error("Error executing getUserProfile:", error);
+				throw error;
+			});
+	}
+	return userProfileRequest;
+}
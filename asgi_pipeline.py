@@ -0,0 +1,158 @@
+"""
+Single-pass ASGI request pipeline: CORS, correlation ID and auth context.
+
+Replaces the stack of ``CORSMiddleware``, ``CorrelationIdMiddleware`` and
+``AuthorizationMiddleware``. Request headers are scanned once, CORS preflights
+are answered without touching auth, and a single ``send`` wrapper adds the
+correlation and CORS response headers. Requests whose token is in the
+verified-token cache go straight to the app with no extra task or stream hop;
+only cache misses pass through ``AuthorizationMiddleware``. Each request also
+gets a ``RequestTimings`` (``utils.request_timing``), sent back as the
+``Server-Timing`` header and logged under the correlation ID when it finishes,
+and a SQL ``QueryLog`` (``utils.query_counter``) that flags N+1 patterns.
+Latency per route template goes to the Prometheus metrics (``utils.metrics``).
+
+Per-request overhead and streaming throughput against the old stack are
+measured by ``benchmarks/middleware_overhead.py``.
+"""
+import time
+import uuid
+
+from logging_config import correlation_id_var
+from utils.auth_cache import auth_cache_hit_var, lookup_context, remember_verified_context
+from utils.metrics import observe_request
+from utils.query_counter import query_log_var, report_query_log, start_query_log
+from utils.request_timing import RequestTimings, log_request_timings, request_timings_var
+
+SAFELISTED_HEADERS = {"accept", "accept-language", "content-language", "content-type"}
+
+
+class RequestPipelineMiddleware:
+    def __init__(
+        self,
+        app,
+        verifier=None,
+        allow_origins=("*",),
+        allow_methods=("GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"),
+        allow_headers=(),
+        allow_credentials: bool = False,
+        max_age: int = 600,
+    ):
+        self.app = app
+        self.verifying_app = verifier(app) if verifier is not None else app
+        self.allow_all_origins = "*" in allow_origins
+        self.allow_origins = set(allow_origins)
+        self.allow_methods = set(allow_methods)
+        self.allow_headers = SAFELISTED_HEADERS | {header.lower() for header in allow_headers}
+        self.allow_credentials = allow_credentials
+        self.preflight_headers = [
+            (b"access-control-allow-methods", ", ".join(allow_methods).encode("latin-1")),
+            (b"access-control-allow-headers", ", ".join(sorted(self.allow_headers)).encode("latin-1")),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+        ]
+        if allow_credentials:
+            self.preflight_headers.append((b"access-control-allow-credentials", b"true"))
+
+    def _origin_headers(self, origin: bytes) -> list:
+        """Allow-origin (and vary) headers for an allowed origin, else none"""
+        if self.allow_all_origins and not self.allow_credentials:
+            return [(b"access-control-allow-origin", b"*")]
+        if self.allow_all_origins or origin.decode("latin-1") in self.allow_origins:
+            headers = [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+            if self.allow_credentials:
+                headers.append((b"access-control-allow-credentials", b"true"))
+            return headers
+        return []
+
+    async def _preflight(self, origin: bytes, method: bytes, requested_headers: bytes, send):
+        failures = []
+        if not self._origin_headers(origin):
+            failures.append("origin")
+        if method.decode("latin-1") not in self.allow_methods:
+            failures.append("method")
+        requested = {h.strip().lower() for h in requested_headers.decode("latin-1").split(",") if h.strip()}
+        if not requested <= self.allow_headers:
+            failures.append("headers")
+
+        if failures:
+            status, body = 400, f"Disallowed CORS {', '.join(failures)}".encode("utf-8")
+            headers = [(b"content-type", b"text/plain; charset=utf-8")]
+        else:
+            status, body = 200, b"OK"
+            headers = [(b"content-type", b"text/plain; charset=utf-8")]
+            headers += self._origin_headers(origin) + self.preflight_headers
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_id = authorization = preflight_method = None
+        preflight_headers = b""
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"x-request-id":
+                request_id = value
+            elif name == b"authorization":
+                authorization = value
+            elif name == b"access-control-request-method":
+                preflight_method = value
+            elif name == b"access-control-request-headers":
+                preflight_headers = value
+
+        if scope["method"] == "OPTIONS" and origin is not None and preflight_method is not None:
+            await self._preflight(origin, preflight_method, preflight_headers, send)
+            return
+
+        correlation_id = request_id.decode("latin-1") if request_id else str(uuid.uuid4())
+        state = scope.setdefault("state", {})
+        state["correlation_id"] = correlation_id
+        correlation_token = correlation_id_var.set(correlation_id)
+        timings = RequestTimings(correlation_id)
+        timings_token = request_timings_var.set(timings)
+        query_log, query_log_token = start_query_log()
+        status = None
+
+        token = None
+        if authorization is not None:
+            scheme, _, credentials = authorization.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and credentials:
+                token = credentials.strip()
+        context = lookup_context(token)
+
+        extra_headers = [(b"x-request-id", correlation_id.encode("latin-1"))]
+        if origin is not None:
+            extra_headers += self._origin_headers(origin)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + extra_headers + [
+                    (b"server-timing", timings.header_value().encode("latin-1"))
+                ]
+                if context is None and token is not None and message["status"] < 400:
+                    remember_verified_context(token, state)
+            await send(message)
+
+        try:
+            if context is not None:
+                state.update(context)
+                hit_token = auth_cache_hit_var.set(True)
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    auth_cache_hit_var.reset(hit_token)
+            else:
+                await self.verifying_app(scope, receive, send_wrapper)
+        finally:
+            log_request_timings(timings, scope["method"], scope["path"], status)
+            report_query_log(query_log, scope["method"], scope["path"], correlation_id)
+            observe_request(scope, status, time.perf_counter() - timings.started_at, query_log.count)
+            query_log_var.reset(query_log_token)
+            request_timings_var.reset(timings_token)
+            correlation_id_var.reset(correlation_token)
@@ -0,0 +1,132 @@
+"""
+Cache of verified bearer tokens and the request context resolved from them.
+
+The request pipeline (``utils.asgi_pipeline``) sends the first request with a
+token through ``AuthorizationMiddleware`` and stores the resolved
+``request.state`` context (user, index and access token) under the token's
+SHA-256 hash. Later requests with the same token get that context from a
+dictionary lookup and skip verification, including the ``auth_check`` router
+dependency (see ``cached_auth_check``). Entries never outlive the token's
+``exp`` claim, and are dropped when the user is updated, e.g. deactivated
+through ``User.update_user``. That drop only reaches the worker that ran the
+update: other workers keep serving the user's cached tokens for at most
+``AUTH_CACHE_TTL`` seconds, which is the only cross-worker bound.
+"""
+import asyncio
+import base64
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import logging
+import logging_config
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from components.models.auth import User
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() == "true"
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_CONTEXT_KEYS = ("user_id", "index_name", "index_id", "access_token")
+
+_auth_cache = TTLCache(
+    "auth_token",
+    max_size=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=AUTH_CACHE_TTL,
+)
+_user_tokens = {}
+_user_tokens_lock = threading.Lock()
+
+auth_cache_hit_var = contextvars.ContextVar("auth_cache_hit", default=False)
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _token_expiry(token: str):
+    """``exp`` claim of a JWT, read without verification (the token was verified on the miss)"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+def store_context(token: str, context: dict):
+    expires_at = _token_expiry(token)
+    if expires_at is None:
+        return
+    ttl = min(AUTH_CACHE_TTL, expires_at - time.time())
+    if ttl <= 0:
+        return
+    token_hash = _token_hash(token)
+    _auth_cache.set(token_hash, context, ttl=ttl)
+    with _user_tokens_lock:
+        _user_tokens.setdefault(context.get("user_id"), set()).add(token_hash)
+
+
+def invalidate_user(user_id) -> int:
+    """Drop every cached token of a user"""
+    with _user_tokens_lock:
+        token_hashes = _user_tokens.pop(user_id, set())
+    for token_hash in token_hashes:
+        _auth_cache.pop(token_hash)
+    if token_hashes:
+        logger.info(f"Invalidated {len(token_hashes)} cached tokens for user {user_id}")
+    return len(token_hashes)
+
+
+def invalidate_all():
+    with _user_tokens_lock:
+        _user_tokens.clear()
+    _auth_cache.clear()
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    invalidate_user(target.user_id)
+
+
+@event.listens_for(Session, "after_bulk_update")
+def _users_bulk_updated(update_context):
+    if getattr(update_context.mapper, "class_", None) is User:
+        invalidate_all()
+
+
+def lookup_context(token: str):
+    """Cached request context for a verified token, or None"""
+    if not AUTH_CACHE_ENABLED or not token:
+        return None
+    return _auth_cache.get(_token_hash(token))
+
+
+def remember_verified_context(token: str, state: dict):
+    """Cache the context a request resolved once it has passed verification and auth_check"""
+    if not AUTH_CACHE_ENABLED or not token:
+        return
+    if all(state.get(key) is not None for key in ("user_id", "index_id")):
+        store_context(token, {key: state.get(key) for key in AUTH_CONTEXT_KEYS})
+
+
+def cached_auth_check(check):
+    """``check`` as a FastAPI dependency that is skipped for requests served from the token cache"""
+
+    @functools.wraps(check)
+    async def dependency(*args, **kwargs):
+        if auth_cache_hit_var.get():
+            return None
+        if inspect.iscoroutinefunction(check):
+            return await check(*args, **kwargs)
+        return await asyncio.to_thread(check, *args, **kwargs)
+
+    return dependency
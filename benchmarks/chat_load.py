@@ -0,0 +1,314 @@
+"""
+Load harness for chat streaming (``/api/chat/history/generate``).
+
+Starts the API with uvicorn, with the fake LLM backend from
+``benchmarks/fake_chat_backend.py`` plugged in through
+``CHAT_CONTROLLER_FACTORY`` and the stub identity provider for logins. It
+then drives concurrent single- and multi-contract conversations of several
+turns each. Every step of ``--concurrency`` (e.g. ``50,100,200,400``) runs
+for ``--duration`` seconds and reports:
+
+- TTFT (request sent to the first answer frame), p50/p95/p99;
+- inter-chunk gaps between answer frames, p50/p99/max;
+- completed answers per second, answer frames per second, and how many
+  requests were queued or rejected by admission control;
+- per worker: event-loop lag p50/p99/max and current/peak RSS.
+
+The database in the app's environment is used for users, contracts and
+messages. ``--email-domain`` must be a domain mapped to a client index there,
+so stub logins get an index. Use ``--base-url`` to load an already running
+server; it must have the fake backend configured for the numbers to mean
+anything, logins need ``IDENTITY_PROVIDER=stub`` with ``APP_ENV=test``, and
+worker stats are then only collected if it shares ``--stats-dir``.
+
+Usage:
+    python -m benchmarks.chat_load --email-domain example.com --concurrency 50,100,200 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+FAKE_BACKEND = "benchmarks.fake_chat_backend:FakeThreadAPIController"
+QUESTIONS = [
+    "What is the termination notice period?",
+    "Summarize the payment terms.",
+    "Is there a liability cap?",
+    "Which law governs this agreement?",
+    "When does the contract renew?",
+]
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class StepStats:
+    def __init__(self):
+        self.ttfts = []
+        self.gaps = []
+        self.answers = 0
+        self.frames = 0
+        self.queued = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def report(self, concurrency: int, seconds: float) -> dict:
+        return {
+            "concurrency": concurrency,
+            "answers": self.answers,
+            "answers_per_s": round(self.answers / seconds, 2),
+            "frames_per_s": round(self.frames / seconds, 1),
+            "ttft_ms": {
+                "p50": round(_percentile(self.ttfts, 0.5) * 1000, 1),
+                "p95": round(_percentile(self.ttfts, 0.95) * 1000, 1),
+                "p99": round(_percentile(self.ttfts, 0.99) * 1000, 1),
+            },
+            "gap_ms": {
+                "p50": round(_percentile(self.gaps, 0.5) * 1000, 1),
+                "p99": round(_percentile(self.gaps, 0.99) * 1000, 1),
+                "max": round(max(self.gaps, default=0.0) * 1000, 1),
+            },
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+class Reviewer:
+    """One logged-in user with their own contracts"""
+
+    def __init__(self, email: str, token: str, contracts: list):
+        self.email = email
+        self.token = token
+        self.contracts = contracts
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def _login(client: httpx.AsyncClient, email: str) -> str:
+    response = await client.post("/api/auth/getAToken", json={"code": f"stub:{email}", "redirect_uri": ""})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def _ensure_contract(client: httpx.AsyncClient, headers: dict, name: str) -> dict:
+    response = await client.post(
+        "/api/contract-mgmt/contract",
+        headers=headers,
+        json={"contract_workspace_name": name, "comments": "chat load test", "templates": [], "contract_type": ""},
+    )
+    if response.status_code == 200:
+        return {"id": str(response.json()["data"]["contract_workspace_id"]), "label": name}
+
+    listing = await client.get("/api/contract-mgmt/only_contracts", headers=headers, params={"name": name})
+    listing.raise_for_status()
+    for contract in listing.json()["data"]["contracts"]:
+        if contract["contract_workspace"] == name:
+            return {"id": str(contract["contract_id"]), "label": name}
+    raise RuntimeError(f"Could not create or find contract {name}: {response.text}")
+
+
+async def setup_reviewers(client: httpx.AsyncClient, users: int, contracts_per_user: int, domain: str) -> list:
+    async def setup(n: int) -> Reviewer:
+        email = f"chat-load-{n}@{domain}"
+        token = await _login(client, email)
+        headers = {"Authorization": f"Bearer {token}"}
+        contracts = [
+            await _ensure_contract(client, headers, f"chat-load-{n}-{c}") for c in range(contracts_per_user)
+        ]
+        return Reviewer(email, token, contracts)
+
+    return await asyncio.gather(*(setup(n) for n in range(users)))
+
+
+async def ask(client: httpx.AsyncClient, reviewer: Reviewer, contracts: list, conversation_id, stats: StepStats):
+    """One turn; returns the conversation ID for the next turn"""
+    message = {
+        "id": str(uuid.uuid4()),
+        "role": "user",
+        "content": random.choice(QUESTIONS),
+        "contract_id": contracts[0]["id"],
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    body = {
+        "messages": [message],
+        "contract_workspace_id": contracts[0]["id"],
+        "contract_workspace_list": contracts,
+        "ai_mode": "standard",
+        "allow_mode_downgrade": True,
+    }
+    if conversation_id:
+        body["conversation_id"] = conversation_id
+
+    started = time.perf_counter()
+    last_answer_frame = None
+    async with client.stream(
+        "POST", "/api/chat/history/generate", headers={**reviewer.headers, "Idempotency-Key": message["id"]}, json=body
+    ) as response:
+        if response.status_code in (429, 503):
+            stats.rejected += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+            return conversation_id
+        if response.status_code != 200:
+            stats.errors += 1
+            return conversation_id
+
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            frame = json.loads(line)
+            if "queue_position" in frame:
+                if frame["queue_position"] > 0:
+                    stats.queued += 1
+                continue
+            if "choices" not in frame:
+                continue
+            now = time.perf_counter()
+            if last_answer_frame is None:
+                stats.ttfts.append(now - started)
+            else:
+                stats.gaps.append(now - last_answer_frame)
+            last_answer_frame = now
+            stats.frames += 1
+            conversation_id = (frame.get("history_metadata") or {}).get("conversation_id") or conversation_id
+
+    if last_answer_frame is None:
+        stats.errors += 1
+    else:
+        stats.answers += 1
+    return conversation_id
+
+
+async def conversation_loop(client, reviewers: list, args, deadline: float, stats: StepStats):
+    while time.monotonic() < deadline:
+        reviewer = random.choice(reviewers)
+        if random.random() < args.multi_ratio and len(reviewer.contracts) > 1:
+            contracts = random.sample(reviewer.contracts, min(args.contracts_per_multi, len(reviewer.contracts)))
+        else:
+            contracts = [random.choice(reviewer.contracts)]
+        conversation_id = None
+        for _ in range(args.turns):
+            if time.monotonic() >= deadline:
+                break
+            try:
+                conversation_id = await ask(client, reviewer, contracts, conversation_id, stats)
+            except (httpx.HTTPError, json.JSONDecodeError):
+                stats.errors += 1
+            await asyncio.sleep(random.uniform(0, args.think_time))
+
+
+def read_worker_stats(stats_dir: Path) -> list:
+    workers = []
+    for path in sorted(stats_dir.glob("*.json")):
+        try:
+            workers.append(json.loads(path.read_text()))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return workers
+
+
+def start_server(args, stats_dir: Path):
+    env = {
+        **os.environ,
+        "CHAT_CONTROLLER_FACTORY": FAKE_BACKEND,
+        "IDENTITY_PROVIDER": "stub",
+        "APP_ENV": "test",
+        "CHAT_LOAD_STATS_DIR": str(stats_dir),
+        "CITATION_PREFETCH_ENABLED": "false",
+        "CHAT_ANSWER_CACHE_ENABLED": "false",
+        "CHAT_ATTRIBUTE_FAST_PATH_ENABLED": "false",
+        "FAKE_LLM_TTFT_MS": str(args.ttft_ms),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+        "FAKE_LLM_CITATION_DELAY_MS": str(args.citation_delay_ms),
+        "FAKE_LLM_CPU_MS_PER_CHUNK": str(args.cpu_ms_per_chunk),
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "api:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, env=env)
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("API did not come up")
+
+
+async def run(args) -> list:
+    stats_dir = Path(args.stats_dir or tempfile.mkdtemp(prefix="chat-load-"))
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    server = None if args.base_url else start_server(args, stats_dir)
+    base_url = args.base_url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 10, max_keepalive_connections=max(args.concurrency))
+    timeout = httpx.Timeout(args.request_timeout, connect=10)
+    reports = []
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+            await wait_until_up(client)
+            reviewers = await setup_reviewers(client, args.users, args.contracts_per_user, args.email_domain)
+
+            for concurrency in args.concurrency:
+                stats = StepStats()
+                started = time.monotonic()
+                deadline = started + args.duration
+                await asyncio.gather(
+                    *(conversation_loop(client, reviewers, args, deadline, stats) for _ in range(concurrency))
+                )
+                report = stats.report(concurrency, time.monotonic() - started)
+                await asyncio.sleep(1.5)
+                report["workers"] = read_worker_stats(stats_dir)
+                reports.append(report)
+                print(json.dumps(report), flush=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat streaming load test with a fake LLM backend")
+    parser.add_argument("--email-domain", required=True, help="Domain mapped to a client index in the database")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[50, 100, 200])
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per concurrency step")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--contracts-per-user", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation")
+    parser.add_argument("--multi-ratio", type=float, default=0.2, help="Share of multi-contract conversations")
+    parser.add_argument("--contracts-per-multi", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=2.0, help="Max seconds between turns")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-url", help="Load a running server instead of starting one")
+    parser.add_argument("--stats-dir")
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--ttft-ms", type=float, default=800)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--answer-tokens", type=int, default=250)
+    parser.add_argument("--citation-delay-ms", type=float, default=1500)
+    parser.add_argument("--cpu-ms-per-chunk", type=float, default=0)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,491 @@
+"""
+Contract listing and visibility at scale.
+
+Generates synthetic indexes of 1k to 1M contracts in a local Postgres and
+times ``ContractManagement.get_contract_workspaces``,
+``get_contract_workspaces_only`` and ``get_files`` for three personas:
+
+- ``owner``: uploads contracts, is in two departments that others share into,
+  and leads categories / owns CPI (Ariba) workspaces through
+  ``ContractAccessManagement`` and ``UserCategory`` rows;
+- ``member``: only sees what is shared with their department;
+- ``cpi_admin``: in department 15, so sees every non-failed CPI contract.
+
+Contracts are a seeded mix of uploaded, department-shared and CPI
+workspaces, with 0-6 files each in every upload status. Each index is named
+``bench-<size>-seed<seed>`` and reused by later runs (``--regenerate`` to
+rebuild, ``--drop`` to delete).
+
+Every filter and sort combination is run ``--repeats`` times after one
+warm-up call; the report shows p50/p95/p99 latency and SQL statements per
+call. ``--save-baseline`` stores the results, and later runs exit non-zero
+when a case's p95 grows by more than ``--tolerance`` (and ``--slack-ms``), it
+runs more statements than the baseline, or the baseline is missing or does
+not match the cases run. ``--bootstrap-baseline`` saves the results as the
+baseline when none exists yet and compares against it otherwise, so the same
+command works on a fresh checkout and afterwards (see
+``benchmarks/baselines/README.md``).
+
+The app's database settings are used. Because the suite writes data, it
+refuses databases whose name does not contain ``bench`` unless
+``--allow-any-database`` is given.
+
+Usage:
+    python -m benchmarks.contract_listing --sizes 1000,10000 --bootstrap-baseline
+    python -m benchmarks.contract_listing --sizes 1000,10000 --save-baseline
+    python -m benchmarks.contract_listing --sizes 1000,10000
+"""
+import argparse
+import datetime
+import itertools
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import func, select, text
+
+from components.controllers.contract_management import ContractManagement
+from components.models.auth import (
+    ContractAccessManagement,
+    ContractDepartment,
+    User,
+    UserCategory,
+    UserDepartment,
+)
+from components.models.base import Base
+from components.models.contract import Contract, ContractStatus
+from components.models.file import File, FileUploadStatus
+from utils.query_counter import capture_queries
+
+DEFAULT_BASELINE = Path(__file__).with_name("baselines") / "contract_listing.json"
+BATCH_SIZE = 10000
+CPI_ADMIN_DEPARTMENT_ID = 15
+CONTRACT_TYPES = ["MSA", "NDA", "SOW", "Amendment", "Lease"]
+CATEGORIES = [f"bench-category-{n}" for n in range(20)]
+OTHER_USERS = 50
+OTHER_DEPARTMENTS = 8
+BENCH_EMAIL_DOMAIN = "bench.invalid"
+
+ORDER_BY = [None, "name_asc", "name_desc", "date_asc", "date_desc"]
+SHARING_TYPES = [None, "uploaded", "shared", "all"]
+NAME_FILTERS = [None, "17"]
+TYPE_FILTERS = [None, ["MSA", "SOW"]]
+
+
+def _table_of(foreign_key_column):
+    return next(iter(foreign_key_column.foreign_keys)).column.table
+
+
+def _placeholder(column, seq: int):
+    enums = getattr(column.type, "enums", None)
+    if enums:
+        return enums[0]
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if python_type is str:
+        value = f"bench-{column.name}-{seq}"
+        length = getattr(column.type, "length", None)
+        return value[-length:] if length else value
+    if python_type is bool:
+        return False
+    if python_type in (int, float):
+        return python_type(0)
+    if python_type is datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc)
+    if python_type is datetime.date:
+        return datetime.date.today()
+    if python_type in (dict, list):
+        return python_type()
+    return None
+
+
+def _complete(table, rows: list) -> list:
+    """Rows restricted to ``table``'s columns, with unset NOT NULL columns given placeholder values"""
+    rows = [{key: value for key, value in row.items() if key in table.c} for row in rows]
+    required = [
+        column
+        for column in table.columns
+        if not column.nullable
+        and column.default is None
+        and column.server_default is None
+        and not (column.primary_key and column.autoincrement in (True, "auto"))
+    ]
+    for seq, row in enumerate(rows):
+        for column in required:
+            if column.key not in row:
+                if column.foreign_keys:
+                    raise ValueError(f"No synthetic value for required foreign key {table.name}.{column.name}")
+                row[column.key] = _placeholder(column, seq)
+    return rows
+
+
+def _insert(session, table, rows: list, returning=None):
+    if not rows:
+        return []
+    statement = table.insert()
+    if returning is not None:
+        return session.execute(statement.returning(returning), _complete(table, rows)).scalars().all()
+    session.execute(statement, _complete(table, rows))
+    return []
+
+
+def _primary_key(table):
+    return list(table.primary_key.columns)[0]
+
+
+class SyntheticIndex:
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.seed = seed
+        self.name = f"bench-{size}-seed{seed}"
+        self.index_table = _table_of(Contract.__table__.c.index_id)
+        self.department_table = _table_of(UserDepartment.__table__.c.department_id)
+        self.index_id = None
+        self.users = {}
+
+    def _email(self, persona: str) -> str:
+        return f"{persona}.{self.name}@{BENCH_EMAIL_DOMAIN}"
+
+    def load(self, session) -> bool:
+        """Look up an already generated index; True if it is complete"""
+        index_pk = _primary_key(self.index_table)
+        self.index_id = session.execute(
+            select(index_pk).where(self.index_table.c.name == self.name)
+        ).scalar()
+        if self.index_id is None:
+            return False
+        for persona in ("owner", "member", "cpi_admin"):
+            self.users[persona] = session.execute(
+                select(User.__table__.c.user_id).where(User.__table__.c.email == self._email(persona))
+            ).scalar()
+        contracts = session.execute(
+            select(func.count()).select_from(Contract.__table__).where(Contract.__table__.c.index_id == self.index_id)
+        ).scalar()
+        return contracts == self.size and all(self.users.values())
+
+    def drop(self, session):
+        if self.index_id is None:
+            self.load(session)
+        if self.index_id is None:
+            return
+        contracts = Contract.__table__
+        workspaces = select(contracts.c.contract_workspace).where(contracts.c.index_id == self.index_id)
+        ariba_workspaces = select(contracts.c.ariba_contract_workspace).where(contracts.c.index_id == self.index_id)
+        contract_ids = select(contracts.c.contract_id).where(contracts.c.index_id == self.index_id)
+        session.execute(File.__table__.delete().where(File.__table__.c.contract_workspace.in_(workspaces)))
+        session.execute(
+            ContractDepartment.__table__.delete().where(ContractDepartment.__table__.c.contract_id.in_(contract_ids))
+        )
+        session.execute(
+            ContractAccessManagement.__table__.delete().where(
+                ContractAccessManagement.__table__.c.contract_workspace.in_(ariba_workspaces)
+            )
+        )
+        session.execute(contracts.delete().where(contracts.c.index_id == self.index_id))
+        bench_users = select(User.__table__.c.user_id).where(User.__table__.c.email.like(f"%.{self.name}@{BENCH_EMAIL_DOMAIN}"))
+        session.execute(UserDepartment.__table__.delete().where(UserDepartment.__table__.c.user_id.in_(bench_users)))
+        session.execute(
+            UserCategory.__table__.delete().where(UserCategory.__table__.c.category_lead == self._email("owner"))
+        )
+        session.execute(User.__table__.delete().where(User.__table__.c.email.like(f"%.{self.name}@{BENCH_EMAIL_DOMAIN}")))
+        session.execute(self.department_table.delete().where(self.department_table.c.name.like(f"{self.name}-%")))
+        session.execute(self.index_table.delete().where(_primary_key(self.index_table) == self.index_id))
+        session.commit()
+        self.index_id = None
+
+    def _ensure_cpi_admin_department(self, session):
+        department_pk = _primary_key(self.department_table)
+        exists = session.execute(
+            select(department_pk).where(department_pk == CPI_ADMIN_DEPARTMENT_ID)
+        ).scalar()
+        if exists is None:
+            _insert(session, self.department_table, [{department_pk.key: CPI_ADMIN_DEPARTMENT_ID, "name": "CPI admin"}])
+
+    def generate(self, session):
+        rng = random.Random(self.seed * 1_000_003 + self.size)
+        print(f"Generating {self.name} ...", file=sys.stderr)
+
+        self.index_id = _insert(session, self.index_table, [{"name": self.name}], _primary_key(self.index_table))[0]
+        self._ensure_cpi_admin_department(session)
+        departments = _insert(
+            session,
+            self.department_table,
+            [{"name": f"{self.name}-department-{n}"} for n in range(OTHER_DEPARTMENTS)],
+            _primary_key(self.department_table),
+        )
+        owner_departments, member_department = departments[:2], departments[1]
+
+        personas = ["owner", "member", "cpi_admin"] + [f"user{n}" for n in range(OTHER_USERS)]
+        user_ids = _insert(
+            session,
+            User.__table__,
+            [
+                {"email": self._email(persona), "first_name": persona, "last_name": "bench", "is_active": True}
+                for persona in personas
+            ],
+            User.__table__.c.user_id,
+        )
+        self.users = dict(zip(personas, user_ids))
+        memberships = [{"user_id": self.users["owner"], "department_id": d} for d in owner_departments]
+        memberships.append({"user_id": self.users["member"], "department_id": member_department})
+        memberships.append({"user_id": self.users["cpi_admin"], "department_id": CPI_ADMIN_DEPARTMENT_ID})
+        memberships += [
+            {"user_id": self.users[f"user{n}"], "department_id": departments[n % len(departments)]}
+            for n in range(OTHER_USERS)
+        ]
+        _insert(session, UserDepartment.__table__, memberships)
+        led_categories = CATEGORIES[:3]
+        _insert(
+            session,
+            UserCategory.__table__,
+            [{"category": category, "category_lead": self._email("owner")} for category in led_categories],
+        )
+
+        contract_statuses = [status.capitalized_name for status in ContractStatus]
+        file_statuses = [status.capitalized_name for status in FileUploadStatus]
+        uploaders = [self.users["owner"]] + [self.users[f"user{n}"] for n in range(OTHER_USERS)]
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        for start in range(0, self.size, BATCH_SIZE):
+            batch = range(start, min(start + BATCH_SIZE, self.size))
+            contracts, kinds = [], []
+            for n in batch:
+                kind = rng.choices(["uploaded", "shared", "cpi"], weights=[3, 4, 3])[0]
+                uploader = self.users["owner"] if kind == "uploaded" and rng.random() < 0.3 else rng.choice(uploaders)
+                ariba_workspace = f"CW{self.seed}{self.size}{n:07d}" if kind == "cpi" else None
+                created_at = now - datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+                contracts.append({
+                    "contract_workspace": f"UCW_{uploader}_{self.name} contract {n}",
+                    "ariba_contract_workspace": ariba_workspace,
+                    "ariba_contract_ws_name": f"Ariba {n}" if ariba_workspace else None,
+                    "user_id": uploader,
+                    "index_id": self.index_id,
+                    "source": "CPI" if kind == "cpi" else "Manual",
+                    "status": rng.choice(contract_statuses),
+                    "contract_type": rng.choice(CONTRACT_TYPES),
+                    "comments": "",
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                })
+                kinds.append(kind)
+            contract_ids = _insert(session, Contract.__table__, contracts, Contract.__table__.c.contract_id)
+
+            shares, access_rows, files = [], [], []
+            for contract_id, contract, kind in zip(contract_ids, contracts, kinds):
+                if kind == "shared":
+                    for department in rng.sample(departments, rng.randint(1, 2)):
+                        shares.append({
+                            "contract_id": contract_id,
+                            "department_id": department,
+                            "shared_user_id": contract["user_id"],
+                        })
+                elif kind == "cpi":
+                    owner = self._email("owner") if rng.random() < 0.05 else self._email(f"user{rng.randrange(OTHER_USERS)}")
+                    access_rows.append({
+                        "contract_workspace": contract["ariba_contract_workspace"],
+                        "contract_owner": owner,
+                        "category": rng.choice(CATEGORIES),
+                    })
+                for f in range(rng.choice([0, 1, 1, 2, 3, 6])):
+                    files.append({
+                        "file_name": f"document-{f}.pdf",
+                        "file_type": "pdf",
+                        "status": rng.choice(file_statuses),
+                        "contract_workspace": contract["contract_workspace"],
+                        "index_id": self.index_id,
+                        "user_id": contract["user_id"],
+                        "created_at": contract["created_at"],
+                        "updated_at": contract["created_at"],
+                    })
+            _insert(session, ContractDepartment.__table__, shares)
+            _insert(session, ContractAccessManagement.__table__, access_rows)
+            _insert(session, File.__table__, files)
+            session.commit()
+            print(f"  {min(start + BATCH_SIZE, self.size)}/{self.size} contracts", file=sys.stderr)
+
+        session.execute(text("ANALYZE"))
+        session.commit()
+
+
+def _busiest_visible_contract(synthetic: SyntheticIndex, controller: ContractManagement, session):
+    """ID of the contract with the most files that ``controller``'s user can see.
+
+    Contracts uploaded by someone else are preferred, so ``get_files`` runs
+    through the department and CPI visibility checks rather than ownership.
+    """
+    visible = {contract["contract_id"] for contract in controller.get_contract_workspaces_only()["contracts"]}
+    contracts = Contract.__table__
+    file_counts = (
+        select(contracts.c.contract_id, contracts.c.user_id)
+        .join(File.__table__, File.__table__.c.contract_workspace == contracts.c.contract_workspace)
+        .where(contracts.c.index_id == synthetic.index_id)
+        .group_by(contracts.c.contract_id, contracts.c.user_id)
+        .order_by(func.count(File.__table__.c.file_id).desc(), contracts.c.contract_id)
+    )
+    own = None
+    for contract_id, uploader in session.execute(file_counts):
+        if contract_id not in visible:
+            continue
+        if uploader != controller.user_id:
+            return contract_id
+        own = own or contract_id
+    return own
+
+
+def _cases(synthetic: SyntheticIndex, session):
+    """(case name, callable) pairs for every persona, method and filter combination"""
+    for persona in ("owner", "member", "cpi_admin"):
+        user_id = synthetic.users[persona]
+        controller = ContractManagement(user_id, synthetic.name, synthetic.index_id, "")
+
+        for name, order_by, types, sharing, offset in itertools.product(
+            NAME_FILTERS, ORDER_BY, TYPE_FILTERS, SHARING_TYPES, [0, 190]
+        ):
+            label = (
+                f"get_contract_workspaces/{persona}/name={name}/order={order_by}/"
+                f"types={','.join(types) if types else None}/sharing={sharing}/offset={offset}"
+            )
+            yield label, lambda c=controller, n=name, o=order_by, t=types, s=sharing, off=offset: c.get_contract_workspaces(
+                contract_workspace_name=n, order_by=o, contract_types=t, sharing_type=s, offset=off, limit=19
+            )
+
+        for name in NAME_FILTERS:
+            yield (
+                f"get_contract_workspaces_only/{persona}/name={name}",
+                lambda c=controller, n=name: c.get_contract_workspaces_only(contract_workspace_name=n),
+            )
+
+        busiest = _busiest_visible_contract(synthetic, controller, session)
+        if busiest is None:
+            continue
+        for file_name, page in itertools.product([None, "document-1"], [1, 2]):
+            yield (
+                f"get_files/{persona}/file_name={file_name}/page={page}",
+                lambda c=controller, i=busiest, f=file_name, p=page: c.get_files(
+                    i, file_name=f, page_number=p, page_size=3
+                ),
+            )
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def measure(run, repeats: int) -> dict:
+    run()
+    durations, statements = [], []
+    for _ in range(repeats):
+        with capture_queries() as queries:
+            started = time.perf_counter()
+            run()
+            durations.append((time.perf_counter() - started) * 1000)
+        statements.append(queries.count)
+    durations.sort()
+    return {
+        "p50_ms": round(statistics.median(durations), 2),
+        "p95_ms": round(_percentile(durations, 0.95), 2),
+        "p99_ms": round(_percentile(durations, 0.99), 2),
+        "queries": max(statements),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, slack_ms: float, expected: set) -> list:
+    """Regressions against ``baseline``; cases missing on either side count as regressions too.
+
+    ``expected`` is the set of baseline cases this run should have measured.
+    """
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            regressions.append(f"{case}: not in baseline")
+            continue
+        limit = previous["p95_ms"] * (1 + tolerance) + slack_ms
+        if current["p95_ms"] > limit:
+            regressions.append(f"{case}: p95 {current['p95_ms']}ms > {previous['p95_ms']}ms baseline")
+        if current["queries"] > previous["queries"]:
+            regressions.append(f"{case}: {current['queries']} queries > {previous['queries']} baseline")
+    for case in sorted(expected - results.keys()):
+        regressions.append(f"{case}: in baseline but not run")
+    return regressions
+
+
+def main(args) -> int:
+    session = Base.get_session()
+    try:
+        database = session.execute(text("SELECT current_database()")).scalar()
+        if "bench" not in database and not args.allow_any_database:
+            print(f"Refusing to write benchmark data to database '{database}'", file=sys.stderr)
+            return 2
+
+        results = {}
+        for size in args.sizes:
+            synthetic = SyntheticIndex(size, args.seed)
+            if args.drop or args.regenerate:
+                synthetic.drop(session)
+                if args.drop:
+                    continue
+            if not synthetic.load(session):
+                if synthetic.index_id is not None:
+                    synthetic.drop(session)
+                synthetic.generate(session)
+
+            for case, run in _cases(synthetic, session):
+                if args.filter and args.filter not in case:
+                    continue
+                key = f"{size}/{case}"
+                results[key] = measure(run, args.repeats)
+                r = results[key]
+                print(f"{key:<120}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['queries']:>6}")
+    finally:
+        session.close()
+
+    if args.drop:
+        return 0
+    if args.save_baseline or (args.bootstrap_baseline and not args.baseline.exists()):
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+    if not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}; run with --bootstrap-baseline or --save-baseline first",
+            file=sys.stderr,
+        )
+        return 1
+
+    baseline = json.loads(args.baseline.read_text())
+    measured_sizes = {str(size) for size in args.sizes}
+    expected = {
+        case
+        for case in baseline
+        if case.split("/", 1)[0] in measured_sizes and (not args.filter or args.filter in case)
+    }
+    regressions = compare(results, baseline, args.tolerance, args.slack_ms, expected)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark contract listing and visibility at scale")
+    parser.add_argument("--sizes", type=lambda v: [int(s) for s in v.split(",")], default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument(
+        "--bootstrap-baseline", action="store_true", help="Save this run as the baseline if none exists yet"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative p95 growth")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="Allowed absolute p95 growth")
+    parser.add_argument("--regenerate", action="store_true")
+    parser.add_argument("--drop", action="store_true", help="Delete the synthetic indexes and exit")
+    parser.add_argument("--allow-any-database", action="store_true")
+    sys.exit(main(parser.parse_args()))
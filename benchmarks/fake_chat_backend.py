@@ -0,0 +1,207 @@
+"""
+Fake ``ThreadAPIController`` for chat load tests.
+
+Streams synthetic answers in the same chunk format as the real controller:
+Phase 1 content chunks (with ``citation_loading`` metadata), then a Phase 2
+``citation_update``, or for multi-contract answers one incremental
+``citations`` frame per contract followed by ``citation_complete``. Timing is
+set through the environment:
+
+- ``FAKE_LLM_TTFT_MS`` (800): delay before the first chunk;
+- ``FAKE_LLM_TOKENS_PER_SECOND`` (40) and ``FAKE_LLM_TOKENS_PER_CHUNK`` (3);
+- ``FAKE_LLM_ANSWER_TOKENS`` (250): answer length;
+- ``FAKE_LLM_JITTER`` (0.2): relative random variation of every delay;
+- ``FAKE_LLM_CITATION_DELAY_MS`` (1500): Phase 2 delay after the answer;
+- ``FAKE_LLM_CPU_MS_PER_CHUNK`` (0): blocking work per chunk, to model
+  parsing/post-processing on the event loop.
+
+The server loads it with
+``CHAT_CONTROLLER_FACTORY=benchmarks.fake_chat_backend:FakeThreadAPIController``.
+When ``CHAT_LOAD_STATS_DIR`` is set, each worker also samples its event-loop
+lag (percentiles over the last minute, max since start) and RSS and writes
+them to ``<dir>/<pid>.json`` every second, for ``benchmarks/chat_load.py``
+to collect.
+"""
+import asyncio
+import json
+import os
+import random
+import resource
+import time
+from collections import deque
+from pathlib import Path
+
+TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "800"))
+TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "40"))
+TOKENS_PER_CHUNK = int(os.getenv("FAKE_LLM_TOKENS_PER_CHUNK", "3"))
+ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "250"))
+JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.2"))
+CITATION_DELAY_MS = float(os.getenv("FAKE_LLM_CITATION_DELAY_MS", "1500"))
+CPU_MS_PER_CHUNK = float(os.getenv("FAKE_LLM_CPU_MS_PER_CHUNK", "0"))
+STATS_DIR = os.getenv("CHAT_LOAD_STATS_DIR")
+LAG_SAMPLE_INTERVAL = 0.05
+LAG_WINDOW_SECONDS = 60
+
+WORDS = (
+    "the supplier shall deliver services under this agreement including payment terms "
+    "termination notice liability cap renewal governing law confidentiality obligations"
+).split()
+
+
+def _delay(milliseconds: float) -> float:
+    return max(0.0, milliseconds * random.uniform(1 - JITTER, 1 + JITTER) / 1000)
+
+
+def _busy(milliseconds: float):
+    until = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < until:
+        pass
+
+
+def _rss_mb() -> tuple:
+    """(current, peak) resident set size of this process in MB"""
+    try:
+        values = {}
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, amount = line.split(":", 1)
+                    values[name] = int(amount.split()[0]) / 1024
+        return values["VmRSS"], values["VmHWM"]
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return peak, peak
+
+
+class WorkerStats:
+    """Event-loop lag and RSS of this worker, written to CHAT_LOAD_STATS_DIR"""
+
+    def __init__(self, stats_dir: str):
+        self.path = Path(stats_dir) / f"{os.getpid()}.json"
+        self.lags = deque(maxlen=int(LAG_WINDOW_SECONDS / LAG_SAMPLE_INTERVAL))
+        self.max_lag = 0.0
+        self.streams = 0
+        self.active_streams = 0
+        self.max_active_streams = 0
+
+    async def run(self):
+        last_write = time.monotonic()
+        while True:
+            expected = time.perf_counter() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if time.monotonic() - last_write >= 1:
+                self.write()
+                last_write = time.monotonic()
+
+    def write(self):
+        lags = sorted(self.lags)
+        rss, peak_rss = _rss_mb()
+        stats = {
+            "pid": os.getpid(),
+            "rss_mb": round(rss, 1),
+            "peak_rss_mb": round(peak_rss, 1),
+            "loop_lag_ms": {
+                "p50": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+                "p99": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+                "max": round(self.max_lag * 1000, 2),
+            },
+            "streams": self.streams,
+            "max_active_streams": self.max_active_streams,
+        }
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(stats))
+        temporary.replace(self.path)
+
+    def stream_started(self):
+        self.streams += 1
+        self.active_streams += 1
+        self.max_active_streams = max(self.max_active_streams, self.active_streams)
+
+    def stream_finished(self):
+        self.active_streams -= 1
+
+
+_worker_stats = None
+_background_tasks = set()
+
+
+def _stats():
+    global _worker_stats
+    if _worker_stats is None and STATS_DIR:
+        _worker_stats = WorkerStats(STATS_DIR)
+        task = asyncio.get_running_loop().create_task(_worker_stats.run())
+        _background_tasks.add(task)
+    return _worker_stats
+
+
+def _citation(contract_workspace: str, position: int = 0) -> dict:
+    return {
+        "file_id": 900000 + position,
+        "page_number": 1 + position,
+        "file_name": f"{contract_workspace or 'contract'}.pdf",
+        "citation_text": " ".join(WORDS[:12]),
+    }
+
+
+class FakeThreadAPIController:
+    def __init__(self, index_name: str, user_id: int):
+        self.index_name = index_name
+        self.user_id = user_id
+        self.stats = _stats()
+
+    async def generate_title(self, message: str) -> str:
+        await asyncio.sleep(_delay(TTFT_MS / 4))
+        return message[:40]
+
+    async def _answer_chunks(self, citation_metadata: dict):
+        await asyncio.sleep(_delay(TTFT_MS))
+        chunk_interval = 1000 * TOKENS_PER_CHUNK / TOKENS_PER_SECOND
+        for start in range(0, ANSWER_TOKENS, TOKENS_PER_CHUNK):
+            if start:
+                await asyncio.sleep(_delay(chunk_interval))
+            if CPU_MS_PER_CHUNK:
+                _busy(CPU_MS_PER_CHUNK)
+            words = [WORDS[(start + n) % len(WORDS)] for n in range(min(TOKENS_PER_CHUNK, ANSWER_TOKENS - start))]
+            yield {"content": " ".join(words) + " ", "citation_metadata": citation_metadata}
+
+    async def _metered(self, stream):
+        if self.stats is not None:
+            self.stats.stream_started()
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            if self.stats is not None:
+                self.stats.stream_finished()
+
+    async def _single(self, contract_workspace: str):
+        async for chunk in self._answer_chunks({"citation_loading": True}):
+            yield chunk
+        await asyncio.sleep(_delay(CITATION_DELAY_MS))
+        yield {
+            "citation_update": True,
+            "citation_metadata": {"citation_loading": False, **_citation(contract_workspace)},
+        }
+
+    async def _multi(self, contract_workspaces: list):
+        async for chunk in self._answer_chunks({"citation_loading": True, "citations": []}):
+            yield chunk
+        for position, contract_workspace in enumerate(contract_workspaces):
+            await asyncio.sleep(_delay(CITATION_DELAY_MS / max(1, len(contract_workspaces))))
+            yield {
+                "citation_update": True,
+                "contract_workspace": contract_workspace,
+                "citations": [_citation(contract_workspace, position)],
+            }
+        yield {"citation_update": True, "citation_complete": True}
+
+    def stream_chat_response(self, conversation_id=None, message_history=None, input_message=None,
+                             user_id=None, contract_workspace=None, ai_mode=None, **kwargs):
+        return self._metered(self._single(contract_workspace))
+
+    def stream_multi_contract_chat_response(self, conversation_id=None, message_history=None, input_message=None,
+                                            user_id=None, contract_workspace="", ai_mode=None, **kwargs):
+        return self._metered(self._multi([ws for ws in (contract_workspace or "").split(",") if ws]))
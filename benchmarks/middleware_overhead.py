@@ -0,0 +1,202 @@
+"""
+Per-request overhead and streaming throughput of the API middleware stack.
+
+Compares the previous stack (CORSMiddleware, CorrelationIdMiddleware and a
+BaseHTTPMiddleware authorization layer) with ``RequestPipelineMiddleware``.
+Both drive the same tiny Starlette app directly through ASGI, so the numbers
+are middleware cost only: no network, no database. The authorization layer is
+a stand-in that resolves request.state like ``AuthorizationMiddleware`` with a
+configurable verification cost.
+
+Usage:
+    python -m benchmarks.middleware_overhead --requests 5000 --chunks 2000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import statistics
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from logging_config import correlation_id_var
+from utils.asgi_pipeline import RequestPipelineMiddleware
+
+ALLOW_HEADERS = ["Content-Type", "Authorization", "X-Request-ID", "Idempotency-Key"]
+ALLOW_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+
+class LegacyCorrelationIdMiddleware:
+    """CorrelationIdMiddleware as it was in api.py"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers", []))
+        correlation_id = headers.get(b"x-request-id")
+        correlation_id = correlation_id.decode("utf-8") if correlation_id else str(uuid.uuid4())
+        token = correlation_id_var.set(correlation_id)
+        if "state" not in scope:
+            scope["state"] = {}
+        scope["state"]["correlation_id"] = correlation_id
+
+        async def send_with_correlation_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", correlation_id.encode("utf-8")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_correlation_id)
+        finally:
+            correlation_id_var.reset(token)
+
+
+def make_auth_stub(verify_cost_ms: float):
+    class AuthorizationStub(BaseHTTPMiddleware):
+        """Resolves request.state like AuthorizationMiddleware, at a fixed cost"""
+
+        async def dispatch(self, request, call_next):
+            if verify_cost_ms:
+                time.sleep(verify_cost_ms / 1000)
+            request.state.user_id = 1
+            request.state.index_id = 1
+            request.state.index_name = "bench"
+            request.state.access_token = request.headers.get("authorization", "")[7:]
+            return await call_next(request)
+
+    return AuthorizationStub
+
+
+def make_app(chunks: int):
+    async def ping(request):
+        return JSONResponse({"user_id": request.state.user_id})
+
+    async def stream(request):
+        async def body():
+            for index in range(chunks):
+                yield json.dumps({"content": "x" * 64, "index": index}) + "\n"
+
+        return StreamingResponse(body(), media_type="application/json-lines")
+
+    return Starlette(routes=[Route("/ping", ping), Route("/stream", stream)])
+
+
+def build_stacks(chunks: int, verify_cost_ms: float) -> dict:
+    auth_stub = make_auth_stub(verify_cost_ms)
+
+    legacy = make_app(chunks)
+    legacy = CORSMiddleware(
+        legacy,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=ALLOW_METHODS,
+        allow_headers=ALLOW_HEADERS,
+    )
+    legacy = LegacyCorrelationIdMiddleware(legacy)
+    legacy = auth_stub(legacy)
+
+    fused = RequestPipelineMiddleware(
+        make_app(chunks),
+        verifier=auth_stub,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=ALLOW_METHODS,
+        allow_headers=ALLOW_HEADERS,
+    )
+    return {"stacked": legacy, "fused": fused}
+
+
+def bench_token() -> str:
+    def segment(value: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+    return f"{segment({'alg': 'none'})}.{segment({'sub': 1, 'exp': time.time() + 3600})}.sig"
+
+
+async def call(app, path: str, token: str) -> int:
+    """Run one GET through ``app``; returns the number of body chunks received"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "server": ("bench", 80),
+        "client": ("bench", 1234),
+        "headers": [
+            (b"host", b"bench"),
+            (b"origin", b"http://localhost:3000"),
+            (b"authorization", f"Bearer {token}".encode()),
+            (b"x-request-id", str(uuid.uuid4()).encode()),
+        ],
+    }
+    received = False
+    chunks = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal chunks
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks += 1
+
+    await app(scope, receive, send)
+    return chunks
+
+
+async def run(args):
+    stacks = build_stacks(args.chunks, args.verify_cost_ms)
+    token = bench_token()
+    print(f"{'stack':<10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'stream chunks/s':>18}")
+    for name, app in stacks.items():
+        for _ in range(args.warmup):
+            await call(app, "/ping", token)
+
+        durations = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            await call(app, "/ping", token)
+            durations.append((time.perf_counter() - started) * 1_000_000)
+        durations.sort()
+
+        started = time.perf_counter()
+        total_chunks = 0
+        for _ in range(args.streams):
+            total_chunks += await call(app, "/stream", token)
+        throughput = total_chunks / (time.perf_counter() - started)
+
+        print(
+            f"{name:<10}{statistics.mean(durations):>10.1f}{durations[len(durations) // 2]:>10.1f}"
+            f"{durations[int(len(durations) * 0.99)]:>10.1f}{throughput:>18.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API middleware overhead")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--verify-cost-ms", type=float, default=0.2)
+    asyncio.run(run(parser.parse_args()))
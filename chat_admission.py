@@ -0,0 +1,148 @@
+"""
+Fair admission control for chat generation streams.
+
+Each user and each index may run a limited number of streams at once. A
+request over its caps waits in a queue and is told its position through
+``queue_position`` frames at the start of its stream. When a slot frees up,
+the next waiter is picked from the user with the fewest running streams, so a
+user with many tabs open cannot starve everyone else. Requests that would
+only make the queue longer are rejected up front with 429 (per user) or 503
+(overall) and a Retry-After hint.
+"""
+import asyncio
+import itertools
+import json
+import os
+import logging
+import logging_config
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("CHAT_ADMISSION_ENABLED", "true").lower() == "true"
+MAX_STREAMS_PER_USER = int(os.getenv("CHAT_MAX_STREAMS_PER_USER", "3"))
+MAX_STREAMS_PER_INDEX = int(os.getenv("CHAT_MAX_STREAMS_PER_INDEX", "50"))
+MAX_QUEUED_PER_USER = int(os.getenv("CHAT_MAX_QUEUED_PER_USER", "2"))
+MAX_QUEUE_LENGTH = int(os.getenv("CHAT_ADMISSION_QUEUE_MAX", "100"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_ADMISSION_QUEUE_TIMEOUT", "60"))
+RETRY_AFTER_SECONDS = int(os.getenv("CHAT_ADMISSION_RETRY_AFTER", "10"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, message: str, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, controller, user_id: int, index_id, sequence: int):
+        self.controller = controller
+        self.user_id = user_id
+        self.index_id = index_id
+        self.sequence = sequence
+        self.admitted = False
+        self.released = False
+        self.changed = asyncio.Event()
+
+    def release(self):
+        """Free the ticket's slot, or leave the queue if it was never admitted"""
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    def __init__(self):
+        self.user_active = {}
+        self.index_active = {}
+        self.queue = []
+        self._sequence = itertools.count()
+
+    def _has_capacity(self, user_id: int, index_id) -> bool:
+        return (
+            self.user_active.get(user_id, 0) < MAX_STREAMS_PER_USER
+            and self.index_active.get(index_id, 0) < MAX_STREAMS_PER_INDEX
+        )
+
+    def _admit(self, ticket: Ticket):
+        ticket.admitted = True
+        ticket.changed.set()
+        self.user_active[ticket.user_id] = self.user_active.get(ticket.user_id, 0) + 1
+        self.index_active[ticket.index_id] = self.index_active.get(ticket.index_id, 0) + 1
+
+    def enter(self, user_id: int, index_id) -> Ticket:
+        """Admit or queue a new stream; raises AdmissionRejected when it cannot be served soon"""
+        ticket = Ticket(self, user_id, index_id, next(self._sequence))
+        if not self.queue and self._has_capacity(user_id, index_id):
+            self._admit(ticket)
+            return ticket
+
+        if sum(1 for queued in self.queue if queued.user_id == user_id) >= MAX_QUEUED_PER_USER:
+            raise AdmissionRejected(429, "Too many chat requests in progress. Please wait for one to finish.")
+        if len(self.queue) >= MAX_QUEUE_LENGTH:
+            raise AdmissionRejected(503, "The assistant is busy. Please try again shortly.")
+
+        self.queue.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        """Admit waiters while capacity allows, least-served user first"""
+        while True:
+            eligible = [ticket for ticket in self.queue if self._has_capacity(ticket.user_id, ticket.index_id)]
+            if not eligible:
+                break
+            ticket = min(eligible, key=lambda t: (self.user_active.get(t.user_id, 0), t.sequence))
+            self.queue.remove(ticket)
+            self._admit(ticket)
+        for ticket in self.queue:
+            ticket.changed.set()
+
+    def _release(self, ticket: Ticket):
+        if ticket.admitted:
+            for counts, key in ((self.user_active, ticket.user_id), (self.index_active, ticket.index_id)):
+                counts[key] -= 1
+                if counts[key] <= 0:
+                    counts.pop(key, None)
+        elif ticket in self.queue:
+            self.queue.remove(ticket)
+        self._dispatch()
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based position in the queue, 0 once admitted"""
+        return self.queue.index(ticket) + 1 if ticket in self.queue else 0
+
+    async def admit(self, ticket: Ticket, stream):
+        """
+        Yield ``queue_position`` frames until the ticket is admitted, then the
+        frames of ``stream``; the slot is released when the stream ends.
+        """
+        try:
+            last_position = None
+            deadline = asyncio.get_running_loop().time() + QUEUE_TIMEOUT_SECONDS
+            while True:
+                ticket.changed.clear()
+                if ticket.admitted:
+                    break
+                position = self.position(ticket)
+                if position != last_position:
+                    last_position = position
+                    yield json.dumps({"queue_position": position}) + "\n"
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    logger.warning(f"Chat request for user {ticket.user_id} timed out in the admission queue")
+                    yield json.dumps({"error": "The assistant is busy. Please try again shortly."}) + "\n"
+                    return
+                try:
+                    await asyncio.wait_for(ticket.changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            async for chunk in stream:
+                yield chunk
+        finally:
+            ticket.release()
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,111 @@
+"""
+Cache of final chat answers per contract workspace.
+
+Answers are keyed by (contract workspace, normalized question, ai_mode,
+workspace content version). The version is read from the database on every
+lookup and is derived from the workspace's files and the contract status, so
+an upload, deletion or re-ingestion in any worker changes the key and older
+answers are never served, with no coordination between workers.
+``invalidate_workspace`` only frees this worker's superseded entries early;
+other workers drop theirs through LRU eviction or the TTL.
+"""
+import os
+import re
+import logging
+import logging_config
+from sqlalchemy import func
+
+from components.models.base import Base
+from components.models.contract import Contract
+from components.models.file import File
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("CHAT_ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+_answer_cache = TTLCache(
+    "chat_answer",
+    max_size=int(os.getenv("CHAT_ANSWER_CACHE_SIZE", "1000")),
+    ttl=int(os.getenv("CHAT_ANSWER_CACHE_TTL", "86400")),
+)
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    question = re.sub(r"\s+", " ", (question or "").strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def get_workspace_content_version(contract_workspace: str) -> tuple:
+    """
+    Fingerprint of everything an answer for the workspace depends on: the
+    contract status and the number and last modification of its files.
+    """
+    session = Base.get_session()
+    try:
+        contract_row = (
+            session.query(Contract.status, Contract.updated_at)
+            .filter(Contract.contract_workspace == contract_workspace)
+            .first()
+        )
+        file_row = (
+            session.query(func.count(File.file_id), func.max(File.updated_at))
+            .filter(File.contract_workspace == contract_workspace)
+            .one()
+        )
+        return (
+            contract_row.status if contract_row else None,
+            str(contract_row.updated_at) if contract_row else None,
+            file_row[0],
+            str(file_row[1]),
+        )
+    finally:
+        session.close()
+
+
+def _answer_key(contract_workspace: str, question: str, ai_mode: str, version: tuple) -> tuple:
+    return contract_workspace, normalize_question(question), ai_mode, version
+
+
+def get_cached_answer(contract_workspace: str, question: str, ai_mode: str, version: tuple):
+    """Return the cached answer for the current workspace version, or None"""
+    return _answer_cache.get(_answer_key(contract_workspace, question, ai_mode, version))
+
+
+def store_answer(
+    contract_workspace: str,
+    question: str,
+    ai_mode: str,
+    version: tuple,
+    content: str,
+    citation_metadata: dict = None,
+):
+    _answer_cache.set(
+        _answer_key(contract_workspace, question, ai_mode, version),
+        {"content": content, "citation_metadata": citation_metadata},
+    )
+
+
+def invalidate_workspace(contract_workspace: str) -> int:
+    """Drop every cached answer for the workspace held by this worker"""
+    removed = _answer_cache.delete_where(lambda key: key[0] == contract_workspace)
+    if removed:
+        logger.info(f"Invalidated {removed} cached answers for workspace: {contract_workspace}")
+    return removed
+
+
+async def replay_answer(entry: dict):
+    """Replay a cached answer in the same Phase 1 / Phase 2 chunk format as the controller"""
+    citation_metadata = entry.get("citation_metadata")
+    if citation_metadata:
+        citation_metadata = {**citation_metadata, "citation_loading": False}
+
+    chunk = {"content": entry["content"]}
+    if citation_metadata:
+        chunk["citation_metadata"] = citation_metadata
+    yield chunk
+
+    if citation_metadata:
+        yield {"citation_update": True, "citation_metadata": citation_metadata}
@@ -0,0 +1,159 @@
+"""
+Fast path for chat questions that the attribute pipeline has already answered.
+
+Known ``contract_question`` texts are kept in an in-memory index (plus an
+optional synonym file). When the user's chat input matches one of them and
+an answer for the contract is stored in ``contract_answer``, the most recently
+updated one and its ``source_nodes`` citations are returned without going
+through RAG/LLM.
+"""
+import json
+import os
+import re
+import logging
+import logging_config
+from sqlalchemy import text
+
+from components.models.base import Base
+from components.models.contract import ContractStatus
+from components.models.file import File
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+ATTRIBUTE_FAST_PATH_ENABLED = (
+    os.getenv("CHAT_ATTRIBUTE_FAST_PATH_ENABLED", "true").lower() == "true"
+)
+# JSON file of {"<known contract_question text>": ["<synonym>", ...]}
+QUESTION_SYNONYMS_FILE = os.getenv("CHAT_QUESTION_SYNONYMS_FILE", "")
+
+_question_index_cache = TTLCache(
+    "chat_question_index",
+    max_size=1,
+    ttl=int(os.getenv("CHAT_QUESTION_INDEX_TTL", "600")),
+)
+
+# Scope phrases that carry no meaning in a single-contract chat
+_SCOPE_SUFFIX = re.compile(r"\s+(in|of|for|from|under) (this|the) (contract|agreement)$")
+
+
+def _normalize(question: str) -> str:
+    question = re.sub(r"\s+", " ", (question or "").strip().lower()).rstrip(" ?!.")
+    return _SCOPE_SUFFIX.sub("", question)
+
+
+def _load_synonyms() -> dict:
+    if not QUESTION_SYNONYMS_FILE:
+        return {}
+    try:
+        with open(QUESTION_SYNONYMS_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Unable to load question synonyms file: {str(e)}")
+        return {}
+
+
+def _get_question_index() -> dict:
+    """Map of normalized question text (or synonym) to the matching question_ids"""
+    index = _question_index_cache.get("index")
+    if index is not None:
+        return index
+
+    session = Base.get_session()
+    try:
+        rows = session.execute(
+            text(
+                """
+                SELECT cq.question_id, cq.question
+                FROM contract_intelligence.contract_question cq
+                WHERE cq.question IS NOT NULL;
+                """
+            )
+        ).all()
+    finally:
+        session.close()
+
+    index = {}
+    for question_id, question in rows:
+        index.setdefault(_normalize(question), []).append(question_id)
+
+    for question, synonyms in _load_synonyms().items():
+        question_ids = index.get(_normalize(question))
+        if not question_ids:
+            continue
+        for synonym in synonyms:
+            index.setdefault(_normalize(synonym), []).extend(question_ids)
+
+    logger.info(f"Loaded chat question index with {len(index)} entries")
+    _question_index_cache.set("index", index)
+    return index
+
+
+def find_stored_answer(contract, user_input: str):
+    """
+    Return ``{"content", "citation_metadata"}`` for an already extracted answer
+    to ``user_input`` on ``contract``, or None if the question is not known or
+    has no usable answer.
+    """
+    if contract.status != ContractStatus.VALIDATION_PENDING.capitalized_name:
+        return None
+
+    question_ids = _get_question_index().get(_normalize(user_input))
+    if not question_ids:
+        return None
+
+    session = Base.get_session()
+    try:
+        row = session.execute(
+            text(
+                """
+                SELECT ca.answer, ca.metadata_->'source_nodes' AS source_nodes
+                FROM contract_intelligence.contract_answer ca
+                WHERE ca.contract_id = :contract_id
+                AND ca.question_id = ANY(:question_ids)
+                AND ca.answer IS NOT NULL AND ca.answer <> 'N/A'
+                ORDER BY ca.updated_at DESC
+                LIMIT 1;
+                """
+            ),
+            {"contract_id": contract.contract_id, "question_ids": list(question_ids)},
+        ).first()
+        if row is None:
+            return None
+
+        answer, source_nodes = row
+        nodes = [n for n in (source_nodes or []) if n.get("file_id") is not None]
+        missing_names = {int(n["file_id"]) for n in nodes if not n.get("file_name")}
+        file_names = {}
+        if missing_names:
+            file_names = dict(
+                session.query(File.file_id, File.file_name)
+                .filter(File.file_id.in_(missing_names))
+                .all()
+            )
+
+        citations = []
+        for node in nodes:
+            file_id = int(node["file_id"])
+            citation = {
+                "file_id": file_id,
+                "page_number": int(node.get("page_label") or 0),
+                "file_name": node.get("file_name") or file_names.get(file_id) or "Unknown",
+                "contract_workspace": contract.contract_workspace,
+            }
+            if node.get("text"):
+                citation["citation_text"] = node["text"]
+            citations.append(citation)
+
+        citation_metadata = None
+        if citations:
+            # Top-level fields keep the single-citation format; "citations" has all of them
+            citation_metadata = {**citations[0], "citations": citations}
+
+        logger.info(
+            f"Answering chat question from stored attribute answer for contract {contract.contract_id}"
+        )
+        return {"content": answer, "citation_metadata": citation_metadata}
+    finally:
+        session.close()
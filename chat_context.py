@@ -0,0 +1,289 @@
+"""
+Server-side conversation context for chat requests.
+
+The model receives the last ``CHAT_CONTEXT_RECENT_TURNS`` turns of a thread
+verbatim, loaded from the database, plus a running summary of everything
+older. The summary is extended in the background after each turn, so prompt
+size stays roughly constant however long the thread grows.
+
+The summary and the id of the last message it covers are stored on the
+thread row, so they survive restarts and are shared by all workers; a short
+TTL cache sits in front of them. A thread without a stored summary (written
+before this existed, or never summarized) gets an extractive one built from
+its latest messages when the prompt is assembled, so older turns are never
+silently dropped.
+
+Summaries are extractive (the first sentence of every message) unless the
+chat controller provides an optional hook::
+
+    async def summarize_conversation(previous_summary: str, messages: list) -> str
+
+``ThreadAPIController`` does not implement it today; add it there to get
+model-written summaries. A failing or empty hook falls back to extractive.
+
+Usage:
+    python -m components.controllers.chat_context create   # summary columns on the thread table
+"""
+import argparse
+import asyncio
+import os
+import re
+import logging
+import logging_config
+from sqlalchemy import text
+
+from components.models.base import Base
+from components.models.thread import Thread, Message
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+CONTEXT_WINDOW_ENABLED = os.getenv("CHAT_CONTEXT_WINDOW_ENABLED", "true").lower() == "true"
+CONTEXT_RECENT_TURNS = int(os.getenv("CHAT_CONTEXT_RECENT_TURNS", "6"))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_CONTEXT_SUMMARY_MAX_CHARS", "4000"))
+# Older messages read when a thread has no stored summary yet; earlier ones
+# would not fit in SUMMARY_MAX_CHARS anyway
+SUMMARY_SOURCE_MESSAGES = int(os.getenv("CHAT_CONTEXT_SUMMARY_SOURCE_MESSAGES", "40"))
+SUMMARY_LINE_CHARS = 300
+
+_summary_cache = TTLCache(
+    "chat_context_summary",
+    max_size=int(os.getenv("CHAT_CONTEXT_SUMMARY_CACHE_SIZE", "2048")),
+    ttl=int(os.getenv("CHAT_CONTEXT_SUMMARY_TTL", "300")),
+)
+_updating_threads = set()
+_background_tasks = set()
+
+
+def _recent_message_count() -> int:
+    return max(1, CONTEXT_RECENT_TURNS) * 2
+
+
+def _to_history_message(row) -> dict:
+    return {
+        "id": row.id,
+        "role": row.role,
+        "content": row.content or "",
+        "date": row.created_at,
+        "contract_id": row.contract_id,
+    }
+
+
+def _load_messages(user_id: int, thread_id, exclude_id=None, after_id=None, limit: int = None) -> list:
+    """User and assistant messages of a thread in chronological order (the latest ``limit``)"""
+    params = {"user_id": user_id, "thread_id": thread_id}
+    filters = ""
+    if exclude_id is not None:
+        params["exclude_id"] = exclude_id
+        filters += " AND id <> :exclude_id"
+    if after_id is not None:
+        params["after_id"] = after_id
+        filters += " AND id > :after_id"
+    limit_clause = ""
+    if limit is not None:
+        params["limit"] = limit
+        limit_clause = "LIMIT :limit"
+
+    session = Base.get_session()
+    try:
+        rows = session.execute(
+            text(
+                f"""
+                SELECT id, role, content, created_at, contract_id
+                FROM {Message.__table__.fullname}
+                WHERE thread_id = :thread_id AND user_id = :user_id
+                  AND role IN ('user', 'assistant') {filters}
+                ORDER BY created_at DESC, id DESC
+                {limit_clause};
+                """
+            ),
+            params,
+        ).all()
+    finally:
+        session.close()
+    return [_to_history_message(row) for row in reversed(rows)]
+
+
+def create_summary_columns():
+    session = Base.get_session()
+    try:
+        session.execute(
+            text(
+                f"""
+                ALTER TABLE {Thread.__table__.fullname}
+                ADD COLUMN IF NOT EXISTS context_summary text,
+                ADD COLUMN IF NOT EXISTS context_summary_through_id bigint;
+                """
+            )
+        )
+        session.commit()
+        logger.info("Thread context summary columns created")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _get_summary_state(thread_id) -> dict:
+    """``{"summary", "through_id"}`` of a thread, from the cache or the thread row"""
+    state = _summary_cache.get(thread_id)
+    if state is not None:
+        return state
+
+    session = Base.get_session()
+    try:
+        row = session.execute(
+            text(
+                f"""
+                SELECT context_summary, context_summary_through_id
+                FROM {Thread.__table__.fullname}
+                WHERE id = :thread_id;
+                """
+            ),
+            {"thread_id": thread_id},
+        ).first()
+    finally:
+        session.close()
+
+    state = {
+        "summary": (row.context_summary if row else None) or "",
+        "through_id": (row.context_summary_through_id if row else None) or 0,
+    }
+    _summary_cache.set(thread_id, state)
+    return state
+
+
+def _save_summary_state(thread_id, state: dict):
+    """Store the summary unless another worker already stored a newer one"""
+    session = Base.get_session()
+    try:
+        session.execute(
+            text(
+                f"""
+                UPDATE {Thread.__table__.fullname}
+                SET context_summary = :summary, context_summary_through_id = :through_id
+                WHERE id = :thread_id
+                  AND COALESCE(context_summary_through_id, 0) <= :through_id;
+                """
+            ),
+            {"thread_id": thread_id, **state},
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    _summary_cache.set(thread_id, state)
+
+
+def build_message_history(user_id: int, thread_id, current_message: dict, current_message_id=None) -> list:
+    """
+    Message history for the model: the stored summary of older turns (when
+    there is one), the most recent turns from the database and the current
+    message. With the window disabled the full stored history is used.
+    """
+    if not CONTEXT_WINDOW_ENABLED:
+        return _load_messages(user_id, thread_id, exclude_id=current_message_id) + [current_message]
+
+    recent_count = _recent_message_count()
+    state = _get_summary_state(thread_id)
+    if state["through_id"]:
+        recent = _load_messages(user_id, thread_id, exclude_id=current_message_id, limit=recent_count)
+    else:
+        # No summary yet: summarize whatever precedes the recent window right away
+        recent = _load_messages(
+            user_id, thread_id, exclude_id=current_message_id, limit=recent_count + SUMMARY_SOURCE_MESSAGES
+        )
+        older, recent = recent[:-recent_count], recent[-recent_count:]
+        if older:
+            state = {"summary": _extractive_summary("", older), "through_id": older[-1]["id"]}
+            _save_summary_state(thread_id, state)
+            logger.info(f"Built missing summary of {len(older)} messages for thread {thread_id}")
+
+    history = []
+    if state["summary"]:
+        history.append(
+            {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{state['summary']}",
+            }
+        )
+    history.extend(recent)
+    history.append(current_message)
+    return history
+
+
+def _first_sentence(content: str) -> str:
+    content = re.sub(r"\s+", " ", content or "").strip()
+    sentence = re.split(r"(?<=[.!?])\s", content, maxsplit=1)[0]
+    return sentence[:SUMMARY_LINE_CHARS]
+
+
+def _extractive_summary(previous_summary: str, messages: list) -> str:
+    """Fallback when the controller has no summarizer: one line per message, newest kept"""
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        lines.append(f"{speaker}: {_first_sentence(message['content'])}")
+    summary = "\n".join(lines)
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = summary[-SUMMARY_MAX_CHARS:]
+        summary = summary.split("\n", 1)[-1]
+    return summary
+
+
+async def update_summary(chat_controller, user_id: int, thread_id):
+    """Fold turns that have left the recent window into the thread summary"""
+    if thread_id in _updating_threads:
+        return
+    _updating_threads.add(thread_id)
+    try:
+        state = await asyncio.to_thread(_get_summary_state, thread_id)
+        # Without a stored summary only the latest messages are read, not the whole thread
+        limit = None if state["through_id"] else _recent_message_count() + SUMMARY_SOURCE_MESSAGES
+        unsummarized = await asyncio.to_thread(
+            _load_messages, user_id, thread_id, None, state["through_id"] or None, limit
+        )
+        older = unsummarized[:-_recent_message_count()]
+        if not older:
+            return
+
+        summarizer = getattr(chat_controller, "summarize_conversation", None)
+        summary = None
+        if summarizer is not None:
+            try:
+                summary = await summarizer(previous_summary=state["summary"], messages=older)
+            except Exception as e:
+                logger.warning(f"Conversation summarizer failed for thread {thread_id}: {str(e)}")
+        if not summary:
+            summary = _extractive_summary(state["summary"], older)
+
+        await asyncio.to_thread(
+            _save_summary_state, thread_id, {"summary": summary, "through_id": older[-1]["id"]}
+        )
+        logger.info(f"Summarized {len(older)} messages for thread {thread_id}")
+    except Exception:
+        logger.exception(f"Failed to update conversation summary for thread {thread_id}")
+    finally:
+        _updating_threads.discard(thread_id)
+
+
+def schedule_summary_update(chat_controller, user_id: int, thread_id):
+    """Update the thread summary after a turn without blocking the response"""
+    if not CONTEXT_WINDOW_ENABLED or not thread_id:
+        return
+    task = asyncio.create_task(update_summary(chat_controller, user_id, thread_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage stored conversation summaries")
+    parser.add_argument("command", choices=["create"])
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_summary_columns()
@@ -0,0 +1,379 @@
+"""
+Keyset-paginated chat history listing and windowed thread reads.
+
+Threads carry a denormalized ``last_activity_at`` and ``last_message_preview``
+maintained by a trigger on message inserts, so the sidebar is served by one
+range scan on (user_id, last_activity_at, id) no matter how many threads a
+user has or how far they scroll.
+
+Opening a thread reads only its latest messages, newest window first, with a
+cursor for older ones. Tool messages are returned without their stored
+citation payload, which is fetched per message when it is needed.
+
+Tool message content is written as JSON and mirrored into a ``payload`` JSONB
+column by a trigger, indexed on ``file_id`` (single-contract citations) and
+for containment queries (multi-contract ``citations`` lists). Rows written
+before that hold the ``str()`` of a dict; ``backfill-payload`` converts them
+once, so read paths serve stored JSON without parsing it.
+
+Usage:
+    python -m components.controllers.chat_history create     # columns, index and trigger
+    python -m components.controllers.chat_history backfill   # fill existing threads
+    python -m components.controllers.chat_history backfill-payload   # convert legacy tool messages
+"""
+import argparse
+import ast
+import base64
+import json
+from datetime import datetime
+import logging
+import logging_config
+from sqlalchemy import text
+
+from components.models.base import Base
+from components.models.thread import Thread, Message
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 200
+MAX_PAGE_SIZE = 100
+MAX_MESSAGE_WINDOW = 200
+PAYLOAD_BACKFILL_BATCH = 1000
+
+
+def _qualified(table, name: str) -> str:
+    return f"{table.schema}.{name}" if table.schema else name
+
+
+def _ddl_statements() -> list:
+    thread_table = Thread.__table__.fullname
+    message_table = Message.__table__.fullname
+    function_name = _qualified(Thread.__table__, "touch_thread_activity")
+    payload_function_name = _qualified(Message.__table__, "set_tool_message_payload")
+    return [
+        f"""
+        ALTER TABLE {thread_table}
+        ADD COLUMN IF NOT EXISTS last_activity_at timestamptz NOT NULL DEFAULT now(),
+        ADD COLUMN IF NOT EXISTS last_message_preview text;
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS ix_thread_user_last_activity
+        ON {thread_table} (user_id, last_activity_at DESC, id DESC);
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS ix_message_thread_created
+        ON {message_table} (thread_id, created_at DESC, id DESC);
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION {function_name}()
+        RETURNS trigger AS $$
+        BEGIN
+            IF NEW.role IN ('user', 'assistant') THEN
+                UPDATE {thread_table}
+                SET last_activity_at = now(),
+                    last_message_preview = left(NEW.content, {PREVIEW_LENGTH})
+                WHERE id = NEW.thread_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        f"DROP TRIGGER IF EXISTS trg_message_thread_activity ON {message_table};",
+        f"""
+        CREATE TRIGGER trg_message_thread_activity
+        AFTER INSERT ON {message_table}
+        FOR EACH ROW EXECUTE FUNCTION {function_name}();
+        """,
+        f"ALTER TABLE {message_table} ADD COLUMN IF NOT EXISTS payload jsonb;",
+        f"""
+        CREATE INDEX IF NOT EXISTS ix_message_payload_file_id
+        ON {message_table} ((payload->>'file_id'))
+        WHERE role = 'tool';
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS ix_message_payload_gin
+        ON {message_table} USING gin (payload jsonb_path_ops)
+        WHERE role = 'tool';
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION {payload_function_name}()
+        RETURNS trigger AS $$
+        BEGIN
+            IF NEW.role = 'tool' AND NEW.payload IS NULL AND NEW.content IS NOT NULL THEN
+                BEGIN
+                    NEW.payload := NEW.content::jsonb;
+                EXCEPTION WHEN others THEN
+                    NEW.payload := NULL;
+                END;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        f"DROP TRIGGER IF EXISTS trg_message_tool_payload ON {message_table};",
+        f"""
+        CREATE TRIGGER trg_message_tool_payload
+        BEFORE INSERT ON {message_table}
+        FOR EACH ROW EXECUTE FUNCTION {payload_function_name}();
+        """,
+    ]
+
+
+def create_thread_activity_columns():
+    session = Base.get_session()
+    try:
+        for statement in _ddl_statements():
+            session.execute(text(statement))
+        session.commit()
+        logger.info("Thread activity columns, message payload column, indexes and triggers created")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def backfill_thread_activity() -> int:
+    thread_table = Thread.__table__.fullname
+    message_table = Message.__table__.fullname
+    session = Base.get_session()
+    try:
+        result = session.execute(
+            text(
+                f"""
+                UPDATE {thread_table} t
+                SET last_activity_at = COALESCE(lm.created_at, t.created_at),
+                    last_message_preview = left(lm.content, {PREVIEW_LENGTH})
+                FROM (
+                    SELECT t2.id, m.created_at, m.content
+                    FROM {thread_table} t2
+                    LEFT JOIN LATERAL (
+                        SELECT m.created_at, m.content
+                        FROM {message_table} m
+                        WHERE m.thread_id = t2.id AND m.role IN ('user', 'assistant')
+                        ORDER BY m.created_at DESC
+                        LIMIT 1
+                    ) m ON true
+                ) lm
+                WHERE lm.id = t.id;
+                """
+            )
+        )
+        session.commit()
+        return result.rowcount or 0
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def backfill_tool_payloads(batch_size: int = PAYLOAD_BACKFILL_BATCH) -> int:
+    """Rewrite tool messages stored before the payload column existed as JSON, filling ``payload``"""
+    message_table = Message.__table__.fullname
+    updated = 0
+    last_id = 0
+    session = Base.get_session()
+    try:
+        while True:
+            rows = session.execute(
+                text(
+                    f"""
+                    SELECT id, content
+                    FROM {message_table}
+                    WHERE role = 'tool' AND payload IS NULL AND id > :last_id
+                    ORDER BY id
+                    LIMIT :batch_size;
+                    """
+                ),
+                {"last_id": last_id, "batch_size": batch_size},
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            for row in rows:
+                payload = parse_tool_content(row.content)
+                if payload is None:
+                    continue
+                payload_json = json.dumps(payload, default=str)
+                session.execute(
+                    text(
+                        f"UPDATE {message_table} "
+                        f"SET content = :payload, payload = CAST(:payload AS jsonb) WHERE id = :id;"
+                    ),
+                    {"payload": payload_json, "id": row.id},
+                )
+                updated += 1
+            session.commit()
+            logger.info(f"Tool payload backfill progress: {updated} messages up to id {last_id}")
+        return updated
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def encode_cursor(last_activity_at: datetime, thread_id) -> str:
+    raw = json.dumps([last_activity_at.isoformat(), thread_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        last_activity_at, thread_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(last_activity_at), thread_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_threads_page(user_id: int, cursor: str = None, limit: int = 50) -> dict:
+    """
+    One page of the user's threads ordered by last activity, newest first,
+    with ``next_cursor`` set when more threads exist.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    params = {"user_id": user_id, "limit": limit + 1}
+    keyset_filter = ""
+    if cursor:
+        params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+        keyset_filter = "AND (last_activity_at, id) < (:cursor_ts, :cursor_id)"
+
+    session = Base.get_session()
+    try:
+        rows = session.execute(
+            text(
+                f"""
+                SELECT id, title, created_at, last_activity_at, last_message_preview
+                FROM {Thread.__table__.fullname}
+                WHERE user_id = :user_id {keyset_filter}
+                ORDER BY last_activity_at DESC, id DESC
+                LIMIT :limit;
+                """
+            ),
+            params,
+        ).all()
+    finally:
+        session.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    threads = [
+        {
+            "id": row.id,
+            "title": row.title,
+            "date": row.created_at,
+            "last_activity_at": row.last_activity_at,
+            "preview": row.last_message_preview,
+        }
+        for row in rows
+    ]
+    next_cursor = (
+        encode_cursor(rows[-1].last_activity_at, rows[-1].id) if has_more else None
+    )
+    return {"threads": threads, "next_cursor": next_cursor}
+
+
+def read_messages_window(user_id: int, thread_id, before: str = None, limit: int = 30) -> dict:
+    """
+    The latest ``limit`` messages of a thread older than the ``before`` cursor,
+    in chronological order, with ``next_cursor`` set when older messages exist.
+    Tool messages carry ``citation_ref`` instead of their content.
+    """
+    limit = max(1, min(limit, MAX_MESSAGE_WINDOW))
+    params = {"user_id": user_id, "thread_id": thread_id, "limit": limit + 1}
+    keyset_filter = ""
+    if before:
+        params["cursor_ts"], params["cursor_id"] = decode_cursor(before)
+        keyset_filter = "AND (created_at, id) < (:cursor_ts, :cursor_id)"
+
+    session = Base.get_session()
+    try:
+        rows = session.execute(
+            text(
+                f"""
+                SELECT id, role, created_at, contract_id, feedback,
+                       CASE WHEN role = 'tool' THEN NULL ELSE content END AS content
+                FROM {Message.__table__.fullname}
+                WHERE thread_id = :thread_id AND user_id = :user_id {keyset_filter}
+                ORDER BY created_at DESC, id DESC
+                LIMIT :limit;
+                """
+            ),
+            params,
+        ).all()
+    finally:
+        session.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    messages = []
+    for row in reversed(rows):
+        message = {
+            "id": row.id,
+            "role": row.role,
+            "createdAt": row.created_at,
+            "contract_id": row.contract_id,
+            "feedback": row.feedback,
+            "content": row.content or "",
+        }
+        if row.role == "tool":
+            message["citation_ref"] = row.id
+        messages.append(message)
+
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return {"conversation_id": thread_id, "messages": messages, "next_cursor": next_cursor}
+
+
+def parse_tool_content(content: str):
+    """Tool message content as JSON, or the ``str()`` of a dict for legacy rows"""
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(content)
+    except (ValueError, SyntaxError):
+        logger.warning("Unparseable tool message content")
+        return None
+
+
+def get_message_citations(user_id: int, message_id) -> dict:
+    """Citation payload of one tool message, or None if it does not belong to the user"""
+    session = Base.get_session()
+    try:
+        row = session.execute(
+            text(
+                f"""
+                SELECT id, payload
+                FROM {Message.__table__.fullname}
+                WHERE id = :message_id AND user_id = :user_id AND role = 'tool';
+                """
+            ),
+            {"message_id": message_id, "user_id": user_id},
+        ).first()
+    finally:
+        session.close()
+
+    if row is None:
+        return None
+    return {"message_id": row.id, "citations": row.payload}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage denormalized thread activity columns and indexes")
+    parser.add_argument("command", choices=["create", "backfill", "backfill-payload"])
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_thread_activity_columns()
+    elif args.command == "backfill-payload":
+        updated = backfill_tool_payloads()
+        logger.info(f"Tool payload backfill complete: {updated} messages updated")
+    else:
+        updated = backfill_thread_activity()
+        logger.info(f"Thread activity backfill complete: {updated} threads updated")
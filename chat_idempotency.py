@@ -0,0 +1,249 @@
+"""
+Idempotent chat generation.
+
+A generate request carrying an ``Idempotency-Key`` header claims the key for
+its user. Its response stream is produced by a background task that buffers
+every line it yields, so:
+
+- a repeat while the generation is in flight attaches to the same stream and
+  receives the buffered lines followed by the live ones;
+- a repeat after completion replays the stored lines from the replay cache.
+
+Either way the repeat does not save another user message or run another
+generation. If every client detaches, the producer is cancelled after a grace
+period, so "stop generating" still stops the model.
+
+The registry of streams is per process. So that a retry routed to another
+worker does not generate again, new keys are also claimed in
+``contract_intelligence.chat_generation_claim``: a key already claimed by
+another worker gets a 409 (the stream itself can only be replayed by the
+worker that owns it). A failed generation gives its claim back. If the table
+is unavailable, requests proceed with per-process deduplication only.
+
+Usage:
+    python -m components.controllers.chat_idempotency create   # claim table
+"""
+import argparse
+import asyncio
+import json
+import os
+import logging
+import logging_config
+from sqlalchemy import text
+
+from components.models.base import Base
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+DETACH_GRACE_SECONDS = float(os.getenv("CHAT_IDEMPOTENCY_DETACH_GRACE", "15"))
+IDEMPOTENCY_TTL = int(os.getenv("CHAT_IDEMPOTENCY_TTL", "600"))
+SHARED_CLAIMS_ENABLED = os.getenv("CHAT_IDEMPOTENCY_SHARED_CLAIMS", "true").lower() == "true"
+
+_replay_cache = TTLCache(
+    "chat_generation_replay",
+    max_size=int(os.getenv("CHAT_IDEMPOTENCY_CACHE_SIZE", "1000")),
+    ttl=IDEMPOTENCY_TTL,
+)
+_in_flight = {}
+_background_tasks = set()
+
+CREATE_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS contract_intelligence.chat_generation_claim (
+        user_id integer NOT NULL,
+        idempotency_key text NOT NULL,
+        claimed_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, idempotency_key)
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_generation_claim_claimed_at
+    ON contract_intelligence.chat_generation_claim (claimed_at);
+    """,
+]
+
+
+def create_claim_table():
+    session = Base.get_session()
+    try:
+        for statement in CREATE_STATEMENTS:
+            session.execute(text(statement))
+        session.commit()
+        logger.info("Chat generation claim table created")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def claim_shared(user_id: int, idempotency_key: str) -> bool:
+    """
+    Claim the key for this worker across all workers; False when another
+    request already holds it. Expired claims of the user are dropped first.
+    """
+    if not SHARED_CLAIMS_ENABLED:
+        return True
+    session = Base.get_session()
+    try:
+        session.execute(
+            text(
+                """
+                DELETE FROM contract_intelligence.chat_generation_claim
+                WHERE user_id = :user_id AND claimed_at < now() - make_interval(secs => :ttl);
+                """
+            ),
+            {"user_id": user_id, "ttl": IDEMPOTENCY_TTL},
+        )
+        claimed = session.execute(
+            text(
+                """
+                INSERT INTO contract_intelligence.chat_generation_claim (user_id, idempotency_key)
+                VALUES (:user_id, :idempotency_key)
+                ON CONFLICT DO NOTHING
+                RETURNING 1;
+                """
+            ),
+            {"user_id": user_id, "idempotency_key": idempotency_key},
+        ).first()
+        session.commit()
+        return claimed is not None
+    except Exception as e:
+        session.rollback()
+        logger.warning(f"Shared idempotency claim failed, deduplicating per process only: {str(e)}")
+        return True
+    finally:
+        session.close()
+
+
+def release_shared(user_id: int, idempotency_key: str):
+    if not SHARED_CLAIMS_ENABLED:
+        return
+    session = Base.get_session()
+    try:
+        session.execute(
+            text(
+                """
+                DELETE FROM contract_intelligence.chat_generation_claim
+                WHERE user_id = :user_id AND idempotency_key = :idempotency_key;
+                """
+            ),
+            {"user_id": user_id, "idempotency_key": idempotency_key},
+        )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.warning(f"Failed to release idempotency claim {idempotency_key}: {str(e)}")
+    finally:
+        session.close()
+
+
+class GenerationRecord:
+    """Buffered output of one generation, shared by every request with its key"""
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.lines = []
+        self.done = False
+        self.failed = False
+        self.followers = 0
+        self._changed = asyncio.Event()
+        self._producer = None
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _finish(self, failed: bool = False, release_claim: bool = True):
+        self.done = True
+        self.failed = failed
+        _in_flight.pop(self.key, None)
+        if not failed:
+            _replay_cache.set(self.key, self)
+        elif release_claim:
+            # A retry of a failed generation may run again, on any worker
+            task = asyncio.get_running_loop().create_task(asyncio.to_thread(release_shared, *self.key))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        self._notify()
+
+    def start(self, generator):
+        """Consume ``generator`` in a background task and return a follower stream"""
+
+        async def produce():
+            try:
+                async for line in generator:
+                    self.lines.append(line)
+                    self._notify()
+                self._finish()
+            except asyncio.CancelledError:
+                logger.info(f"Generation {self.key[1]} cancelled after all clients detached")
+                self._finish(failed=True)
+                raise
+            except Exception:
+                logger.exception(f"Generation {self.key[1]} failed")
+                self._finish(failed=True)
+
+        self._producer = asyncio.create_task(produce())
+        return self.follow()
+
+    def release(self, release_claim: bool = True):
+        """
+        Give up a claimed key whose request failed before streaming started;
+        ``release_claim=False`` keeps the shared claim, held by another worker.
+        """
+        if not self.done:
+            self._finish(failed=True, release_claim=release_claim)
+
+    async def _cancel_if_detached(self):
+        await asyncio.sleep(DETACH_GRACE_SECONDS)
+        if self.followers == 0 and not self.done and self._producer is not None:
+            self._producer.cancel()
+
+    async def follow(self):
+        """All lines produced so far, then live ones until the generation ends"""
+        self.followers += 1
+        position = 0
+        try:
+            while True:
+                changed = self._changed
+                while position < len(self.lines):
+                    yield self.lines[position]
+                    position += 1
+                if self.done:
+                    if self.failed and position == 0:
+                        yield json.dumps({"error": "The original request for this message failed."}) + "\n"
+                    return
+                await changed.wait()
+        finally:
+            self.followers -= 1
+            if self.followers == 0 and not self.done and self._producer is not None:
+                asyncio.create_task(self._cancel_if_detached())
+
+
+def claim(user_id: int, idempotency_key: str):
+    """
+    ``(record, True)`` when this request owns the key and must generate, or
+    ``(record, False)`` when it repeats an in-flight or completed request.
+    """
+    key = (user_id, idempotency_key)
+    record = _in_flight.get(key) or _replay_cache.get(key)
+    if record is not None:
+        logger.info(f"Repeated generate request for idempotency key {idempotency_key}")
+        return record, False
+
+    record = GenerationRecord(key)
+    _in_flight[key] = record
+    return record, True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the chat generation claim table")
+    parser.add_argument("command", choices=["create"])
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_claim_table()
@@ -0,0 +1,173 @@
+"""
+Normalized (file_id, page_label) -> answer_id index over contract answer citations.
+
+``contract_answer.metadata_->'source_nodes'`` is flattened into
+``contract_intelligence.contract_answer_citation`` so that a citation click
+is a primary-key probe instead of a JSONB scan over every answer. A trigger
+on ``contract_answer`` keeps the table in sync with every writer (attribute
+pipeline, user submitted answers, deletes).
+
+Usage:
+    python -m utils.citation_index create     # table, index and trigger
+    python -m utils.citation_index backfill   # index existing answers
+"""
+import argparse
+import logging
+import logging_config
+from sqlalchemy import text
+
+from components.models.base import Base
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+# Only rows with integer file_id / page_label are indexed, matching the casts in lookups
+_SOURCE_NODES = """
+    jsonb_array_elements(
+        CASE WHEN jsonb_typeof({alias}.metadata_->'source_nodes') = 'array'
+             THEN {alias}.metadata_->'source_nodes'
+             ELSE '[]'::jsonb END
+    ) AS nodes
+"""
+_VALID_NODE = "nodes->>'file_id' ~ '^[0-9]+$' AND nodes->>'page_label' ~ '^[0-9]+$'"
+
+CREATE_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS contract_intelligence.contract_answer_citation (
+        file_id integer NOT NULL,
+        page_label integer NOT NULL,
+        answer_id integer NOT NULL,
+        PRIMARY KEY (file_id, page_label, answer_id)
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_contract_answer_citation_answer_id
+    ON contract_intelligence.contract_answer_citation (answer_id);
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION contract_intelligence.sync_contract_answer_citation()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM contract_intelligence.contract_answer_citation
+            WHERE answer_id = OLD.answer_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO contract_intelligence.contract_answer_citation (file_id, page_label, answer_id)
+            SELECT DISTINCT (nodes->>'file_id')::int, (nodes->>'page_label')::int, NEW.answer_id
+            FROM (SELECT NEW.metadata_) AS ca, {_SOURCE_NODES.format(alias="ca")}
+            WHERE {_VALID_NODE}
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    DROP TRIGGER IF EXISTS trg_contract_answer_citation
+    ON contract_intelligence.contract_answer;
+    """,
+    """
+    CREATE TRIGGER trg_contract_answer_citation
+    AFTER INSERT OR DELETE OR UPDATE OF metadata_
+    ON contract_intelligence.contract_answer
+    FOR EACH ROW EXECUTE FUNCTION contract_intelligence.sync_contract_answer_citation();
+    """,
+]
+
+BACKFILL_QUERY = text(
+    f"""
+    INSERT INTO contract_intelligence.contract_answer_citation (file_id, page_label, answer_id)
+    SELECT DISTINCT (nodes->>'file_id')::int, (nodes->>'page_label')::int, ca.answer_id
+    FROM contract_intelligence.contract_answer ca, {_SOURCE_NODES.format(alias="ca")}
+    WHERE ca.answer_id > :after_id AND ca.answer_id <= :upto_id
+    AND {_VALID_NODE}
+    ON CONFLICT DO NOTHING;
+    """
+)
+
+CITATION_PARAMETERS_QUERY = text(
+    """
+    SELECT cq.question as parameter, ca.answer as value
+    FROM contract_intelligence.contract_answer_citation cac
+    JOIN contract_intelligence.contract_answer ca
+    ON ca.answer_id = cac.answer_id
+    LEFT JOIN contract_intelligence.contract_question cq
+    ON ca.question_id = cq.question_id
+    WHERE cac.file_id = :file_id
+    AND cac.page_label = :page_label
+    AND ca.answer <> 'N/A';
+    """
+)
+
+
+def create_citation_index():
+    """Create the citation table, its secondary index and the sync trigger"""
+    session = Base.get_session()
+    try:
+        for statement in CREATE_STATEMENTS:
+            session.execute(text(statement))
+        session.commit()
+        logger.info("Citation index table and trigger created")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def backfill_citation_index(batch_size: int = 5000) -> int:
+    """Index citations of all existing answers in answer_id batches; safe to re-run"""
+    session = Base.get_session()
+    try:
+        min_id, max_id = session.execute(
+            text(
+                "SELECT MIN(answer_id), MAX(answer_id) FROM contract_intelligence.contract_answer;"
+            )
+        ).one()
+        if min_id is None:
+            logger.info("No contract answers to backfill")
+            return 0
+
+        inserted = 0
+        after_id = min_id - 1
+        while after_id < max_id:
+            upto_id = after_id + batch_size
+            result = session.execute(
+                BACKFILL_QUERY, {"after_id": after_id, "upto_id": upto_id}
+            )
+            session.commit()
+            inserted += result.rowcount or 0
+            logger.info(f"Backfilled citations for answer_id <= {upto_id} ({inserted} rows)")
+            after_id = upto_id
+        return inserted
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_citation_parameters(file_id: int, page_label: int) -> list:
+    """Extracted attribute answers that cite the given file page"""
+    session = Base.get_session()
+    try:
+        result = session.execute(
+            CITATION_PARAMETERS_QUERY, {"file_id": file_id, "page_label": page_label}
+        )
+        return [{"parameter": row[0], "value": row[1]} for row in result]
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the contract answer citation index")
+    parser.add_argument("command", choices=["create", "backfill"])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_citation_index()
+    else:
+        total = backfill_citation_index(batch_size=args.batch_size)
+        logger.info(f"Citation index backfill complete: {total} rows inserted")
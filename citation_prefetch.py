@@ -0,0 +1,131 @@
+"""
+Citation page lookups and background prefetching.
+
+When a chat answer emits its Phase 2 citations, the cited pages are resolved
+in the background (proxy URL, extracted attribute parameters and the page
+blob itself) so the citation viewer can open without waiting on storage or
+the database when the user clicks.
+"""
+import asyncio
+import os
+import logging
+import logging_config
+from urllib.parse import unquote, urlparse
+
+from components.models.file import File as FileModel
+from services.storage import AzureStorageClient
+from utils.citation_index import get_citation_parameters
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+CITATION_PREFETCH_ENABLED = os.getenv("CITATION_PREFETCH_ENABLED", "true").lower() == "true"
+CITATION_CACHE_TTL = int(os.getenv("CITATION_CACHE_TTL", "300"))
+
+_citation_cache = TTLCache(
+    "citation_page",
+    max_size=int(os.getenv("CITATION_CACHE_SIZE", "2048")),
+    ttl=CITATION_CACHE_TTL,
+)
+_page_blob_cache = TTLCache(
+    "citation_page_blob",
+    max_size=int(os.getenv("CITATION_BLOB_CACHE_SIZE", "256")),
+    ttl=CITATION_CACHE_TTL,
+)
+
+_prefetch_semaphore = asyncio.Semaphore(int(os.getenv("CITATION_PREFETCH_CONCURRENCY", "4")))
+_background_tasks = set()
+
+
+def get_citation_data(file_id: int, page_label: int, user_id: int, access_token: str) -> dict:
+    """
+    Proxy URL and attribute parameters for a (0-based) file page, cached per
+    access token since the proxy URL embeds it.
+    """
+    key = (access_token, file_id, page_label)
+    data = _citation_cache.get(key)
+    if data is not None:
+        return data
+
+    citation_url = ""
+    file = FileModel.fetch_file_by_id_and_user(file_id, user_id)
+    if file:
+        storage = AzureStorageClient("sections")
+        citation_url = storage.get_proxy_url_for_page(file, page_label, access_token)
+
+    data = {
+        "citation_url": citation_url,
+        "addidtional_data": get_citation_parameters(file_id, page_label),
+    }
+    _citation_cache.set(key, data)
+    return data
+
+
+def get_cached_page_blob(blob_path: str):
+    """(content, headers) of a prefetched page blob, or None"""
+    return _page_blob_cache.get(blob_path)
+
+
+def _blob_path_from_proxy_url(citation_url: str):
+    path = unquote(urlparse(citation_url).path)
+    marker = "/api/blob/"
+    if marker not in path:
+        return None
+    return path.split(marker, 1)[1]
+
+
+def _prefetch_page(file_id: int, page_label: int, user_id: int, access_token: str):
+    data = get_citation_data(file_id, page_label, user_id, access_token)
+    blob_path = _blob_path_from_proxy_url(data["citation_url"])
+    if not blob_path or get_cached_page_blob(blob_path) is not None:
+        return
+
+    container_name, file_path = blob_path.split("/", 1)
+    blob_stream, headers = AzureStorageClient(container_name=container_name).serve_file(file_path)
+    if isinstance(blob_stream, (bytes, bytearray)):
+        _page_blob_cache.set(blob_path, (bytes(blob_stream), headers))
+
+
+def citation_pages(citation_metadata: dict) -> list:
+    """Distinct (file_id, 0-based page) pairs referenced by single or multi-contract citation metadata"""
+    if not citation_metadata:
+        return []
+    citations = citation_metadata.get("citations")
+    if not isinstance(citations, list):
+        citations = [citation_metadata]
+
+    pages = []
+    for citation in citations:
+        if citation.get("file_id") is None or citation.get("page_number") is None:
+            continue
+        page = (int(citation["file_id"]), int(citation["page_number"]))
+        if page not in pages:
+            pages.append(page)
+    return pages
+
+
+async def _prefetch(pages: list, user_id: int, access_token: str):
+    async def prefetch_one(file_id, page_label):
+        async with _prefetch_semaphore:
+            try:
+                await asyncio.to_thread(
+                    _prefetch_page, file_id, page_label, user_id, access_token
+                )
+            except Exception as e:
+                logger.warning(f"Citation prefetch failed for file {file_id} page {page_label}: {str(e)}")
+
+    await asyncio.gather(*(prefetch_one(file_id, page) for file_id, page in pages))
+    logger.info(f"Prefetched {len(pages)} citation pages for user {user_id}")
+
+
+def schedule_citation_prefetch(citation_metadata: dict, user_id: int, access_token: str):
+    """Warm the caches for every cited page without blocking the caller"""
+    if not CITATION_PREFETCH_ENABLED:
+        return
+    pages = citation_pages(citation_metadata)
+    if not pages:
+        return
+    task = asyncio.create_task(_prefetch(pages, user_id, access_token))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
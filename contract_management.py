@@ -9,18 +9,19 @@ from typing import Optional, List, Tuple
 from sqlalchemy.sql.functions import count as sa_count, func
 from sqlalchemy import literal
 import sqlalchemy as sa
-from components.models.auth import UserDepartment, User, UserCategory, ContractAccessManagement, ContractDepartment
+from components.models.auth import User, UserCategory, ContractAccessManagement, ContractDepartment
 from components.models.base import Base
 from components.models.contract import Contract, ContractStatus
 from components.models.file import File, FileUploadStatus
 from components.models.ariba_upload_queue import AribaUploadQueue
+from components.controllers.chat_answer_cache import invalidate_workspace
+from components.controllers.user_profile import get_user_departments
 from fastapi import UploadFile, Request
 from services.storage import AzureStorageClient
 from sqlalchemy import and_, or_, case
 from utils.exceptions import CustomException
 from marshmallow import Schema, fields
 from pydantic import BaseModel
-import time
 import logging
 import logging_config
 
@@ -291,49 +292,16 @@ class ContractManagement:
         finally:
             session.close()
 
-    # Cache for department info - will be invalidated after 5 minutes
-    # Store the last time each user_id was fetched
-    _last_fetch_time = {}
-
-    def _get_user_departments(
-        self, user_id: int, expiry_time: int
-    ) -> List[Tuple[int, Optional[str]]]:
-        """Get user departments with caching based on user_id and a time-based expiry"""
+    def _get_user_departments(self, user_id: int) -> List[Tuple[int, Optional[str]]]:
+        """Get user departments from the shared identity profile cache"""
         logger.debug(f"Get_user_departments method for user_id: {user_id}")
-        current_time = time.time()
-
-        # Check if we have a recent result
-        if user_id in self._last_fetch_time:
-            last_time = self._last_fetch_time[user_id][0]
-            if current_time - last_time < expiry_time:
-                return self._last_fetch_time[user_id][1]  # Return cached result
-
-        # If we get here, we need to fetch from database
-        session = Base.get_session()
         try:
-            logger.info(
-                f"Fetching user departments from database for user_id: {user_id}"
-            )
-            user_departments = (
-                session.query(UserDepartment).filter_by(user_id=user_id).all()
+            return get_user_departments(user_id)
+        except Exception as e:
+            logger.error(
+                f"Error processing user departments: {str(e)}", exc_info=True
             )
-            try:
-                result = [
-                    (ud.department_id, ud.department.name if ud.department else None)
-                    for ud in user_departments
-                ]
-                # Store result with timestamp
-                self._last_fetch_time[user_id] = (current_time, result)
-                logger.info(f"User departments fetched for user_id: {user_id}")
-                return result
-            except Exception as e:
-                logger.error(
-                    f"Error processing user departments: {str(e)}", exc_info=True
-                )
-                return []  # Return empty list on error
-        finally:
-            session.close()
-
+            return []  # Return empty list on error
 
     def get_contract_workspaces_only(
             self,
@@ -343,12 +311,7 @@ class ContractManagement:
     ):
         session = Base.get_session()
         try:
-            current_time = int(time.time())
-            logger.info(f"Current time for cache invalidation: {current_time}")
-
-            user_departments = self._get_user_departments(
-                self.user_id, current_time // 300
-            )
+            user_departments = self._get_user_departments(self.user_id)
             logger.info(f"User departments retrieved: {user_departments}")
 
             user_department_ids = [dept_id for dept_id, _ in user_departments]
@@ -524,14 +487,8 @@ class ContractManagement:
     ):
         session = Base.get_session()
         try:
-            # Get the current timestamp for cache invalidation
-            current_time = int(time.time())
-            logger.info(f"Current time for cache invalidation: {current_time}")
-
-            # Get user departments with caching (invalidates every 5 minutes)
-            user_departments = self._get_user_departments(
-                self.user_id, current_time // 300
-            )
+            # User departments come from the shared identity profile cache
+            user_departments = self._get_user_departments(self.user_id)
             logger.info(f"User departments retrieved: {user_departments}")
 
             user_department_ids = [dept_id for dept_id, _ in user_departments]
@@ -1033,7 +990,7 @@ class ContractManagement:
         """
         try:
             # Check 1: Is user in department 15?
-            user_departments = self._get_user_departments(self.user_id, int(time.time()) // 300)
+            user_departments = self._get_user_departments(self.user_id)
             user_department_ids = [dept_id for dept_id, _ in user_departments]
 
             if 15 in user_department_ids:
@@ -1093,8 +1050,7 @@ class ContractManagement:
             user_email = session.query(User.email).filter_by(user_id=self.user_id).scalar()
 
             # Get user departments with caching (invalidates every 5 minutes)
-            current_time = int(time.time())
-            user_departments = self._get_user_departments(self.user_id, current_time // 300)
+            user_departments = self._get_user_departments(self.user_id)
             user_department_ids = [dept_id for dept_id, _ in user_departments]
 
             logger.info(f"User {self.user_id} ({user_email}) attempting to share contract {contract_id}")
@@ -1266,8 +1222,7 @@ class ContractManagement:
             user_email = session.query(User.email).filter_by(user_id=self.user_id).scalar()
 
             # Get user departments with caching (invalidates every 5 minutes)
-            current_time = int(time.time())
-            user_departments = self._get_user_departments(self.user_id, current_time // 300)
+            user_departments = self._get_user_departments(self.user_id)
             user_department_ids = [dept_id for dept_id, _ in user_departments]
 
             logger.info(f"User {self.user_id} ({user_email}) attempting to unshare contract {contract_id}")
@@ -1476,6 +1431,7 @@ class ContractManagement:
                 contract.import_flags = ""
                 contract.correlation_id = correlation_id
                 contract.save()
+                invalidate_workspace(contract_workspace_name)
             logger.info(f"File uploaded successfully by contract owner: {file_name}")
             return "File uploaded"
         finally:
@@ -1524,6 +1480,7 @@ class ContractManagement:
             contract.import_flags = ""
             contract.question_import_flags = ""
             contract.save()
+            invalidate_workspace(contract.contract_workspace)
             logger.info(f"File deleted successfully by CAM contract owner: {file_id}")
             return "File deleted"
 
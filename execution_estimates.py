@@ -0,0 +1,215 @@
+"""
+In-memory chat execution-time estimates.
+
+Durations of completed generations are kept per (ai_mode, contract count
+bucket) and estimates are read from their percentiles. The model is seeded
+once from stored history: the gap between each user message and the
+assistant reply that follows it. Buckets without enough samples fall back
+to the seeded history and then to a configured default per mode
+(``EXECUTION_ESTIMATE_DEFAULTS``), so a freshly started worker estimates every
+mode from its first request. Running generations are registered per
+user, so the estimate endpoint can long-poll on an event and answer as soon
+as the user's generation has started instead of sleeping a fixed time.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+import logging
+import logging_config
+from sqlalchemy import text
+
+from components.models.base import Base
+from components.models.thread import Message
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+ESTIMATE_WAIT_SECONDS = float(os.getenv("EXECUTION_ESTIMATE_WAIT", "5"))
+ESTIMATE_PERCENTILE = float(os.getenv("EXECUTION_ESTIMATE_PERCENTILE", "0.75"))
+SAMPLES_PER_BUCKET = int(os.getenv("EXECUTION_ESTIMATE_SAMPLES", "500"))
+MIN_SAMPLES = 5
+SEED_ROWS = 2000
+SEED_DAYS = int(os.getenv("EXECUTION_ESTIMATE_SEED_DAYS", "30"))
+ANY_MODE = "any"
+DEFAULT_ESTIMATE_SECONDS = float(os.getenv("EXECUTION_ESTIMATE_DEFAULT", "30"))
+DEFAULT_ESTIMATES = {
+    mode.strip(): float(seconds)
+    for mode, _, seconds in (
+        item.partition("=")
+        for item in os.getenv("EXECUTION_ESTIMATE_DEFAULTS", "fast=10,standard=25,enhanced=45").split(",")
+        if "=" in item
+    )
+}
+
+
+def size_bucket(contract_count: int) -> str:
+    if contract_count <= 1:
+        return "1"
+    if contract_count <= 3:
+        return "2-3"
+    if contract_count <= 6:
+        return "4-6"
+    return "7+"
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ExecutionTimeModel:
+    """Recent execution durations per bucket, plus the generations running now"""
+
+    def __init__(self):
+        self._samples = {}
+        self._active = {}
+        self._events = {}
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self._seeded = False
+
+    def _seed(self):
+        """Recent historical durations from stored threads, bucketed without ai_mode"""
+        with self._seed_lock:
+            if self._seeded:
+                return
+            self._seeded = True
+            self._load_seed()
+
+    def _load_seed(self):
+        session = Base.get_session()
+        try:
+            rows = session.execute(
+                text(
+                    f"""
+                    SELECT EXTRACT(EPOCH FROM (next_created_at - created_at)) AS duration
+                    FROM (
+                        SELECT role, created_at, contract_id,
+                               LEAD(role) OVER w AS next_role,
+                               LEAD(created_at) OVER w AS next_created_at
+                        FROM {Message.__table__.fullname}
+                        WHERE role IN ('user', 'assistant')
+                          AND created_at >= now() - make_interval(days => :days)
+                        WINDOW w AS (PARTITION BY thread_id ORDER BY created_at, id)
+                    ) pairs
+                    WHERE role = 'user' AND next_role = 'assistant'
+                    ORDER BY created_at DESC
+                    LIMIT :limit;
+                    """
+                ),
+                {"limit": SEED_ROWS, "days": SEED_DAYS},
+            ).all()
+            for row in rows:
+                if row.duration is not None and 0 < row.duration < 600:
+                    self.record(ANY_MODE, 1, float(row.duration))
+            logger.info(f"Execution time model seeded with {len(rows)} historical durations")
+        except Exception as e:
+            logger.warning(f"Could not seed execution time model: {str(e)}")
+        finally:
+            session.close()
+
+    def record(self, ai_mode: str, contract_count: int, duration: float):
+        key = (ai_mode, size_bucket(contract_count))
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=SAMPLES_PER_BUCKET)).append(duration)
+
+    def estimate(self, ai_mode: str, contract_count: int) -> float:
+        """Percentile duration in seconds for the bucket, or the mode's default without enough samples"""
+        self._seed()
+        bucket = size_bucket(contract_count)
+        with self._lock:
+            for key in ((ai_mode, bucket), (ANY_MODE, bucket)):
+                samples = self._samples.get(key)
+                if samples and len(samples) >= MIN_SAMPLES:
+                    return _percentile(list(samples), ESTIMATE_PERCENTILE)
+        return DEFAULT_ESTIMATES.get(ai_mode, DEFAULT_ESTIMATE_SECONDS)
+
+    def _event(self, user_id: int) -> asyncio.Event:
+        event = self._events.get(user_id)
+        if event is None:
+            event = self._events[user_id] = asyncio.Event()
+        return event
+
+    def start(self, user_id: int, ai_mode: str, contract_count: int) -> dict:
+        execution = {
+            "ai_mode": ai_mode,
+            "contract_count": contract_count,
+            "started": time.monotonic(),
+        }
+        self._active.setdefault(user_id, []).append(execution)
+        self._event(user_id).set()
+        return execution
+
+    def finish(self, user_id: int, execution: dict, record: bool = True):
+        executions = self._active.get(user_id, [])
+        if execution in executions:
+            executions.remove(execution)
+        if not executions:
+            self._active.pop(user_id, None)
+            self._events.pop(user_id, None)
+        if record:
+            self.record(
+                execution["ai_mode"],
+                execution["contract_count"],
+                time.monotonic() - execution["started"],
+            )
+
+    async def wait_for_execution(self, user_id: int, timeout: float):
+        """The user's latest running generation, waiting up to ``timeout`` for one to start"""
+        if not self._active.get(user_id):
+            event = self._event(user_id)
+            self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiters[user_id] -= 1
+                if not self._waiters[user_id]:
+                    self._waiters.pop(user_id)
+                    if not self._active.get(user_id):
+                        self._events.pop(user_id, None)
+        executions = self._active.get(user_id)
+        return executions[-1] if executions else None
+
+    def active_users(self) -> int:
+        return len(self._active)
+
+
+execution_time_model = ExecutionTimeModel()
+
+
+async def track_execution(stream, user_id: int, ai_mode: str, contract_count: int, record: bool = True):
+    """Register a generation while ``stream`` runs and record its duration when it completes"""
+    execution = execution_time_model.start(user_id, ai_mode, contract_count)
+    completed = False
+    try:
+        async for chunk in stream:
+            yield chunk
+        completed = True
+    finally:
+        execution_time_model.finish(user_id, execution, record=record and completed)
+
+
+async def get_execution_estimate(user_id: int, timeout: float = None):
+    """
+    ``estimated_processing_time`` (remaining seconds) and ``active_users_num``
+    for the user's running generation, or None when there is no generation.
+    """
+    execution = await execution_time_model.wait_for_execution(
+        user_id, ESTIMATE_WAIT_SECONDS if timeout is None else timeout
+    )
+    if execution is None:
+        return None
+    estimate = await asyncio.to_thread(
+        execution_time_model.estimate, execution["ai_mode"], execution["contract_count"]
+    )
+    elapsed = time.monotonic() - execution["started"]
+    return {
+        "estimated_processing_time": max(1, round(estimate - elapsed)),
+        "active_users_num": execution_time_model.active_users(),
+    }
@@ -0,0 +1,170 @@
+"""
+Async identity provider clients for the login path.
+
+``get_identity_provider()`` returns the provider selected by
+``IDENTITY_PROVIDER``:
+
+- ``legacy`` (default): the existing synchronous ``utils.auth_helper``
+  calls, run in a worker thread so they do not block the event loop;
+- ``microsoft``: authorization-code exchange and Microsoft Graph profile
+  lookup over one pooled keep-alive ``httpx.AsyncClient``, with the tenant's
+  OpenID metadata cached. The user is taken from the Graph profile, which
+  Graph only returns for a valid access token, so ID tokens are not used;
+- ``stub``: no network at all, for local runs and tests. A code of the form
+  ``stub:<email>`` logs in as that email, so it is refused unless ``APP_ENV``
+  is one of ``test``, ``dev`` or ``local``.
+"""
+import abc
+import asyncio
+import os
+import logging
+import logging_config
+
+import httpx
+
+from utils.auth_helper import (
+    acquire_token_by_authorization_code,
+    get_user_details_from_azure_token,
+)
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+AZURE_TENANT_ID = os.getenv("AZURE_TENANT_ID", "common")
+AZURE_CLIENT_ID = os.getenv("AZURE_CLIENT_ID")
+AZURE_CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET")
+AZURE_LOGIN_HOST = os.getenv("AZURE_LOGIN_HOST", "https://login.microsoftonline.com")
+GRAPH_ME_URL = os.getenv("GRAPH_ME_URL", "https://graph.microsoft.com/v1.0/me")
+IDENTITY_SCOPES = os.getenv("IDENTITY_SCOPES", "User.Read")
+IDENTITY_HTTP_TIMEOUT = float(os.getenv("IDENTITY_HTTP_TIMEOUT", "10"))
+APP_ENV = os.getenv("APP_ENV", "").lower()
+STUB_ENVIRONMENTS = {"test", "dev", "local"}
+
+_metadata_cache = TTLCache(
+    "identity_metadata",
+    max_size=16,
+    ttl=int(os.getenv("IDENTITY_METADATA_TTL", "86400")),
+)
+
+
+class IdentityProvider(abc.ABC):
+    @abc.abstractmethod
+    async def exchange_code(self, code: str, redirect_uri: str) -> dict:
+        """Token response for an authorization code; contains ``error`` on failure"""
+
+    @abc.abstractmethod
+    async def get_user_details(self, token_type: str, access_token: str) -> dict:
+        """Graph-style profile: ``mail``, ``userPrincipalName``, ``givenName``, ``surname``"""
+
+    async def aclose(self):
+        pass
+
+
+class LegacyIdentityProvider(IdentityProvider):
+    async def exchange_code(self, code: str, redirect_uri: str) -> dict:
+        return await asyncio.to_thread(
+            acquire_token_by_authorization_code, code, redirect_uri=redirect_uri
+        )
+
+    async def get_user_details(self, token_type: str, access_token: str) -> dict:
+        return await asyncio.to_thread(get_user_details_from_azure_token, token_type, access_token)
+
+
+class MicrosoftIdentityProvider(IdentityProvider):
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=IDENTITY_HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def openid_metadata(self) -> dict:
+        metadata = _metadata_cache.get("openid")
+        if metadata is None:
+            response = await self.client.get(
+                f"{AZURE_LOGIN_HOST}/{AZURE_TENANT_ID}/v2.0/.well-known/openid-configuration"
+            )
+            response.raise_for_status()
+            metadata = response.json()
+            _metadata_cache.set("openid", metadata)
+        return metadata
+
+    async def exchange_code(self, code: str, redirect_uri: str) -> dict:
+        metadata = await self.openid_metadata()
+        response = await self.client.post(
+            metadata["token_endpoint"],
+            data={
+                "client_id": AZURE_CLIENT_ID,
+                "client_secret": AZURE_CLIENT_SECRET,
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": redirect_uri,
+                "scope": IDENTITY_SCOPES,
+            },
+        )
+        result = response.json()
+        if response.status_code >= 400 and "error" not in result:
+            result["error"] = f"Token endpoint returned {response.status_code}"
+        return result
+
+    async def get_user_details(self, token_type: str, access_token: str) -> dict:
+        response = await self.client.get(
+            GRAPH_ME_URL, headers={"Authorization": f"{token_type} {access_token}"}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class StubIdentityProvider(IdentityProvider):
+    """Offline provider: ``stub:<email>`` codes log in as ``<email>``"""
+
+    def __init__(self):
+        if APP_ENV not in STUB_ENVIRONMENTS:
+            raise ValueError(
+                f"The stub identity provider is only allowed with APP_ENV in {sorted(STUB_ENVIRONMENTS)}"
+            )
+
+    async def exchange_code(self, code: str, redirect_uri: str) -> dict:
+        if not code or not code.startswith("stub:"):
+            return {"error": "invalid_grant", "error_description": "Stub codes look like stub:<email>"}
+        return {"token_type": "Bearer", "access_token": code}
+
+    async def get_user_details(self, token_type: str, access_token: str) -> dict:
+        email = access_token.split(":", 1)[1]
+        name = email.split("@", 1)[0]
+        return {"mail": email, "userPrincipalName": email, "givenName": name, "surname": name}
+
+
+_provider = None
+
+
+def get_identity_provider() -> IdentityProvider:
+    global _provider
+    if _provider is None:
+        name = os.getenv("IDENTITY_PROVIDER", "legacy").lower()
+        providers = {
+            "microsoft": MicrosoftIdentityProvider,
+            "legacy": LegacyIdentityProvider,
+            "stub": StubIdentityProvider,
+        }
+        if name not in providers:
+            raise ValueError(f"Unknown IDENTITY_PROVIDER: {name}")
+        _provider = providers[name]()
+        logger.info(f"Using {name} identity provider")
+    return _provider
+
+
+async def close_identity_provider():
+    if _provider is not None:
+        await _provider.aclose()
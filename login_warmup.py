@@ -0,0 +1,115 @@
+"""
+Login-time warmup of per-user data.
+
+Right after a successful login the client asks for identity, departments,
+the panel list and the first contract page. The warmup hook computes those in
+the background while the token response is already on its way: the identity
+profile (and with it the department visibility set) goes into the profile
+cache, and the default contract page and panel list are kept briefly for the
+first request that asks for them.
+"""
+import asyncio
+import base64
+import json
+import os
+from types import SimpleNamespace
+import logging
+import logging_config
+
+from components.controllers.contract_management import get_contract_management_controller
+from components.controllers.template_management import get_custom_panel_management_controller
+from components.controllers.user_profile import get_user_profile
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+LOGIN_WARMUP_ENABLED = os.getenv("LOGIN_WARMUP_ENABLED", "true").lower() == "true"
+DEFAULT_CONTRACT_PAGE_SIZE = 19
+
+_warm_results = TTLCache(
+    "login_warmup",
+    max_size=int(os.getenv("LOGIN_WARMUP_CACHE_SIZE", "2000")),
+    ttl=int(os.getenv("LOGIN_WARMUP_TTL", "60")),
+)
+_background_tasks = set()
+
+
+def _token_claims(access_token: str) -> dict:
+    try:
+        payload = access_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))
+    except Exception:
+        return {}
+
+
+def resolve_login_index(user, access_token: str) -> tuple:
+    """
+    ``(index_id, index_name)`` of a freshly logged-in user, from the token
+    claims or the user's index. Touches the user's attributes (and may lazy
+    load its index), so call it in the worker thread that loaded the user.
+    """
+    claims = _token_claims(access_token)
+    index = getattr(user, "index", None)
+    index_id = claims.get("index_id") or getattr(user, "index_id", None) or getattr(index, "id", None)
+    index_name = claims.get("index_name") or getattr(index, "name", None)
+    return index_id, index_name
+
+
+def _login_state(user_id: int, access_token: str, index_id, index_name):
+    """request.state equivalent for a freshly logged-in user, or None if the index is unknown"""
+    if index_id is None or not index_name:
+        return None
+    return SimpleNamespace(
+        user_id=user_id,
+        index_id=index_id,
+        index_name=index_name,
+        access_token=access_token,
+        correlation_id=f"login-warmup-{user_id}",
+    )
+
+
+def _warm(user_id: int, state):
+    get_user_profile(user_id)
+    if state is None:
+        return
+
+    request = SimpleNamespace(state=state)
+    contracts = get_contract_management_controller(request).get_contract_workspaces(
+        contract_workspace_name=None,
+        order_by=None,
+        contract_types=None,
+        sharing_type=None,
+        offset=0,
+        limit=DEFAULT_CONTRACT_PAGE_SIZE,
+    )
+    _warm_results.set(("contracts", user_id, state.index_id), contracts)
+
+    panels = get_custom_panel_management_controller(request).get_custom_panels(
+        panel_name=None, order_by=None
+    )
+    _warm_results.set(("panels", user_id, state.index_id), panels)
+
+
+def take_warm_result(kind: str, user_id: int, index_id):
+    """A warmed result for the user's first request of ``kind``; served once"""
+    return _warm_results.pop((kind, user_id, index_id))
+
+
+async def _run_warmup(user_id: int, state):
+    try:
+        await asyncio.to_thread(_warm, user_id, state)
+        logger.info(f"Login warmup completed for user_id: {user_id}")
+    except Exception as e:
+        logger.warning(f"Login warmup failed for user_id {user_id}: {str(e)}")
+
+
+def schedule_login_warmup(user_id: int, access_token: str, index_id, index_name):
+    """Start warming the user's caches without delaying the login response"""
+    if not LOGIN_WARMUP_ENABLED:
+        return
+    state = _login_state(user_id, access_token, index_id, index_name)
+    task = asyncio.create_task(_run_warmup(user_id, state))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
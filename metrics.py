@@ -0,0 +1,258 @@
+"""
+Prometheus metrics for the API, served at ``/metrics``.
+
+Request latency is recorded per router and route template by
+``RequestPipelineMiddleware``; chat answer streams are metered by
+``metered_chat_stream``; storage calls by ``observe_storage_call``; DB pool
+checkouts and wait time by pool events. Cache hit/miss counts (every
+``TTLCache`` in ``CACHE_REGISTRY``) and SQL budget totals are process state,
+copied into gauges every ``METRICS_REFRESH_INTERVAL`` seconds and on scrape.
+
+With several workers set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory
+shared by all of them (before start-up); each worker then writes its samples
+there and any worker's ``/metrics`` returns the aggregate.
+
+``/metrics`` is only served when ``METRICS_TOKEN`` is set, to scrapers that
+send it as ``Authorization: Bearer <token>``.
+
+Pool wait time is measured around ``QueuePool._do_get``, a private method,
+so it is only wrapped on SQLAlchemy versions it is known to exist on; on
+others the wait and timeout metrics stay empty.
+"""
+import asyncio
+import hmac
+import os
+import time
+import logging
+import logging_config
+import sqlalchemy
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool
+
+from utils.query_counter import query_counter_stats
+from utils.ttl_cache import CACHE_REGISTRY
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_REFRESH_INTERVAL = float(os.getenv("METRICS_REFRESH_INTERVAL", "15"))
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# SQLAlchemy versions whose QueuePool._do_get is wrapped for pool wait time
+POOL_WAIT_VERSIONS = ("1.4.", "2.0.", "2.1.")
+ROUTERS = {"chat", "contract-mgmt", "attribute-mgmt", "template-mgmt", "ariba-mgmt",
+           "contract-comparison", "auth", "users", "blob"}
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request to the end of the response body",
+    ["router", "route", "method", "status"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ["router", "route"],
+    buckets=(0, 1, 2, 5, 10, 20, 30, 50, 100, 250),
+)
+STREAMS_IN_FLIGHT = Gauge(
+    "chat_streams_in_flight",
+    "Chat answer streams currently being generated",
+    multiprocess_mode="livesum",
+)
+CHAT_TTFT = Histogram(
+    "chat_time_to_first_token_seconds",
+    "Time to the first answer chunk",
+    ["ai_mode"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "chat_tokens_per_second",
+    "Estimated answer tokens (characters / 4) per second after the first chunk",
+    ["ai_mode"],
+    buckets=(1, 5, 10, 20, 40, 60, 80, 120, 200),
+)
+CHAT_CHUNKS = Histogram(
+    "chat_stream_chunks",
+    "Chunks per answer stream",
+    ["ai_mode"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts", "Connections checked out of the pool")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out", multiprocess_mode="livesum"
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time to get a connection from the pool, including connecting",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts", "Checkouts that timed out waiting for a connection")
+STORAGE_LATENCY = Histogram(
+    "storage_call_duration_seconds",
+    "Storage client call latency",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CACHE_HITS = Gauge("cache_hits", "Cache hits", ["cache"], multiprocess_mode="livesum")
+CACHE_MISSES = Gauge("cache_misses", "Cache misses", ["cache"], multiprocess_mode="livesum")
+CACHE_SIZE = Gauge("cache_entries", "Cached entries", ["cache"], multiprocess_mode="livesum")
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Cache hit ratio of this worker", ["cache"], multiprocess_mode="liveall"
+)
+SQL_OVER_BUDGET = Gauge(
+    "sql_requests_over_budget",
+    "Requests that ran more SQL statements than SQL_QUERY_BUDGET",
+    multiprocess_mode="livesum",
+)
+SQL_REPEATED_SHAPES = Gauge(
+    "sql_repeated_statement_shapes",
+    "Statement shapes repeated past SQL_REPEAT_THRESHOLD within one request",
+    multiprocess_mode="livesum",
+)
+
+_refresh_task = None
+
+
+def router_label(path: str) -> str:
+    """The router a path belongs to: the segment after ``/api/``, or ``generic``"""
+    parts = path.split("/", 3)
+    if len(parts) > 2 and parts[1] == "api" and parts[2] in ROUTERS:
+        return parts[2]
+    return "generic"
+
+
+def metrics_authorized(authorization: str) -> bool:
+    """Whether an ``Authorization`` header carries the metrics token"""
+    if not METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+
+def observe_request(scope, status, seconds: float, sql_statements: int):
+    route = scope.get("route")
+    template = getattr(route, "path", None) or "unmatched"
+    router = router_label(scope["path"])
+    REQUEST_LATENCY.labels(router, template, scope["method"], str(status or 500)).observe(seconds)
+    REQUEST_SQL_STATEMENTS.labels(router, template).observe(sql_statements)
+
+
+def observe_storage_call(operation: str, seconds: float):
+    STORAGE_LATENCY.labels(operation).observe(seconds)
+
+
+async def metered_chat_stream(stream, ai_mode: str):
+    """Pass an answer stream through, recording TTFT, throughput and chunk count"""
+    STREAMS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    first_at = None
+    chunks = 0
+    characters = 0
+    try:
+        async for chunk in stream:
+            if first_at is None:
+                first_at = time.perf_counter()
+                CHAT_TTFT.labels(ai_mode).observe(first_at - started)
+            chunks += 1
+            if isinstance(chunk, dict) and isinstance(chunk.get("content"), str):
+                characters += len(chunk["content"])
+            yield chunk
+    finally:
+        STREAMS_IN_FLIGHT.dec()
+        if chunks:
+            CHAT_CHUNKS.labels(ai_mode).observe(chunks)
+            elapsed = time.perf_counter() - first_at
+            if elapsed > 0 and characters:
+                CHAT_TOKENS_PER_SECOND.labels(ai_mode).observe(characters / 4 / elapsed)
+
+
+@event.listens_for(Pool, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKOUTS.inc()
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(Pool, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+# Pool events fire after a connection is handed out; time the wait itself
+_queue_pool_get = getattr(QueuePool, "_do_get", None)
+
+
+def _timed_queue_pool_get(self):
+    started = time.perf_counter()
+    try:
+        return _queue_pool_get(self)
+    except PoolTimeoutError:
+        DB_POOL_TIMEOUTS.inc()
+        raise
+    finally:
+        DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
+if _queue_pool_get is not None and sqlalchemy.__version__.startswith(POOL_WAIT_VERSIONS):
+    QueuePool._do_get = _timed_queue_pool_get
+else:
+    logger.warning(
+        f"Pool wait metrics disabled: QueuePool._do_get is not known on SQLAlchemy {sqlalchemy.__version__}"
+    )
+
+
+def refresh_process_gauges():
+    for name, cache in list(CACHE_REGISTRY.items()):
+        stats = cache.stats()
+        CACHE_HITS.labels(name).set(stats["hits"])
+        CACHE_MISSES.labels(name).set(stats["misses"])
+        CACHE_SIZE.labels(name).set(stats["size"])
+        CACHE_HIT_RATIO.labels(name).set(stats["hit_ratio"])
+    sql_totals = query_counter_stats()
+    SQL_OVER_BUDGET.set(sql_totals["over_budget"])
+    SQL_REPEATED_SHAPES.set(sql_totals["repeated_shapes"])
+
+
+async def _refresh_periodically():
+    while True:
+        try:
+            refresh_process_gauges()
+        except Exception as e:
+            logger.warning(f"Failed to refresh metrics: {str(e)}")
+        await asyncio.sleep(METRICS_REFRESH_INTERVAL)
+
+
+def start_metrics_refresh():
+    global _refresh_task
+    if _refresh_task is None:
+        _refresh_task = asyncio.create_task(_refresh_periodically())
+
+
+def stop_metrics_refresh():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> bytes:
+    refresh_process_gauges()
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,234 @@
+"""
+Bounded parallel fan-out of one chat question across several contract workspaces.
+
+Each selected contract is answered through the single-contract pipeline
+(``ThreadAPIController.stream_chat_response``) in its own task, limited by a
+semaphore. Answers are streamed back as soon as each contract finishes, and
+each contract's citations as soon as they are resolved, so the latency of a
+multi-contract question follows the slowest contract rather than the sum.
+"""
+import asyncio
+import os
+import re
+import time
+import logging
+import logging_config
+
+from components.models.contract import Contract
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+FANOUT_ENABLED = os.getenv("MULTI_CONTRACT_FANOUT_ENABLED", "true").lower() == "true"
+FANOUT_MAX_CONCURRENCY = int(os.getenv("MULTI_CONTRACT_FANOUT_CONCURRENCY", "4"))
+
+
+def _display_name(contract_workspace: str) -> str:
+    return re.sub(r'^UCW_\d+_', '', contract_workspace or "")
+
+
+def _to_citations(citation_metadata: dict, contract_workspace: str) -> list:
+    """Convert single-contract citation metadata into multi-contract citation entries"""
+    if not citation_metadata:
+        return []
+
+    if isinstance(citation_metadata.get("citations"), list):
+        citations = []
+        for citation in citation_metadata["citations"]:
+            citation = dict(citation)
+            citation.setdefault("contract_workspace", contract_workspace)
+            citations.append(citation)
+        return citations
+
+    if citation_metadata.get("file_id") is None:
+        return []
+
+    citation = {
+        "file_id": citation_metadata["file_id"],
+        "page_number": citation_metadata.get("page_number"),
+        "file_name": citation_metadata.get("file_name", "Unknown"),
+        "contract_workspace": contract_workspace,
+    }
+    for key in ("citation_text", "citation_position", "method_used", "reasoning"):
+        if key in citation_metadata:
+            citation[key] = citation_metadata[key]
+    return [citation]
+
+
+class MultiContractFanOut:
+    """
+    Runs retrieval and answering for each contract concurrently and merges the
+    results into the Phase 1 / Phase 2 chunk format used by the chat route.
+    """
+
+    def __init__(self, chat_controller, user_id: int, max_concurrency: int = None):
+        self.chat_controller = chat_controller
+        self.user_id = user_id
+        self.max_concurrency = max(1, max_concurrency or FANOUT_MAX_CONCURRENCY)
+
+    async def _answer_contract(
+        self,
+        position: int,
+        item: dict,
+        queue: asyncio.Queue,
+        semaphore: asyncio.Semaphore,
+        conversation_id,
+        message_history: list,
+        input_message: str,
+        ai_mode: str,
+    ):
+        started = time.perf_counter()
+        timing = {"contract_id": item.get("id"), "status": "ok"}
+        contract_workspace = item.get("label") or str(item.get("id"))
+        answer_sent = False
+        content = ""
+        citation_metadata = None
+        try:
+            async with semaphore:
+                timing["queued_ms"] = round((time.perf_counter() - started) * 1000)
+                contract = await asyncio.to_thread(
+                    Contract.get_by_contract_workspace_id_and_user_id,
+                    item.get("id"),
+                    self.user_id,
+                )
+                if contract is None:
+                    logger.warning(
+                        f"Contract {item.get('id')} not found or not accessible for user {self.user_id}, skipping"
+                    )
+                    timing["status"] = "not_found"
+                    return
+                contract_workspace = contract.contract_workspace
+
+                async for chunk in self.chat_controller.stream_chat_response(
+                    conversation_id=conversation_id,
+                    message_history=message_history,
+                    input_message=input_message,
+                    user_id=self.user_id,
+                    contract_workspace=contract_workspace,
+                    ai_mode=ai_mode,
+                ):
+                    if chunk.get("citation_update") == True:
+                        # Phase 2 for this contract means its answer text is complete
+                        if not answer_sent:
+                            timing["answer_ms"] = round((time.perf_counter() - started) * 1000)
+                            await queue.put(("answer", position, contract_workspace, content))
+                            answer_sent = True
+                        citation_metadata = chunk.get("citation_metadata") or citation_metadata
+                        continue
+
+                    content += chunk.get("content", "")
+                    if chunk.get("citation_metadata"):
+                        citation_metadata = chunk["citation_metadata"]
+
+                if not answer_sent:
+                    timing["answer_ms"] = round((time.perf_counter() - started) * 1000)
+                    await queue.put(("answer", position, contract_workspace, content))
+                    answer_sent = True
+
+                citations = _to_citations(citation_metadata, contract_workspace)
+                if citations:
+                    await queue.put(("citations", position, contract_workspace, citations))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Fan-out answer failed for contract {item.get('id')}")
+            timing["status"] = "error"
+            if not answer_sent:
+                await queue.put(
+                    (
+                        "answer",
+                        position,
+                        contract_workspace,
+                        "Unable to generate an answer for this contract.",
+                    )
+                )
+        finally:
+            timing["contract_workspace"] = _display_name(contract_workspace)
+            timing["total_ms"] = round((time.perf_counter() - started) * 1000)
+            queue.put_nowait(("done", position, contract_workspace, timing))
+
+    async def stream(
+        self,
+        conversation_id,
+        message_history: list,
+        input_message: str,
+        contract_workspace_list: list,
+        ai_mode: str = "standard",
+    ):
+        """
+        Yields Phase 1 chunks (one answer section per contract, as each finishes),
+        one ``citation_update`` chunk per contract with its ``citations`` as soon as
+        they are resolved, and a final ``citation_complete`` chunk. Citations stay
+        ``citation_loading`` until every contract is done. Phase 1 and the final
+        chunk carry ``contract_timings`` for the contracts completed so far.
+        """
+        queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        logger.info(
+            f"Fanning out question across {len(contract_workspace_list)} contracts "
+            f"(max_concurrency={self.max_concurrency})"
+        )
+        tasks = [
+            asyncio.create_task(
+                self._answer_contract(
+                    position,
+                    item,
+                    queue,
+                    semaphore,
+                    conversation_id,
+                    message_history,
+                    input_message,
+                    ai_mode,
+                )
+            )
+            for position, item in enumerate(contract_workspace_list)
+        ]
+
+        pending = len(tasks)
+        answered = set()
+        merged_citations = []
+        contract_timings = []
+        try:
+            while pending:
+                kind, position, contract_workspace, payload = await queue.get()
+
+                if kind == "answer":
+                    answered.add(position)
+                    section = f"### {_display_name(contract_workspace)}\n{payload}"
+                    yield {
+                        "content": section if len(answered) == 1 else f"\n\n{section}",
+                        "citation_metadata": {
+                            "citations": list(merged_citations),
+                            "citation_loading": pending > 0,
+                        },
+                        "contract_timings": list(contract_timings),
+                    }
+                elif kind == "citations":
+                    # One frame per contract, as soon as its citations are resolved
+                    merged_citations.extend(payload)
+                    yield {
+                        "citation_update": True,
+                        "contract_workspace": _display_name(contract_workspace),
+                        "citations": payload,
+                    }
+                else:
+                    pending -= 1
+                    contract_timings.append(payload)
+                    logger.info(f"Fan-out contract finished: {payload}")
+
+            if not answered:
+                yield {
+                    "content": "None of the selected contracts exist or you are not allowed to get insights from them.",
+                    "contract_timings": list(contract_timings),
+                }
+
+            yield {
+                "citation_update": True,
+                "citation_complete": True,
+                "citation_count": len(merged_citations),
+                "contract_timings": contract_timings,
+            }
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
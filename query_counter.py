@@ -0,0 +1,164 @@
+"""
+SQL statement counting per request, with N+1 detection.
+
+Every statement executed through any engine (so through every session opened
+with ``Base.get_session()``) is counted against the current request's
+``QueryLog`` and grouped by statement shape: the SQL with bind parameters and
+literals replaced and ``IN`` lists collapsed, so the same query issued for
+each file or workspace in a loop shows up as one shape with a high count.
+
+``RequestPipelineMiddleware`` opens a log per request and calls
+``report_query_log`` when it finishes. Requests over ``SQL_QUERY_BUDGET``
+statements, or with a shape repeated ``SQL_REPEAT_THRESHOLD`` times or more,
+are logged with their most repeated shapes. Process totals are available from
+``query_counter_stats()`` for metrics.
+
+``assert_max_queries`` caps the statements run inside a block, e.g. around a
+``TestClient`` call to an endpoint; ``capture_queries`` just records them.
+"""
+import contextlib
+import contextvars
+import os
+import re
+import threading
+from collections import Counter
+import logging
+import logging_config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+SQL_QUERY_COUNTER_ENABLED = os.getenv("SQL_QUERY_COUNTER_ENABLED", "true").lower() == "true"
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "30"))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+SQL_REPORTED_SHAPES = 5
+
+_PARAM_PATTERN = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?")
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """``statement`` with parameters and literals replaced by ``?`` and IN lists collapsed"""
+    shape = _PARAM_PATTERN.sub("?", statement)
+    shape = _LITERAL_PATTERN.sub("?", shape)
+    shape = _IN_LIST_PATTERN.sub("(?...)", shape)
+    return _SPACE_PATTERN.sub(" ", shape).strip()
+
+
+class QueryLog:
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str):
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.shapes[shape] += 1
+
+    def repeated_shapes(self, threshold: int = SQL_REPEAT_THRESHOLD) -> list:
+        """(shape, count) pairs issued at least ``threshold`` times, most repeated first"""
+        with self._lock:
+            return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+query_log_var = contextvars.ContextVar("query_log", default=None)
+
+_active_captures = []
+_captures_lock = threading.Lock()
+_totals = {"requests": 0, "statements": 0, "over_budget": 0, "repeated_shapes": 0}
+_totals_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if not SQL_QUERY_COUNTER_ENABLED:
+        return
+    query_log = query_log_var.get()
+    if query_log is not None:
+        query_log.record(statement)
+    if _active_captures:
+        with _captures_lock:
+            captures = list(_active_captures)
+        for capture in captures:
+            capture.record(statement)
+
+
+def start_query_log():
+    """Bind a new QueryLog to the current context; returns (log, reset token)"""
+    query_log = QueryLog()
+    return query_log, query_log_var.set(query_log)
+
+
+def report_query_log(query_log: QueryLog, method: str, path: str, correlation_id: str = None):
+    repeated = query_log.repeated_shapes()
+    over_budget = query_log.count > SQL_QUERY_BUDGET
+    with _totals_lock:
+        _totals["requests"] += 1
+        _totals["statements"] += query_log.count
+        _totals["over_budget"] += over_budget
+        _totals["repeated_shapes"] += len(repeated)
+
+    if not over_budget and not repeated:
+        return
+    top_shapes = "; ".join(
+        f"{n}x {shape[:200]}" for shape, n in (repeated or query_log.shapes.most_common())[:SQL_REPORTED_SHAPES]
+    )
+    logger.warning(
+        f"{method} {path} ran {query_log.count} SQL statements "
+        f"(budget {SQL_QUERY_BUDGET}, correlation_id={correlation_id}); "
+        f"{'possible N+1, ' if repeated else ''}most repeated: {top_shapes}",
+        extra={
+            "correlation_id": correlation_id,
+            "sql_statement_count": query_log.count,
+            "sql_repeated_shapes": repeated[:SQL_REPORTED_SHAPES],
+        },
+    )
+
+
+def query_counter_stats() -> dict:
+    """Process totals: requests seen, statements, requests over budget, repeated shapes"""
+    with _totals_lock:
+        return dict(_totals)
+
+
+@contextlib.contextmanager
+def capture_queries():
+    """QueryLog of every statement run, from any thread, while the block runs"""
+    capture = QueryLog()
+    with _captures_lock:
+        _active_captures.append(capture)
+    try:
+        yield capture
+    finally:
+        with _captures_lock:
+            _active_captures.remove(capture)
+
+
+@contextlib.contextmanager
+def assert_max_queries(max_queries: int, max_repeats: int = None):
+    """Fail if the block runs more than ``max_queries`` statements.
+
+    Counts statements from every thread while the block runs, so it also sees
+    queries issued by a ``TestClient``'s app thread. With ``max_repeats``,
+    also fail when any single statement shape runs more often than that.
+    """
+    with capture_queries() as capture:
+        yield capture
+
+    shapes = "\n".join(f"  {n}x {shape}" for shape, n in capture.shapes.most_common(SQL_REPORTED_SHAPES))
+    if capture.count > max_queries:
+        raise AssertionError(
+            f"Expected at most {max_queries} SQL statements, {capture.count} were run:\n{shapes}"
+        )
+    if max_repeats is not None:
+        repeated = capture.repeated_shapes(max_repeats + 1)
+        if repeated:
+            raise AssertionError(
+                f"Statement repeated {repeated[0][1]} times (at most {max_repeats} allowed): {repeated[0][0]}"
+            )
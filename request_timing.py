@@ -0,0 +1,189 @@
+"""
+Per-request phase timers, reported as ``Server-Timing``.
+
+``RequestPipelineMiddleware`` starts a ``RequestTimings`` for every HTTP
+request and binds it to ``request_timings_var``. Worker threads
+(``asyncio.to_thread``, sync routes) and streaming tasks copy the context, so
+everything a request triggers adds to the same object:
+
+- ``db``: cursor execution time and query count, from SQLAlchemy engine events;
+- ``storage``: calls on instrumented storage clients (``instrument_methods``);
+- ``llm_ttft`` / ``llm``: time to the first answer chunk and total time spent
+  waiting on the answer stream (``timed_llm_stream``);
+- ``serialize``: JSON rendering of responses and stream frames.
+
+The pipeline adds the phases recorded so far as a ``Server-Timing`` response
+header and logs the complete breakdown, keyed by correlation ID, when the
+request finishes. For streamed chat responses the header can only hold the
+pre-stream phases; ``append_timing_frame`` adds the full breakdown as the last
+``{"server_timing": {...}}`` frame.
+"""
+import contextvars
+import functools
+import json
+import threading
+import time
+import logging
+import logging_config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import JSONResponse
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+PHASE_DESCRIPTIONS = {
+    "db": "Database",
+    "storage": "Storage",
+    "llm_ttft": "LLM time to first token",
+    "llm": "LLM",
+    "serialize": "Serialization",
+}
+
+
+class RequestTimings:
+    def __init__(self, correlation_id: str):
+        self.correlation_id = correlation_id
+        self.started_at = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float, count: int = 1):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += count
+
+    def set(self, phase: str, seconds: float):
+        """Record a point-in-time phase (e.g. TTFT) once"""
+        with self._lock:
+            self.phases.setdefault(phase, [seconds, 1])
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            phases = {
+                phase: {"ms": round(seconds * 1000, 1), "count": count}
+                for phase, (seconds, count) in self.phases.items()
+            }
+        phases["total"] = {"ms": round((time.perf_counter() - self.started_at) * 1000, 1), "count": 1}
+        return phases
+
+    def header_value(self) -> str:
+        entries = []
+        for phase, values in self.as_dict().items():
+            entry = f"{phase};dur={values['ms']}"
+            if phase == "db":
+                entry += f';desc="{values["count"]} queries"'
+            elif phase in PHASE_DESCRIPTIONS:
+                entry += f';desc="{PHASE_DESCRIPTIONS[phase]}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+request_timings_var = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings():
+    return request_timings_var.get()
+
+
+def add_timing(phase: str, seconds: float, count: int = 1):
+    timings = request_timings_var.get()
+    if timings is not None:
+        timings.add(phase, seconds, count)
+
+
+def log_request_timings(timings: RequestTimings, method: str, path: str, status):
+    breakdown = timings.as_dict()
+    logger.info(
+        f"Request timings {method} {path} [{status}] correlation_id={timings.correlation_id}: "
+        + ", ".join(f"{phase}={values['ms']}ms" for phase, values in breakdown.items()),
+        extra={"correlation_id": timings.correlation_id, "server_timing": breakdown},
+    )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started_at")
+    if started:
+        add_timing("db", time.perf_counter() - started.pop())
+
+
+def instrument_methods(cls, phase: str, method_names, on_call=None):
+    """Time calls of ``cls``'s methods under ``phase``; ``on_call(name, seconds)`` also sees each call"""
+    for name in method_names:
+        method = getattr(cls, name, None)
+        if method is None or getattr(method, "_timed_phase", None):
+            continue
+
+        def timed(name, method):
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    add_timing(phase, elapsed)
+                    if on_call is not None:
+                        on_call(name, elapsed)
+
+            wrapper._timed_phase = phase
+            return wrapper
+
+        setattr(cls, name, timed(name, method))
+
+
+async def timed_llm_stream(stream):
+    """Pass ``stream`` through, recording TTFT and the time spent waiting on it"""
+    timings = current_timings()
+    started = time.perf_counter()
+    waited = 0.0
+    first = True
+    try:
+        while True:
+            wait_started = time.perf_counter()
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+            now = time.perf_counter()
+            waited += now - wait_started
+            if first and timings is not None:
+                timings.set("llm_ttft", now - started)
+                first = False
+            yield chunk
+    finally:
+        if timings is not None:
+            timings.add("llm", waited)
+
+
+def serialize_frame(data) -> str:
+    """One NDJSON line, timed as serialization"""
+    started = time.perf_counter()
+    line = json.dumps(data, default=str) + "\n"
+    add_timing("serialize", time.perf_counter() - started)
+    return line
+
+
+async def append_timing_frame(stream):
+    """Pass ``stream`` through and end it with the request's timing breakdown"""
+    timings = current_timings()
+    async for line in stream:
+        yield line
+    if timings is not None:
+        yield json.dumps({"server_timing": timings.as_dict()}) + "\n"
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            add_timing("serialize", time.perf_counter() - started)
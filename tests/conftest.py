@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+# Endpoint tests run against the database configured for the app and log in as
+# this existing user; they are skipped when it is not set.
+TEST_USER_EMAIL = os.getenv("TEST_USER_EMAIL")
+
+
+@pytest.fixture(scope="session")
+def client():
+    pytest.importorskip("fastapi")
+    if not TEST_USER_EMAIL:
+        pytest.skip("TEST_USER_EMAIL is not set")
+    from fastapi.testclient import TestClient
+
+    from api import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def user(client):
+    from components.models.auth import User
+
+    user = User.lookup(email=TEST_USER_EMAIL)
+    if user is None:
+        pytest.skip(f"User {TEST_USER_EMAIL} does not exist")
+    return user
+
+
+@pytest.fixture(scope="session")
+def auth_headers(user):
+    from utils.auth_helper import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token(user)}"}
@@ -0,0 +1,49 @@
+import base64
+import json
+import time
+
+import pytest
+
+from utils import auth_cache
+from utils.auth_cache import invalidate_user, lookup_context, store_context
+
+
+def _token(expires_in: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": time.time() + expires_in}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    auth_cache.invalidate_all()
+    yield
+    auth_cache.invalidate_all()
+
+
+def test_other_workers_drop_a_user_within_the_ttl(monkeypatch):
+    # Deactivation only invalidates the worker that ran it; elsewhere the
+    # entry must still expire after AUTH_CACHE_TTL even for long-lived tokens.
+    monkeypatch.setattr(auth_cache, "AUTH_CACHE_TTL", 0.05)
+    token = _token(3600)
+    store_context(token, {"user_id": 1, "index_id": 2})
+    assert lookup_context(token) == {"user_id": 1, "index_id": 2}
+    time.sleep(0.06)
+    assert lookup_context(token) is None
+
+
+def test_entries_do_not_outlive_the_token():
+    token = _token(0.05)
+    store_context(token, {"user_id": 1, "index_id": 2})
+    assert lookup_context(token) is not None
+    time.sleep(0.06)
+    assert lookup_context(token) is None
+    store_context(_token(-1), {"user_id": 1, "index_id": 2})
+    assert len(auth_cache._auth_cache) == 0
+
+
+def test_invalidate_user_drops_local_tokens():
+    first, second = _token(3600), _token(1800)
+    store_context(first, {"user_id": 1, "index_id": 2})
+    store_context(second, {"user_id": 1, "index_id": 2})
+    assert invalidate_user(1) == 2
+    assert lookup_context(first) is None and lookup_context(second) is None
@@ -0,0 +1,35 @@
+import pytest
+
+from utils import chat_answer_cache
+from utils.chat_answer_cache import get_cached_answer, invalidate_workspace, normalize_question, store_answer
+
+V1 = ("Active", "2026-01-01", 2, "2026-01-01")
+V2 = ("Active", "2026-01-01", 3, "2026-01-02")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    chat_answer_cache._answer_cache.clear()
+    yield
+    chat_answer_cache._answer_cache.clear()
+
+
+def test_new_workspace_version_misses_without_invalidation():
+    # An upload in another worker changes the version read from the database;
+    # this worker never runs invalidate_workspace for it.
+    store_answer("UCW_1_msa", "What is the notice period?", "standard", V1, "30 days")
+    assert get_cached_answer("UCW_1_msa", "what is the notice period", "standard", V1)["content"] == "30 days"
+    assert get_cached_answer("UCW_1_msa", "What is the notice period?", "standard", V2) is None
+    assert get_cached_answer("UCW_1_msa", "What is the notice period?", "deep", V1) is None
+
+
+def test_invalidate_workspace_frees_local_entries():
+    store_answer("UCW_2_nda", "Governing law?", "standard", V1, "English law")
+    store_answer("UCW_2_nda", "Governing law?", "standard", V2, "English law")
+    store_answer("UCW_3_sow", "Governing law?", "standard", V1, "Swiss law")
+    assert invalidate_workspace("UCW_2_nda") == 2
+    assert get_cached_answer("UCW_3_sow", "Governing law?", "standard", V1)["content"] == "Swiss law"
+
+
+def test_normalize_question():
+    assert normalize_question("  What IS the   cap?! ") == "what is the cap"
@@ -0,0 +1,97 @@
+import asyncio
+import uuid
+
+import pytest
+
+from components.controllers import chat_idempotency
+from components.controllers.chat_idempotency import claim
+
+
+@pytest.fixture(autouse=True)
+def per_process_only(monkeypatch):
+    monkeypatch.setattr(chat_idempotency, "SHARED_CLAIMS_ENABLED", False)
+
+
+async def _lines(*lines):
+    for line in lines:
+        await asyncio.sleep(0)
+        yield line
+
+
+async def _collect(stream) -> list:
+    return [line async for line in stream]
+
+
+def test_first_request_owns_the_key_and_repeats_replay_it():
+    async def scenario():
+        key = str(uuid.uuid4())
+        record, is_new = claim(1, key)
+        assert is_new
+        first = await _collect(record.start(_lines("a\n", "b\n")))
+
+        repeat, is_new = claim(1, key)
+        assert not is_new
+        assert repeat is record
+        assert await _collect(repeat.follow()) == first == ["a\n", "b\n"]
+
+    asyncio.run(scenario())
+
+
+def test_repeat_while_in_flight_receives_buffered_and_live_lines():
+    async def scenario():
+        key = str(uuid.uuid4())
+        release = asyncio.Event()
+
+        async def slow():
+            yield "a\n"
+            await release.wait()
+            yield "b\n"
+
+        record, _ = claim(1, key)
+        original = asyncio.create_task(_collect(record.start(slow())))
+        await asyncio.sleep(0.01)
+
+        repeat, is_new = claim(1, key)
+        assert not is_new
+        follower = asyncio.create_task(_collect(repeat.follow()))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await original == ["a\n", "b\n"]
+        assert await follower == ["a\n", "b\n"]
+
+    asyncio.run(scenario())
+
+
+def test_keys_are_per_user():
+    key = str(uuid.uuid4())
+    _, first = claim(1, key)
+    _, other_user = claim(2, key)
+    assert first and other_user
+
+
+def test_released_key_can_be_claimed_again():
+    async def scenario():
+        key = str(uuid.uuid4())
+        record, _ = claim(1, key)
+        record.release()
+        retry, is_new = claim(1, key)
+        assert is_new
+        assert retry is not record
+
+    asyncio.run(scenario())
+
+
+def test_failed_generation_is_not_replayed():
+    async def scenario():
+        key = str(uuid.uuid4())
+
+        async def failing():
+            yield "a\n"
+            raise RuntimeError("model error")
+
+        record, _ = claim(1, key)
+        assert await _collect(record.start(failing())) == ["a\n"]
+        _, is_new = claim(1, key)
+        assert is_new
+
+    asyncio.run(scenario())
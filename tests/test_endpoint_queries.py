@@ -0,0 +1,52 @@
+"""
+Statement budgets per endpoint, to catch N+1 regressions. Needs a database
+and TEST_USER_EMAIL (see conftest.py). ``max_repeats`` bounds how often any
+one statement shape may run, which is what grows with the data in an N+1.
+"""
+import pytest
+
+from utils.query_counter import assert_max_queries
+
+ENDPOINTS = [
+    ("GET", "/api/auth/identity", None, 8),
+    ("GET", "/api/users/profile", None, 8),
+    ("GET", "/api/users/department_info", None, 8),
+    ("GET", "/api/contract-mgmt/contracts?offset=0&limit=19", None, 15),
+    ("GET", "/api/contract-mgmt/only_contracts", None, 12),
+    ("GET", "/api/template-mgmt/custom-panels", None, 12),
+    ("GET", "/api/chat/history/threads?limit=50", None, 6),
+    ("GET", "/api/chat/history/messages/0/citations", None, 6),
+]
+
+
+@pytest.mark.parametrize("method,path,body,max_queries", ENDPOINTS)
+def test_endpoint_query_budget(client, auth_headers, method, path, body, max_queries):
+    with assert_max_queries(max_queries, max_repeats=3):
+        response = client.request(method, path, headers=auth_headers, json=body)
+    assert response.status_code < 500, response.text
+
+
+def test_thread_window_query_budget(client, auth_headers):
+    threads = client.get("/api/chat/history/threads?limit=1", headers=auth_headers).json()["threads"]
+    if not threads:
+        pytest.skip("The test user has no threads")
+    with assert_max_queries(6, max_repeats=3):
+        response = client.post(
+            "/api/chat/history/read/window",
+            headers=auth_headers,
+            json={"conversation_id": threads[0]["id"], "limit": 30},
+        )
+    assert response.status_code == 200, response.text
+
+
+def test_files_query_budget(client, auth_headers):
+    listing = client.get("/api/contract-mgmt/only_contracts", headers=auth_headers).json()
+    contracts = listing.get("data", {}).get("contracts") or []
+    if not contracts:
+        pytest.skip("The test user has no contracts")
+    with assert_max_queries(15, max_repeats=3):
+        response = client.get(
+            f"/api/contract-mgmt/files?contract_workspace_id={contracts[0]['contract_id']}",
+            headers=auth_headers,
+        )
+    assert response.status_code < 500, response.text
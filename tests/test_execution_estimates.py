@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from utils import execution_estimates
+from utils.execution_estimates import MIN_SAMPLES, ExecutionTimeModel, get_execution_estimate
+
+
+@pytest.fixture
+def cold_model(monkeypatch):
+    """A fresh worker's model whose history seed found nothing"""
+    model = ExecutionTimeModel()
+    monkeypatch.setattr(model, "_load_seed", lambda: None)
+    monkeypatch.setattr(execution_estimates, "execution_time_model", model)
+    monkeypatch.setattr(execution_estimates, "DEFAULT_ESTIMATES", {"fast": 10.0, "standard": 25.0})
+    monkeypatch.setattr(execution_estimates, "DEFAULT_ESTIMATE_SECONDS", 30.0)
+    return model
+
+
+def test_cold_start_uses_the_configured_default_per_mode(cold_model):
+    assert cold_model.estimate("standard", 1) == 25.0
+    assert cold_model.estimate("fast", 4) == 10.0
+    assert cold_model.estimate("enhanced", 1) == 30.0
+
+
+def test_samples_replace_the_default(cold_model):
+    for seconds in range(MIN_SAMPLES):
+        cold_model.record("standard", 1, 5.0 + seconds)
+    assert 5.0 <= cold_model.estimate("standard", 1) < 5.0 + MIN_SAMPLES
+    assert cold_model.estimate("standard", 7) == 25.0
+
+
+def test_seeded_history_serves_every_mode(cold_model):
+    for _ in range(MIN_SAMPLES):
+        cold_model.record(execution_estimates.ANY_MODE, 1, 12.0)
+    assert cold_model.estimate("standard", 1) == 12.0
+    assert cold_model.estimate("enhanced", 1) == 12.0
+
+
+def test_first_request_on_a_fresh_worker_gets_an_estimate(cold_model):
+    async def scenario():
+        cold_model.start(1, "standard", 1)
+        return await get_execution_estimate(1, timeout=0.1)
+
+    response = asyncio.run(scenario())
+    assert response == {"estimated_processing_time": 25, "active_users_num": 1}
+
+
+def test_no_estimate_without_a_running_generation(cold_model):
+    assert asyncio.run(get_execution_estimate(2, timeout=0.01)) is None
+    assert not cold_model._events
@@ -0,0 +1,23 @@
+from utils import metrics
+from utils.metrics import metrics_authorized, router_label
+
+
+def test_metrics_require_the_configured_bearer_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    assert metrics_authorized("Bearer secret")
+    assert metrics_authorized("bearer secret")
+    assert not metrics_authorized("Bearer wrong")
+    assert not metrics_authorized("secret")
+    assert not metrics_authorized(None)
+
+
+def test_metrics_are_closed_without_a_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    assert not metrics_authorized("Bearer ")
+    assert not metrics_authorized("Bearer anything")
+
+
+def test_router_label():
+    assert router_label("/api/chat/history/generate") == "chat"
+    assert router_label("/api/unknown/thing") == "generic"
+    assert router_label("/metrics") == "generic"
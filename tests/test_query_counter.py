@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils.query_counter import QueryLog, assert_max_queries, capture_queries, statement_shape
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+def test_statement_shape_replaces_parameters_and_literals():
+    assert statement_shape("SELECT * FROM file WHERE file_id = %(file_id_1)s") == (
+        "SELECT * FROM file WHERE file_id = ?"
+    )
+    assert statement_shape("SELECT * FROM file WHERE name = 'a.pdf' AND page = 3") == (
+        "SELECT * FROM file WHERE name = ? AND page = ?"
+    )
+    assert statement_shape("SELECT * FROM t WHERE a = :a AND b = $1") == "SELECT * FROM t WHERE a = ? AND b = ?"
+
+
+def test_statement_shape_keeps_casts_and_collapses_in_lists():
+    assert statement_shape("SELECT x::jsonb FROM t WHERE id IN (%s, %s, %s)") == (
+        "SELECT x::jsonb FROM t WHERE id IN (?...)"
+    )
+    assert statement_shape("SELECT 1\n  FROM   t") == "SELECT ? FROM t"
+
+
+def test_same_query_with_different_values_has_one_shape():
+    log = QueryLog()
+    for file_id in range(6):
+        log.record(f"SELECT status FROM file WHERE file_id = {file_id}")
+    log.record("SELECT 1 FROM contract")
+    assert log.count == 7
+    assert log.repeated_shapes(5) == [("SELECT status FROM file WHERE file_id = ?", 6)]
+
+
+def test_capture_queries_counts_engine_statements(engine):
+    with engine.connect() as connection:
+        with capture_queries() as capture:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+    assert capture.count == 2
+
+
+def test_assert_max_queries_fails_over_budget(engine):
+    with engine.connect() as connection:
+        with assert_max_queries(2):
+            connection.execute(text("SELECT 1"))
+        with pytest.raises(AssertionError, match="at most 1 SQL statements, 2 were run"):
+            with assert_max_queries(1):
+                connection.execute(text("SELECT 1"))
+                connection.execute(text("SELECT 2"))
+
+
+def test_assert_max_queries_fails_on_repeated_shape(engine):
+    with engine.connect() as connection:
+        with pytest.raises(AssertionError, match="repeated 3 times"):
+            with assert_max_queries(10, max_repeats=2):
+                for value in range(3):
+                    connection.execute(text(f"SELECT {value}"))
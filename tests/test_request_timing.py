@@ -0,0 +1,93 @@
+"""
+The ``server_timing`` frame ends every chat stream. Clients take the
+conversation from the answer frames, so a stream that ends with it must still
+carry ``history_metadata`` for a new conversation.
+"""
+import asyncio
+import json
+
+import pytest
+
+from utils.request_timing import RequestTimings, append_timing_frame, request_timings_var
+
+
+def _frames(body: str) -> list:
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+def _conversation(frames: list) -> dict:
+    """history_metadata of the last frame that has one, the way Chat.tsx reads it"""
+    metadata = None
+    for frame in frames:
+        if "server_timing" in frame or "queue_position" in frame:
+            continue
+        metadata = frame.get("history_metadata") or metadata
+    return metadata
+
+
+async def _collect(stream) -> str:
+    return "".join([line async for line in stream])
+
+
+def test_timing_frame_follows_the_answer_frames():
+    async def answer():
+        yield json.dumps({"queue_position": 0}) + "\n"
+        yield json.dumps({
+            "id": 1,
+            "choices": [{"messages": [{"role": "assistant", "content": "Thirty days."}]}],
+            "history_metadata": {"conversation_id": 42, "title": "Notice period"},
+        }) + "\n"
+        yield json.dumps({"citation_update": True, "citation_metadata": {"file_id": 7}}) + "\n"
+
+    token = request_timings_var.set(RequestTimings("correlation"))
+    try:
+        frames = _frames(asyncio.run(_collect(append_timing_frame(answer()))))
+    finally:
+        request_timings_var.reset(token)
+
+    assert list(frames[-1]) == ["server_timing"]
+    assert "total" in frames[-1]["server_timing"]
+    assert _conversation(frames)["conversation_id"] == 42
+
+
+def test_no_timing_frame_outside_a_request():
+    async def answer():
+        yield json.dumps({"content": "x"}) + "\n"
+
+    frames = _frames(asyncio.run(_collect(append_timing_frame(answer()))))
+    assert frames == [{"content": "x"}]
+
+
+def test_new_conversation_stream_ends_with_timings(client, auth_headers, monkeypatch):
+    import api
+    from benchmarks import fake_chat_backend
+
+    for name in ("TTFT_MS", "CITATION_DELAY_MS"):
+        monkeypatch.setattr(fake_chat_backend, name, 0)
+    monkeypatch.setattr(fake_chat_backend, "ANSWER_TOKENS", 6)
+    monkeypatch.setattr(api, "chat_controller_factory", fake_chat_backend.FakeThreadAPIController)
+
+    listing = client.get("/api/contract-mgmt/only_contracts", headers=auth_headers).json()
+    contracts = listing.get("data", {}).get("contracts") or []
+    if not contracts:
+        pytest.skip("The test user has no contracts")
+    contract_id = str(contracts[0]["contract_id"])
+
+    response = client.post(
+        "/api/chat/history/generate",
+        headers=auth_headers,
+        json={
+            "messages": [{"role": "user", "content": "Is there a liability cap?", "contract_id": contract_id}],
+            "contract_workspace_id": contract_id,
+            "contract_workspace_list": [{"id": contract_id}],
+            "ai_mode": "standard",
+        },
+    )
+    assert response.status_code == 200, response.text
+
+    frames = _frames(response.text)
+    assert "server_timing" in frames[-1]
+    conversation = _conversation(frames)
+    assert conversation and conversation["conversation_id"]
+    thread = client.get(f"/api/chat/history/threads/{conversation['conversation_id']}", headers=auth_headers)
+    assert thread.status_code == 200, thread.text
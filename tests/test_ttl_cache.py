@@ -0,0 +1,54 @@
+import time
+
+from utils.ttl_cache import CACHE_REGISTRY, TTLCache
+
+
+def test_get_returns_value_until_it_expires():
+    cache = TTLCache("test_expiry", ttl=0.05)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    time.sleep(0.06)
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_overrides_the_default():
+    cache = TTLCache("test_entry_ttl", ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test_lru", max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_pop_and_delete_where():
+    cache = TTLCache("test_delete")
+    cache.set(("thread", 1), "x")
+    cache.set(("thread", 2), "y")
+    cache.set(("other", 1), "z")
+    assert cache.pop(("thread", 1)) == "x"
+    assert cache.pop(("thread", 1), "gone") == "gone"
+    assert cache.delete_where(lambda key: key[0] == "thread") == 1
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_stats_count_hits_and_misses_and_register_the_cache():
+    cache = TTLCache("test_stats")
+    cache.set("key", "value")
+    cache.get("key")
+    cache.get("missing")
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+    assert CACHE_REGISTRY["test_stats"] is cache
@@ -0,0 +1,111 @@
+"""
+Per-user identity profile cache.
+
+One profile per user holds what the frontend asks for on every page load
+(identity, roles, email and departments) and what contract listing
+needs for visibility (department ids). It is built from one user query and
+one department query (memberships joined with their departments), and
+dropped as soon as the user or their department memberships are written.
+Renaming a department drops every profile.
+"""
+import os
+import logging
+import logging_config
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from components.models.auth import User, UserDepartment
+from components.models.base import Base
+from utils.auth_helper import UserIdentitySchema
+from utils.ttl_cache import TTLCache
+
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
+Department = UserDepartment.department.property.mapper.class_
+
+_profile_cache = TTLCache(
+    "user_profile",
+    max_size=int(os.getenv("USER_PROFILE_CACHE_SIZE", "5000")),
+    ttl=int(os.getenv("USER_PROFILE_CACHE_TTL", "300")),
+)
+
+
+def _load_profile(user_id: int):
+    session = Base.get_session()
+    try:
+        user = session.query(User).filter_by(user_id=user_id).first()
+        if not user:
+            return None
+
+        identity = UserIdentitySchema().dump(user)
+        identity["roles"] = user.roles.split(",") if user.roles else []
+
+        user_departments = (
+            session.query(UserDepartment)
+            .options(joinedload(UserDepartment.department))
+            .filter_by(user_id=user_id)
+            .all()
+        )
+        departments = [
+            (ud.department_id, ud.department.name if ud.department else None)
+            for ud in user_departments
+        ]
+        return {
+            "user_id": user_id,
+            "email": user.email,
+            "identity": identity,
+            "departments": departments,
+            # Only one department per user
+            "department_name": departments[0][1] if departments else None,
+        }
+    finally:
+        session.close()
+
+
+def get_user_profile(user_id: int):
+    """The cached profile of a user, or None if the user does not exist"""
+    profile = _profile_cache.get(user_id)
+    if profile is None:
+        logger.info(f"Loading identity profile for user_id: {user_id}")
+        profile = _load_profile(user_id)
+        if profile is None:
+            return None
+        _profile_cache.set(user_id, profile)
+    return profile
+
+
+def get_user_departments(user_id: int) -> list:
+    """(department_id, department_name) pairs of the user's departments"""
+    profile = get_user_profile(user_id)
+    return list(profile["departments"]) if profile else []
+
+
+def invalidate_profile(user_id) -> None:
+    _profile_cache.pop(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_written(mapper, connection, target):
+    invalidate_profile(target.user_id)
+
+
+@event.listens_for(UserDepartment, "after_insert")
+@event.listens_for(UserDepartment, "after_update")
+@event.listens_for(UserDepartment, "after_delete")
+def _user_department_written(mapper, connection, target):
+    invalidate_profile(target.user_id)
+
+
+@event.listens_for(Department, "after_update")
+@event.listens_for(Department, "after_delete")
+def _department_written(mapper, connection, target):
+    _profile_cache.clear()
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _bulk_written(context):
+    if getattr(context.mapper, "class_", None) in (User, UserDepartment, Department):
+        _profile_cache.clear()